@@ -0,0 +1,310 @@
+"""
+The script that remembers the answers to the queries asked of a knowledge
+base (see KnowledgeBase.cache_answers), so that asking the same query again
+does not mean searching for them all over again.
+
+A query is looked up by its variant: the query with its variables numbered
+in the order they come up, so that Hates(x, y) and Hates(f, r) are the same
+query, and their answers are handed back with the variables of whichever one
+was asked. The options that change what the answers are, or the order they
+come in (tabled, joins, reorder, iterative_deepening and max_depth), are part
+of the key; budgets are not.
+
+A search that was stopped before the end (after its first answer, say)
+leaves the answers it found so far. Asking the query again hands those out
+first, and only if more are wanted does it search again, skipping as many
+answers as were cached (the search finds them in the same order every time).
+Once a search has run to the end, the answers are complete and no search is
+needed at all.
+
+The least recently used queries are dropped once there are more than
+max_entries of them. When something is told, only the queries whose
+predicate can depend on the predicate of the head told are dropped, as
+worked out from the dependencies the knowledge base keeps (see
+Dependencies.py).
+
+@author: Aashish Satyajith.
+
+"""
+
+from collections import OrderedDict
+
+from FolBC import *
+
+#______________________________________________________________________________
+
+# the options of fol_bc_ask the answers depend on, which are part of the key
+KEY_OPTIONS = ('tabled', 'joins', 'reorder', 'iterative_deepening', 'max_depth')
+
+# the options that may be given to a query for it to be cached; anything else
+# (recording the proofs, say) is passed on to a search that is not cached
+CACHED_OPTIONS = frozenset(KEY_OPTIONS + ('max_steps', 'timeout', 'max_memory'))
+
+# the statuses of a search that found every answer there is to find
+COMPLETE = ('exhausted', 'depth_limit')
+
+def key_value(option, value):
+    
+    """
+    What the value of option comes to in the key of a query: whether it is
+    set, for the options that are either on or off.
+    """
+    
+    if option == 'max_depth' or (option == 'tabled' and value == 'auto'):
+        return value
+    return bool(value)
+
+#______________________________________________________________________________
+
+class CacheEntry(object):
+    
+    """
+    The answers cached for one query:
+        predicate - (predicate, arity) of the query, None if it is just a
+                    variable
+        answers   - the answers found so far, in the order they were found
+                    (see AnswerCache.store())
+        status    - the status of the search that found them all, or None if
+                    there may be more
+    """
+    
+    def __init__(self, predicate):
+        self.predicate = predicate
+        self.answers = []
+        self.status = None
+
+#______________________________________________________________________________
+
+class AnswerCache(object):
+    
+    """
+    The cache of the answers to the queries asked of the knowledge base kb.
+    Holds the answers of up to max_entries queries, and of each query no
+    more than max_answers; a query with more answers than that is not
+    cached.
+    """
+    
+    def __init__(self, kb, max_entries = 1000, max_answers = 10000):
+        self.kb = kb
+        self.max_entries = max_entries
+        self.max_answers = max_answers
+        # the CacheEntry of each query, keyed by its variant and options, the
+        # least recently used first
+        self.entries = OrderedDict()
+        # the keys of the entries for each predicate
+        self.keys_by_predicate = {}
+        # goes up with every tell; what a search finds is only cached if
+        # nothing was told while it went on
+        self.epoch = 0
+        self.hits = self.misses = 0
+        self.evictions = self.invalidations = 0
+    
+    def tell(self, rule):
+        
+        """
+        Called by the knowledge base with each rule (or fact) told: drops the
+        entries of every predicate that depends on the head of rule.
+        """
+        
+        self.epoch += 1
+        if not self.entries:
+            return
+        # the head, and anything with a variable for a body literal, which
+        # the head may now prove
+        for predicate in self.kb.dependencies.dependents(literal_key(rule.head)):
+            for key in self.keys_by_predicate.pop(predicate, ()):
+                del self.entries[key]
+                self.invalidations += 1
+    
+    #__________________________________________________________________________
+    
+    def ask(self, query, options):
+        
+        """
+        Asks the query with the options of fol_bc_ask, through the cache if
+        the options allow it. Returns a Search, a CachedSearch if it goes
+        through the cache.
+        """
+        
+        if any(value for option, value in options.iteritems()
+               if option not in CACHED_OPTIONS):
+            return fol_bc_ask(self.kb, query, **options)
+        slots = {}
+        variant = compile_term(query, slots)
+        key = (variant,) + tuple([key_value(option, options.get(option))
+                                  for option in KEY_OPTIONS])
+        return CachedSearch(self, key, slots, self.kb, query, **options)
+    
+    def lookup(self, key):
+        
+        """
+        Returns the entry for key (None if there is none), counting a hit or
+        a miss.
+        """
+        
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        # the most recently used goes to the end
+        del self.entries[key]
+        self.entries[key] = entry
+        return entry
+    
+    def record(self, key, index, answer, slots):
+        
+        """
+        Adds answer, the answer at position index among those of the query
+        key (whose variables have the given slots), to its entry, unless the
+        entry already has it.
+        """
+        
+        entry = self.entries.get(key)
+        if entry is None:
+            if index != 0:
+                # the entry was dropped while the search went on
+                return
+            entry = self.add_entry(key)
+        if len(entry.answers) != index or entry.status is not None:
+            return
+        if index >= self.max_answers:
+            self.drop(key)
+            return
+        entry.answers.append(self.store(answer, slots))
+    
+    def complete(self, key, count, status):
+        
+        """
+        Marks the entry for the query key as having all its answers, count
+        of them, found with the given status.
+        """
+        
+        entry = self.entries.get(key)
+        if entry is None:
+            if count != 0:
+                return
+            entry = self.add_entry(key)
+        if len(entry.answers) == count:
+            entry.status = status
+    
+    def add_entry(self, key):
+        entry = self.entries[key] = CacheEntry(literal_key(key[0]))
+        self.keys_by_predicate.setdefault(entry.predicate, set()).add(key)
+        while len(self.entries) > self.max_entries:
+            self.drop(next(iter(self.entries)))
+            self.evictions += 1
+        return entry
+    
+    def drop(self, key):
+        entry = self.entries.pop(key)
+        keys = self.keys_by_predicate[entry.predicate]
+        keys.discard(key)
+        if not keys:
+            del self.keys_by_predicate[entry.predicate]
+    
+    def clear(self):
+        self.entries.clear()
+        self.keys_by_predicate.clear()
+    
+    #__________________________________________________________________________
+    
+    def store(self, answer, slots):
+        
+        """
+        Turns answer, an Answer to a query whose variables have the given
+        slots, into what is cached: the (slot, compiled value) of each of
+        its variables, and the variables in the values that are not in the
+        query, in the order of their slots after those of the query.
+        """
+        
+        extended = dict(slots)
+        values = tuple([(slots[vbl], compile_term(value, extended))
+                        for vbl, value in answer.iteritems()])
+        others = sorted((slot, vbl) for vbl, slot in extended.iteritems()
+                        if slot >= len(slots))
+        return values, tuple([vbl for _, vbl in others])
+    
+    def build(self, stored, slots):
+        
+        """
+        Builds the Answer stored (see store()) for a query whose variables
+        have the given slots.
+        """
+        
+        values, others = stored
+        variables = [None] * len(slots)
+        for vbl, slot in slots.iteritems():
+            variables[slot] = vbl
+        variables.extend(others)
+        answer = Answer()
+        for slot, value in values:
+            answer[variables[slot]] = instantiate(value, variables)
+        return answer
+    
+    def statistics(self):
+        
+        """
+        Returns the hits, misses, evictions and invalidations so far, and how
+        many entries there are, as a dict.
+        """
+        
+        return {'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'invalidations': self.invalidations,
+                'entries': len(self.entries), 'max_entries': self.max_entries}
+
+#______________________________________________________________________________
+
+class CachedSearch(Search):
+    
+    """
+    A Search that goes through an AnswerCache: the answers cached for its
+    query come first, and only if those run out before the search is over is
+    the search run, skipping the answers already handed out. What it finds
+    goes into the cache. stats['cached'] is the number of answers that came
+    out of the cache.
+    """
+    
+    def __init__(self, cache, key, slots, kb, query, **options):
+        Search.__init__(self, kb, query, **options)
+        self.cache = cache
+        self.key = key
+        self.slots = slots
+        self.cached = 0
+        self.epoch = None
+    
+    def find_answers(self):
+        cache = self.cache
+        self.epoch = cache.epoch
+        entry = cache.lookup(self.key)
+        if entry is not None:
+            for stored in list(entry.answers):
+                self.cached += 1
+                yield cache.build(stored, self.slots)
+            if entry.status is not None:
+                if entry.status == 'depth_limit':
+                    self.depth_cutoffs = 1
+                return
+        for index, answer in enumerate(Search.find_answers(self)):
+            if index < self.cached:
+                continue
+            if cache.epoch == self.epoch:
+                cache.record(self.key, index, answer, self.slots)
+            yield answer
+    
+    def __iter__(self):
+        for answer in Search.__iter__(self):
+            yield answer
+        if self.status in COMPLETE and self.cache.epoch == self.epoch:
+            self.cache.complete(self.key, self.answers, self.status)
+    
+    def __getstate__(self):
+        state = Search.__getstate__(self)
+        state['cache'] = None
+        return state
+    
+    @property
+    def stats(self):
+        stats = Search.stats.fget(self)
+        stats['cached'] = self.cached
+        return stats
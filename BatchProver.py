@@ -0,0 +1,200 @@
+"""
+The script that proves a whole file of queries against a knowledge base in
+one go, without asking anything on the way, and reports how long each one
+took.
+
+Usage: python BatchProver.py [options] kb_file query_file
+
+Both files have one statement per line, written as for AutoProver; blank
+lines and lines starting with # are skipped. The knowledge base may also be a
+snapshot (see Snapshot.py).
+
+@author: Aashish Satyajith.
+
+"""
+
+import json
+import sys
+import time
+from optparse import OptionParser
+
+from Parser import *
+from FolBC import *
+from Parallel import ask_parallel
+import Snapshot
+from BulkLoader import bulk_load, read_statement
+from Profiler import Profile
+
+#______________________________________________________________________________
+
+def read_statements(filename):
+    
+    """
+    Yields (line number, clause) for every statement in the file, and
+    (line number, the ParseError) for every line that could not be read as
+    one.
+    """
+    
+    with open(filename) as statements:
+        for number, line in enumerate(statements, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                yield number, read_statement(line)
+            except ParseError as error:
+                # the line is not a statement; say so and go on with the rest
+                yield number, error
+
+def load_kb(filename):
+    
+    """
+    Reads the knowledge base in the file, which may be a snapshot saved by
+    KnowledgeBase.save() instead of statements.
+    """
+    
+    kb = KnowledgeBase()
+    if Snapshot.is_snapshot(filename):
+        kb.load(filename)
+    else:
+        print 'Loaded', bulk_load(kb, filename)
+    return kb
+
+def load_queries(filename):
+    
+    """
+    Reads the queries in the file.
+    """
+    
+    queries = []
+    for number, clause in read_statements(filename):
+        if isinstance(clause, ParseError):
+            print '%s, line %d: %s at position %d, query ignored' % \
+                  (filename, number, clause.message, clause.position)
+        else:
+            queries.append(clause)
+    return queries
+
+#______________________________________________________________________________
+
+def percentile(ordered, fraction):
+    
+    """
+    Returns the value the given fraction of the way up an ordered list.
+    """
+    
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def run_batch(kb, queries, first_only = True, show_answers = False,
+              processes = 1, **options):
+    
+    """
+    Proves every query against kb, printing a line for each as it is done,
+    and then a summary. Returns the list of (query, answers, search) of
+    KnowledgeBase.ask_many.
+    With processes more than 1, the queries are shared out among that many
+    worker processes (see Parallel.ask_parallel).
+    """
+    
+    if processes > 1:
+        batch = ask_parallel(kb, queries, processes, None, first_only, **options)
+    else:
+        batch = kb.ask_many(queries, first_only, **options)
+    results = []
+    started = time.time()
+    for query, answers, search in batch:
+        results.append((query, answers, search))
+        if answers:
+            outcome = 'proved (%d answer%s)' % (len(answers), '' if len(answers) == 1 else 's')
+        elif search.status in ('exhausted', 'stopped'):
+            outcome = 'not proved'
+        else:
+            outcome = 'not proved (%s)' % search.status
+        print '%s: %s in %.3f ms' % (query, outcome, search.stats['elapsed'] * 1000)
+        if show_answers:
+            for answer in answers:
+                if answer:
+                    print '    ' + ', '.join('%s = %s' % (vbl, value) for vbl, value in sorted(answer.items()))
+    total = time.time() - started
+    
+    print ''
+    print 'Queries: %d, proved: %d, not proved: %d' % \
+          (len(results), sum(1 for _, answers, _ in results if answers),
+           sum(1 for _, answers, _ in results if not answers))
+    if results:
+        latencies = sorted(search.stats['elapsed'] for _, _, search in results)
+        print 'Total time: %.3f s (%.1f queries/s)' % (total, len(results) / max(total, 1e-9))
+        print 'Latency (ms): mean %.3f, median %.3f, 95th percentile %.3f, max %.3f' % \
+              (sum(latencies) / len(latencies) * 1000, percentile(latencies, 0.5) * 1000,
+               percentile(latencies, 0.95) * 1000, latencies[-1] * 1000)
+    return results
+
+def write_profile(results, filename):
+    
+    """
+    Writes the Profile of each query in results (see run_batch; the queries
+    must have been asked with profile set) to the file as JSON, along with
+    them all merged, and prints the merged counts and hottest rules.
+    """
+    
+    total = Profile()
+    queries = []
+    for query, answers, search in results:
+        total.merge(search.profile)
+        queries.append({'query': str(query), 'status': search.status,
+                        'stats': search.stats, 'profile': search.profile.as_dict()})
+    with open(filename, 'w') as profile_file:
+        json.dump({'queries': queries, 'total': total.as_dict()}, profile_file,
+                  indent = 2, sort_keys = True)
+    print ''
+    print total.report()
+
+#______________________________________________________________________________
+
+def main(args):
+    option_parser = OptionParser(usage = 'python BatchProver.py [options] kb_file query_file')
+    option_parser.add_option('--all', action = 'store_true', default = False,
+                             help = 'find every answer to each query, not just the first')
+    option_parser.add_option('--answers', action = 'store_true', default = False,
+                             help = 'print the answers found')
+    option_parser.add_option('--no-tabling', action = 'store_false', dest = 'tabled', default = True,
+                             help = 'do not table subgoals (nor share them across queries)')
+    option_parser.add_option('--auto-tabling', action = 'store_const', dest = 'tabled', const = 'auto',
+                             help = 'only table the subgoals of recursive predicates')
+    option_parser.add_option('--joins', action = 'store_true', default = False,
+                             help = 'prove rule bodies over facts alone set-at-a-time, with joins')
+    option_parser.add_option('--reorder', action = 'store_true', default = False,
+                             help = 'prove the literals of rule bodies in the order estimated to be cheapest')
+    option_parser.add_option('--explain', action = 'store_true', default = False,
+                             help = 'print the order the rule bodies for each query would be proved in')
+    option_parser.add_option('--processes', type = 'int', default = 1,
+                             help = 'number of worker processes to share the queries among')
+    option_parser.add_option('--save-snapshot', metavar = 'FILE',
+                             help = 'save the knowledge base as a snapshot to FILE, to load faster next time')
+    option_parser.add_option('--profile', metavar = 'FILE',
+                             help = 'count what the prover does for each query and write it to FILE as JSON')
+    option_parser.add_option('--max-steps', type = 'int', help = 'inference steps allowed per query')
+    option_parser.add_option('--timeout', type = 'float', help = 'seconds allowed per query')
+    options, args = option_parser.parse_args(args)
+    if len(args) != 2:
+        option_parser.error('need a knowledge base file and a query file')
+    
+    started = time.time()
+    kb = load_kb(args[0])
+    queries = load_queries(args[1])
+    print 'Loaded %d rules, %d facts and %d queries in %.3f s\n' % \
+          (len(kb.rules), len(kb.facts), len(queries), time.time() - started)
+    if options.save_snapshot:
+        kb.save(options.save_snapshot)
+    if options.explain:
+        for query in queries:
+            print kb.explain(query) + '\n'
+    results = run_batch(kb, queries, not options.all, options.answers, options.processes,
+                        tabled = options.tabled, joins = options.joins, reorder = options.reorder,
+                        profile = bool(options.profile), max_steps = options.max_steps,
+                        timeout = options.timeout)
+    if options.profile:
+        write_profile(results, options.profile)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,456 @@
+"""
+The script that benchmarks the prover on synthetic knowledge bases that can
+be made as big as wanted, and writes the results out as JSON so that runs
+can be compared across versions.
+
+Usage: python Benchmark.py [options]
+       python Benchmark.py --compare old_results new_results
+
+The workloads are scaled-up versions of the crime and farm knowledge bases
+of AutoProver.py, long transitive closure chains, rule sets where one goal
+has many rules, and large fact tables. For each the benchmark measures how
+fast the statements are told, how long each query takes to its first
+answer and to all its answers (and how many inference steps that takes),
+and the peak memory of the process. Every workload runs in a process of
+its own, so that the memory of one does not count against the next.
+The knowledge bases are generated from a seeded random number generator,
+so the same options always give the same workloads.
+
+@author: Aashish Satyajith.
+
+"""
+
+import json
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from optparse import OptionParser
+
+try:
+    import resource
+except ImportError:
+    # no peak memory figures then
+    resource = None
+
+from Parser import *
+from FolBC import *
+
+#______________________________________________________________________________
+
+# the workloads: each takes a size and a random.Random, and returns the
+# statements of its knowledge base and its queries, each query with the
+# options to ask it with
+
+def crime_workload(size, rng):
+    
+    """
+    size copies of the crime knowledge base, each with its own American,
+    missile and enemy nation. Since the rule for Criminal goes through every
+    weapon and every hostile nation before it gets to Sells, proving one
+    American a criminal takes time quadratic in size.
+    """
+    
+    statements = ['(American(x) & Weapon(y) & Hostile(z) & Sells(x, y, z)) ==> Criminal(x)',
+                  'Missile(x) ==> Weapon(x)',
+                  'Enemy(x, America) ==> Hostile(x)']
+    for i in xrange(size):
+        statements.extend(['Owns(Nono%d, M%d)' % (i, i),
+                           'Missile(M%d)' % i,
+                           'Missile(x) & Owns(Nono%d, x) ==> Sells(West%d, x, Nono%d)' % (i, i, i),
+                           'American(West%d)' % i,
+                           'Enemy(Nono%d, America)' % i])
+    rng.shuffle(statements)
+    american = 'West%d' % rng.randrange(size)
+    queries = [('Criminal(%s)' % american, {}),
+               ('Criminal(%s)' % american, {'tabled': True})]
+    return statements, queries
+
+def farm_workload(size, rng):
+    
+    """
+    size farms of the farm knowledge base, with a few generations of
+    mothers above each farmer and rabbit.
+    """
+    
+    statements = ['(Rabbit(r) & Farmer(f)) ==> Hates(f, r)',
+                  '(Mother(m, c)) ==> Loves(m, c)',
+                  '(Mother(m, r) & Rabbit(r)) ==> Rabbit(m)',
+                  '(Farmer(f)) ==> Human(f)',
+                  '(Mother(m, h) & Human(h)) ==> Human(m)']
+    for i in xrange(size):
+        statements.extend(['Farmer(Mac%d)' % i, 'Rabbit(Pete%d)' % i])
+        for name in ('Mac%d' % i, 'Pete%d' % i):
+            child = name
+            for generation in xrange(3):
+                mother = 'Mother%d_%s' % (generation, name)
+                statements.append('Mother(%s, %s)' % (mother, child))
+                child = mother
+    queries = [('Human(Mother2_Mac%d)' % rng.randrange(size), {}),
+               ('Hates(Mac%d, y)' % rng.randrange(size), {}),
+               ('Rabbit(x)', {'tabled': True})]
+    return statements, queries
+
+def chain_workload(size, rng):
+    
+    """
+    A chain of size Parent facts, with ancestry as its transitive closure.
+    """
+    
+    statements = ['Parent(P%d, P%d)' % (i, i + 1) for i in xrange(size)]
+    statements += ['Parent(x, y) ==> Ancestor(x, y)',
+                   'Parent(x, y) & Ancestor(y, z) ==> Ancestor(x, z)']
+    queries = [('Ancestor(P0, P%d)' % size, {'tabled': True}),
+               ('Ancestor(P%d, x)' % (size // 2), {'tabled': True}),
+               ('Ancestor(P%d, P0)' % size, {'tabled': True}),
+               ('Ancestor(P%d, x)' % (size // 2), {'tabled': 'auto'})]
+    return statements, queries
+
+def fanout_workload(size, rng):
+    
+    """
+    size rules for the one goal, each through a predicate of its own with a
+    few facts.
+    """
+    
+    statements = []
+    for i in xrange(size):
+        statements.append('Kind%d(x) & Tagged(x, T%d) ==> Item(x)' % (i, i))
+        for j in xrange(3):
+            thing = 'A%d' % rng.randrange(size)
+            statements.extend(['Kind%d(%s)' % (i, thing), 'Tagged(%s, T%d)' % (thing, i)])
+    queries = [('Item(A%d)' % rng.randrange(size), {}),
+               ('Item(x)', {}),
+               ('Item(Nothing)', {})]
+    return statements, queries
+
+def facts_workload(size, rng):
+    
+    """
+    Two large tables of facts, a random graph and a colouring of its nodes,
+    with a rule joining them.
+    """
+    
+    statements = []
+    targets = []
+    for i in xrange(size):
+        targets.append(rng.randrange(size))
+        statements.append('Edge(N%d, N%d)' % (i, targets[-1]))
+        statements.append('Color(N%d, C%d)' % (i, rng.randrange(50)))
+    statements.append('Edge(x, y) & Color(y, C1) ==> Hit(x)')
+    node = 'N%d' % rng.choice(targets)
+    queries = [('Edge(x, %s)' % node, {}),
+               ('Hit(%s)' % node, {}),
+               ('Hit(x)', {'joins': True}),
+               ('Hit(x)', {'reorder': True})]
+    return statements, queries
+
+# the workloads by name, with their size at scale 1
+WORKLOADS = [('crime', crime_workload, 200),
+             ('farm', farm_workload, 1000),
+             ('chain', chain_workload, 200),
+             ('fanout', fanout_workload, 300),
+             ('facts', facts_workload, 20000)]
+
+# the statuses (see FolBC.Search) of a search that came to its end; the time
+# of any other measures a search cut short, not the query
+VALID_STATUSES = ('exhausted', 'stopped')
+
+#______________________________________________________________________________
+
+def peak_memory():
+    
+    """
+    The most memory, in bytes, the process has taken up so far (None where
+    that cannot be found out).
+    """
+    
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def time_query(kb, query, first_only, repeat, options):
+    
+    """
+    Asks query repeat times, up to its first answer or to all of them, and
+    returns the fastest time with the steps, answers and status of that run.
+    If a run does not come to its end (its status is not one of
+    VALID_STATUSES), it is returned as it is, with valid False, and the
+    query is not asked again.
+    """
+    
+    best = None
+    for _ in xrange(repeat):
+        started = time.time()
+        search = kb.ask(query, **options)
+        answers = 0
+        found = iter(search)
+        for _ in found:
+            answers += 1
+            if first_only:
+                found.close()
+                break
+        seconds = time.time() - started
+        result = {'seconds': seconds, 'steps': search.stats['steps'],
+                  'answers': answers, 'status': search.status,
+                  'valid': search.status in VALID_STATUSES}
+        if not result['valid']:
+            return result
+        if best is None or seconds < best['seconds']:
+            best = result
+    return best
+
+def query_status(query):
+    
+    """
+    The status the results of query go by: that of the first of its runs
+    (to its first answer, then to all of them) not to come to its end, if
+    any does not.
+    """
+    
+    for run in (query['first'], query['all']):
+        if run['status'] not in VALID_STATUSES:
+            return run['status']
+    return query['all']['status']
+
+def is_valid(query):
+    
+    """
+    Whether both runs of the results of query came to their end. Goes by
+    their status, so that results written before valid was recorded can be
+    checked too.
+    """
+    
+    return query_status(query) in VALID_STATUSES
+
+def run_workload(name, make, size, seed, repeat, timeout):
+    
+    """
+    Builds the workload, tells it to a new knowledge base and asks its
+    queries, and returns the measurements as a dict. The results of each
+    query say whether they are valid (see time_query()).
+    """
+    
+    rng = random.Random('%s-%d' % (name, seed))
+    started = time.time()
+    statements, queries = make(size, rng)
+    generated = time.time() - started
+    
+    started = time.time()
+    clauses = [parse_clause(statement) for statement in statements]
+    parsed = time.time() - started
+    
+    memory_before = peak_memory()
+    kb = KnowledgeBase()
+    started = time.time()
+    for clause in clauses:
+        kb.tell(clause)
+    told = time.time() - started
+    memory_told = peak_memory()
+    
+    results = []
+    for query, options in queries:
+        options = dict(options, timeout = timeout)
+        clause = parse_clause(query)
+        result = {'query': query,
+                  'options': dict((option, value) for option, value in options.iteritems()
+                                  if option != 'timeout'),
+                  'first': time_query(kb, clause, True, repeat, options),
+                  'all': time_query(kb, clause, False, repeat, options)}
+        result['valid'] = is_valid(result)
+        results.append(result)
+    return {'name': name,
+            'size': size,
+            'statements': len(statements),
+            'rules': len(kb.rules),
+            'facts': len(kb.facts),
+            'generate_seconds': generated,
+            'parse_seconds': parsed,
+            'tell_seconds': told,
+            'tell_rate': len(statements) / max(told, 1e-9),
+            'kb_memory': memory_told - memory_before if memory_before is not None else None,
+            'peak_memory': peak_memory(),
+            'queries': results}
+
+def run_in_process(args):
+    
+    """
+    run_workload, in a worker process of its own.
+    """
+    
+    return run_workload(*args)
+
+def run_benchmark(names = None, scale = 1.0, seed = 0, repeat = 3, timeout = 60.0,
+                  separate = True, report = None):
+    
+    """
+    Runs the named workloads (all of them by default), each with its size at
+    scale 1 times scale, and returns the results as a dict: a 'meta' dict
+    telling what was run where, and the list of the results of each workload
+    under 'workloads'.
+    Each query gets timeout seconds. With separate set, each workload runs
+    in a new process, so that the peak memory is that workload's alone.
+    report, if given, is called with the results of each workload as they
+    come in.
+    """
+    
+    chosen = [(name, make, max(1, int(size * scale))) for name, make, size in WORKLOADS
+              if names is None or name in names]
+    results = {'meta': {'started': time.strftime('%Y-%m-%d %H:%M:%S'),
+                        'revision': revision(),
+                        'python': platform.python_version(),
+                        'platform': platform.platform(),
+                        'scale': scale,
+                        'seed': seed,
+                        'repeat': repeat},
+               'workloads': []}
+    for name, make, size in chosen:
+        args = (name, make, size, seed, repeat, timeout)
+        if separate:
+            pool = multiprocessing.Pool(1)
+            try:
+                result = pool.apply(run_in_process, (args,))
+            finally:
+                pool.terminate()
+                pool.join()
+        else:
+            result = run_workload(*args)
+        results['workloads'].append(result)
+        if report is not None:
+            report(result)
+    return results
+
+def revision():
+    
+    """
+    The git commit the code being benchmarked is at, if it is in a git
+    checkout.
+    """
+    
+    try:
+        with open(os.devnull, 'w') as devnull:
+            return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr = devnull,
+                                           cwd = os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+#______________________________________________________________________________
+
+def print_workload(result):
+    print '%s (size %d): %d statements told in %.3f s (%.0f statements/s), peak memory %s' % \
+          (result['name'], result['size'], result['statements'], result['tell_seconds'],
+           result['tell_rate'], format_bytes(result['peak_memory']))
+    for query in result['queries']:
+        options = ', '.join('%s=%s' % item for item in sorted(query['options'].items()))
+        name = query['query'] + (' [' + options + ']' if options else '')
+        if not is_valid(query):
+            print '    %s: INVALID, not run to the end (%s)' % (name, query_status(query))
+            continue
+        print '    %s: first answer %.3f ms (%d steps), all %d answers %.3f ms (%d steps)' % \
+              (name, query['first']['seconds'] * 1000, query['first']['steps'],
+               query['all']['answers'], query['all']['seconds'] * 1000, query['all']['steps'])
+
+def format_bytes(count):
+    if count is None:
+        return 'unknown'
+    return '%.1f MB' % (count / 1048576.0)
+
+def compare(old, new):
+    
+    """
+    Prints how the measurements of the results new compare with those of
+    the results old, as the ratio new / old of each (below 1 is faster or
+    smaller). Queries that are not valid in either (see is_valid()) are not
+    compared.
+    """
+    
+    print 'old: %s (%s)' % (old['meta']['revision'], old['meta']['started'])
+    print 'new: %s (%s)' % (new['meta']['revision'], new['meta']['started'])
+    old_workloads = dict((result['name'], result) for result in old['workloads'])
+    for result in new['workloads']:
+        before = old_workloads.get(result['name'])
+        if before is None:
+            continue
+        if before['size'] != result['size']:
+            print '%s: sizes differ (%d and %d), not compared' % \
+                  (result['name'], before['size'], result['size'])
+            continue
+        print '%s: tell %s, peak memory %s' % \
+              (result['name'], ratio(before['tell_seconds'], result['tell_seconds']),
+               ratio(before['peak_memory'], result['peak_memory']))
+        old_queries = dict(((query['query'], json.dumps(query['options'], sort_keys = True)), query)
+                           for query in before['queries'])
+        for query in result['queries']:
+            earlier = old_queries.get((query['query'], json.dumps(query['options'], sort_keys = True)))
+            if earlier is None:
+                continue
+            if not is_valid(earlier) or not is_valid(query):
+                print '    %s: not run to the end (old %s, new %s), not compared' % \
+                      (query['query'], query_status(earlier), query_status(query))
+                continue
+            print '    %s: first answer %s, all answers %s, steps %s' % \
+                  (query['query'], ratio(earlier['first']['seconds'], query['first']['seconds']),
+                   ratio(earlier['all']['seconds'], query['all']['seconds']),
+                   ratio(earlier['all']['steps'], query['all']['steps']))
+
+def ratio(old, new):
+    if old is None or new is None or not old:
+        return 'n/a'
+    return '%.2fx' % (float(new) / old)
+
+#______________________________________________________________________________
+
+def main(args):
+    option_parser = OptionParser(usage = 'python Benchmark.py [options]\n'
+                                         '       python Benchmark.py --compare old_results new_results')
+    option_parser.add_option('--workloads', metavar = 'NAMES',
+                             help = 'comma separated workloads to run (default all: %s)'
+                                    % ', '.join(name for name, _, _ in WORKLOADS))
+    option_parser.add_option('--scale', type = 'float', default = 1.0,
+                             help = 'multiply the size of every workload by this')
+    option_parser.add_option('--seed', type = 'int', default = 0,
+                             help = 'seed for generating the knowledge bases')
+    option_parser.add_option('--repeat', type = 'int', default = 3,
+                             help = 'times to ask each query; the fastest counts')
+    option_parser.add_option('--timeout', type = 'float', default = 60.0,
+                             help = 'seconds allowed per query')
+    option_parser.add_option('--output', metavar = 'FILE',
+                             help = 'write the results to FILE as JSON (default benchmark-<time>.json)')
+    option_parser.add_option('--same-process', action = 'store_false', dest = 'separate', default = True,
+                             help = 'run every workload in this process rather than one each')
+    option_parser.add_option('--compare', action = 'store_true', default = False,
+                             help = 'compare two results files instead of running anything')
+    options, args = option_parser.parse_args(args)
+    
+    if options.compare:
+        if len(args) != 2:
+            option_parser.error('need two results files to compare')
+        with open(args[0]) as old, open(args[1]) as new:
+            compare(json.load(old), json.load(new))
+        return
+    if args:
+        option_parser.error('unexpected arguments: ' + ' '.join(args))
+    names = None
+    if options.workloads:
+        names = options.workloads.split(',')
+        unknown = set(names) - set(name for name, _, _ in WORKLOADS)
+        if unknown:
+            option_parser.error('no such workloads: ' + ', '.join(sorted(unknown)))
+    output = options.output or time.strftime('benchmark-%Y%m%d-%H%M%S.json')
+    results = run_benchmark(names, options.scale, options.seed, options.repeat,
+                            options.timeout, options.separate, print_workload)
+    with open(output, 'w') as results_file:
+        json.dump(results, results_file, indent = 2, sort_keys = True)
+    print 'Results written to', output
+    invalid = sum(1 for result in results['workloads'] for query in result['queries']
+                  if not query['valid'])
+    if invalid:
+        print '%d queries were not run to the end; their times are not valid' % invalid
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
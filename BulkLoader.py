@@ -0,0 +1,157 @@
+"""
+The script that loads large numbers of statements into a knowledge base:
+streamed from a file (or anything else that gives statements one by one) in
+batches, without printing anything for each statement along the way.
+
+@author: Aashish Satyajith.
+
+"""
+
+import gc
+import re
+import time
+
+from Parser import *
+from FolBC import *
+
+#______________________________________________________________________________
+
+# a statement that is just a predicate with simple arguments, or a plain
+# proposition, for e.g. Parent(Tom, Bob) or P; by far the most common kind in
+# a big knowledge base, and one that can be built straight away instead of
+# going through the parser
+SIMPLE_FACT = re.compile(r'\s*(\w+)\s*(?:\(([\w\s,]*)\))?\s*$')
+
+def read_statement(statement, constants = None):
+    
+    """
+    Converts a statement to a clause, the way parse_clause(statement) does,
+    but faster still for simple facts.
+    constants, if given, is a dict of the clauses for the names seen so far,
+    which saves building (and interning) the same few clauses over and over.
+    """
+    
+    match = SIMPLE_FACT.match(statement)
+    if match is None:
+        return parse_clause(statement)
+    predicate, args = match.groups()
+    if args is None:
+        return Clause(predicate)
+    if constants is None:
+        constants = {}
+    # the tokenizer treats commas as spaces, and so do we
+    args = args.replace(',', ' ').split()
+    for i, arg in enumerate(args):
+        clause = constants.get(arg)
+        if clause is None:
+            clause = constants[arg] = Clause(arg)
+        args[i] = clause
+    return Clause(predicate, args)
+
+#______________________________________________________________________________
+
+class LoadStats(object):
+    
+    """
+    What happened to the statements given to bulk_load(): how many were
+    read, added, already known (duplicates), left out for not being definite
+    clauses, or could not be read at all, and how long it took.
+    """
+    
+    def __init__(self):
+        self.statements = 0
+        self.added = 0
+        self.duplicates = 0
+        self.not_definite = 0
+        self.unreadable = 0
+        self.elapsed = 0.0
+    
+    def rate(self):
+        
+        """
+        Statements loaded per second.
+        """
+        
+        return self.statements / max(self.elapsed, 1e-9)
+    
+    def __repr__(self):
+        return ('%d statements in %.3f s (%.0f statements/s): %d added, %d duplicates, '
+                '%d not definite, %d unreadable'
+                % (self.statements, self.elapsed, self.rate(), self.added,
+                   self.duplicates, self.not_definite, self.unreadable))
+
+#______________________________________________________________________________
+
+def statements_in(source):
+    
+    """
+    Yields the statements in source, a file name or an iterable of
+    statements (strings or clauses), skipping blank lines and lines starting
+    with #.
+    """
+    
+    if isinstance(source, str):
+        with open(source) as lines:
+            for line in lines:
+                yield line
+    else:
+        for statement in source:
+            yield statement
+
+def bulk_load(kb, source, batch_size = 10000, report = None):
+    
+    """
+    Loads every statement in source (see statements_in()) into the
+    knowledge base kb, batch_size statements at a time, and returns the
+    LoadStats. Statements that cannot be read or are not definite clauses
+    are counted rather than printed one by one. If report is given, it is
+    called with the LoadStats so far after every batch, for e.g. to show
+    progress on a long load.
+    Duplicates are caught by the knowledge base's hash of the clauses it
+    holds, so loading takes time linear in the number of statements.
+    """
+    
+    # everything built while loading stays, so the garbage collector would
+    # only go over the same growing heap of clauses again and again
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return load_statements(kb, source, batch_size, report)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+def load_statements(kb, source, batch_size, report):
+    stats = LoadStats()
+    started = time.time()
+    batch = []
+    constants = {}
+    for statement in statements_in(source):
+        if not isinstance(statement, Clause):
+            statement = statement.strip()
+            if not statement or statement.startswith('#'):
+                continue
+            try:
+                statement = read_statement(statement, constants)
+            except ParseError:
+                stats.statements += 1
+                stats.unreadable += 1
+                continue
+        stats.statements += 1
+        batch.append(statement)
+        if len(batch) == batch_size:
+            tell_batch(kb, batch, stats, started, report)
+            batch = []
+    if batch:
+        tell_batch(kb, batch, stats, started, report)
+    stats.elapsed = time.time() - started
+    return stats
+
+def tell_batch(kb, batch, stats, started, report):
+    added, duplicates, not_definite = kb.tell_many(batch)
+    stats.added += added
+    stats.duplicates += duplicates
+    stats.not_definite += not_definite
+    stats.elapsed = time.time() - started
+    if report is not None:
+        report(stats)
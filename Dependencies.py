@@ -0,0 +1,231 @@
+"""
+The script that keeps track of how the predicates of a knowledge base depend
+on each other: predicate P depends on predicate Q if some rule for P has Q in
+its body. The knowledge base keeps one of these up to date with every tell
+(see KnowledgeBase.dependencies), and the prover uses it in two ways.
+
+Firstly, it knows which predicates can possibly hold: those with a fact,
+and those with a rule whose body predicates can all possibly hold. A rule
+with a body predicate that cannot hold (one with no facts, say, and no rules
+that could ever prove it) can never be used, so the prover skips it straight
+away instead of proving the rest of its body first (see FolBC.fol_bc_rules).
+As nothing is ever taken back out of a knowledge base, a predicate that can
+hold always will, so this is worked out as the clauses come in: each rule
+that cannot be used yet counts the body predicates it is waiting for.
+
+Secondly, it splits the predicates into strongly connected components: sets
+of predicates that all depend on each other, through recursive rules. Only
+subgoals of a predicate in such a set can call themselves again, so they are
+the only ones tabling is needed for (see the tabled option 'auto' of
+FolBC.Search). The components are worked out (with Tarjan's algorithm) when
+first asked for after a rule has added a new dependency.
+
+A body literal that is just a variable, as in P(x) & x ==> Q(x), may be any
+predicate at all; it counts as the predicate None, which can hold as soon as
+anything can, and which depends on every predicate.
+
+@author: Aashish Satyajith.
+
+"""
+
+#______________________________________________________________________________
+
+class Dependencies(object):
+    
+    """
+    The dependencies between the predicates of a knowledge base, each
+    predicate given as (predicate, arity):
+        uses       - the predicates in the bodies of the rules for each
+                     predicate
+        users      - the predicates with a rule that uses each predicate
+        alive      - the predicates that can possibly hold
+        dead_rules - each rule that cannot be used (yet), with the number of
+                     the distinct body predicates it has that cannot hold
+        waiting    - the rules in dead_rules waiting on each predicate
+    """
+    
+    def __init__(self):
+        self.uses = {}
+        self.users = {}
+        self.alive = set()
+        self.dead_rules = {}
+        self.waiting = {}
+        # the number of the strongly connected component of each predicate
+        # and the predicates that are recursive, or None if a rule has added
+        # a dependency since they were worked out
+        self.component_of = None
+        self.cyclic = None
+    
+    def add_fact(self, predicate):
+        
+        """
+        Notes that predicate has a fact.
+        """
+        
+        if predicate not in self.alive:
+            self.make_alive(predicate)
+    
+    def add_rule(self, rule):
+        
+        """
+        Adds the dependencies of the Rule rule, and notes that its head can
+        hold if its body can.
+        """
+        
+        literal_key = KBUtil.literal_key
+        head = literal_key(rule.head)
+        body = set([literal_key(literal) for literal in rule.body])
+        uses = self.uses.setdefault(head, set())
+        for predicate in body:
+            if predicate not in uses:
+                uses.add(predicate)
+                self.users.setdefault(predicate, set()).add(head)
+                self.component_of = self.cyclic = None
+        missing = [predicate for predicate in body if not self.can_hold(predicate)]
+        if not missing:
+            self.make_alive(head)
+            return
+        self.dead_rules[rule] = len(missing)
+        for predicate in missing:
+            self.waiting.setdefault(predicate, []).append(rule)
+    
+    def make_alive(self, predicate):
+        
+        """
+        Notes that predicate can hold, and so can the heads of the rules that
+        were only waiting for it, and so on.
+        """
+        
+        literal_key = KBUtil.literal_key
+        stack = [predicate]
+        while stack:
+            predicate = stack.pop()
+            if predicate in self.alive:
+                continue
+            if not self.alive and predicate is not None:
+                # a body literal that is a variable can hold from now on
+                stack.append(None)
+            self.alive.add(predicate)
+            for rule in self.waiting.pop(predicate, ()):
+                self.dead_rules[rule] -= 1
+                if not self.dead_rules[rule]:
+                    del self.dead_rules[rule]
+                    stack.append(literal_key(rule.head))
+    
+    #__________________________________________________________________________
+    
+    def can_hold(self, predicate):
+        
+        """
+        Whether predicate can possibly hold: it has a fact, or a rule whose
+        body predicates can all hold.
+        """
+        
+        return predicate in self.alive
+    
+    def dependents(self, predicate):
+        
+        """
+        Returns the set of the predicates that depend on predicate, directly
+        or not, predicate itself (and None) included.
+        """
+        
+        found = set()
+        stack = [predicate, None]
+        while stack:
+            predicate = stack.pop()
+            if predicate in found:
+                continue
+            found.add(predicate)
+            stack.extend(self.users.get(predicate, ()))
+        return found
+    
+    def recursive(self, predicate):
+        
+        """
+        Whether predicate may depend on itself, and so needs tabling for its
+        subgoals to be sure to terminate.
+        """
+        
+        if self.cyclic is None:
+            self.find_components()
+        return predicate in self.cyclic
+    
+    def component(self, predicate):
+        
+        """
+        Returns the number of the strongly connected component of predicate.
+        Components are numbered so that one only depends on components with
+        smaller numbers than its own.
+        """
+        
+        if self.component_of is None:
+            self.find_components()
+        return self.component_of.get(predicate)
+    
+    def find_components(self):
+        
+        """
+        Works out the strongly connected components of the predicates with
+        Tarjan's algorithm, going through the dependencies with a stack of
+        our own rather than by recursion, since chains of rules can be long.
+        """
+        
+        nodes = set(self.uses) | set(self.users) | self.alive
+        everything = list(nodes)
+        
+        def successors(node):
+            # a variable body literal may be any predicate
+            return everything if node is None else self.uses.get(node, ())
+        
+        index = {}
+        low = {}
+        stack = []
+        on_stack = set()
+        self.component_of = {}
+        self.cyclic = set()
+        count = 0
+        for root in everything:
+            if root in index:
+                continue
+            index[root] = low[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(successors(root)))]
+            while work:
+                node, children = work[-1]
+                for child in children:
+                    if child not in index:
+                        index[child] = low[child] = len(index)
+                        stack.append(child)
+                        on_stack.add(child)
+                        work.append((child, iter(successors(child))))
+                        break
+                    elif child in on_stack:
+                        low[node] = min(low[node], index[child])
+                else:
+                    # every successor of node is done
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        low[parent] = min(low[parent], low[node])
+                    if low[node] != index[node]:
+                        continue
+                    members = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        members.append(member)
+                        if member == node:
+                            break
+                    for member in members:
+                        self.component_of[member] = count
+                    count += 1
+                    if len(members) > 1 or node in successors(node):
+                        self.cyclic.update(members)
+
+#______________________________________________________________________________
+
+# KBUtil keeps a Dependencies for every knowledge base, so it is only
+# imported once everything above is in place (see FactStore.py)
+import KBUtil
@@ -0,0 +1,278 @@
+"""
+The script that keeps the ground facts of a knowledge base (facts with no
+variables in them, such as Owns(Nono, M1)) apart from its rules, in tables
+of columns rather than as a Clause and a Rule each.
+
+Every argument of a fact is given a number the first time it comes up, and
+each (predicate, arity) gets a table with one array of those numbers per
+argument position. A goal with constants in it is answered straight out of
+the table: each argument position gets a hash index of its own, built the
+first time a goal has a constant there, so finding the facts that match a
+goal costs about as much as there are matches, not as there are facts.
+
+@author: Aashish Satyajith.
+
+"""
+
+import heapq
+from array import array
+from itertools import izip
+
+#______________________________________________________________________________
+
+class FactTable(object):
+    
+    """
+    The ground facts with one (predicate, arity), one row per fact, in the
+    order they were told.
+        columns   - for each argument position, the array of the numbers
+                    (see FactStore.terms) of the argument in each row
+        positions - the array of the told positions of the rows (see
+                    KnowledgeBase.told), to merge them with the rules
+        rows      - the row of each fact, keyed by the tuple of the numbers
+                    of its arguments; all the duplicate check we need
+        indexes   - for each argument position, None until a goal has a
+                    constant there, and then a dict from each number in the
+                    column to the array of the rows it is in
+    """
+    
+    def __init__(self, predicate, arity):
+        self.predicate = predicate
+        self.arity = arity
+        self.columns = [array('i') for _ in xrange(arity)]
+        self.positions = array('i')
+        self.rows = {}
+        self.indexes = [None] * arity
+    
+    def __len__(self):
+        return len(self.positions)
+    
+    def add(self, ids, posn):
+        
+        """
+        Adds the row of argument numbers ids, told at position posn, unless
+        it is there already. Returns whether it was added.
+        """
+        
+        if ids in self.rows:
+            return False
+        row = len(self.positions)
+        self.rows[ids] = row
+        self.positions.append(posn)
+        for column, index, value in izip(self.columns, self.indexes, ids):
+            column.append(value)
+            if index is not None:
+                # the index has been built already, so keep it up to date
+                bucket = index.get(value)
+                if bucket is None:
+                    index[value] = array('i', [row])
+                else:
+                    bucket.append(row)
+        return True
+    
+    def index(self, i):
+        
+        """
+        Returns the hash index on argument position i, building it first if
+        no goal has needed it so far.
+        """
+        
+        index = self.indexes[i]
+        if index is None:
+            index = {}
+            for row, value in enumerate(self.columns[i]):
+                bucket = index.get(value)
+                if bucket is None:
+                    index[value] = array('i', [row])
+                else:
+                    bucket.append(row)
+            self.indexes[i] = index
+        return index
+    
+    def distinct(self, i):
+        
+        """
+        The number of different terms in argument position i.
+        """
+        
+        return len(self.index(i))
+        
+    def count(self, i, value):
+        
+        """
+        The number of rows with the term numbered value in argument position
+        i.
+        """
+        
+        bucket = self.index(i).get(value)
+        return 0 if bucket is None else len(bucket)
+        
+    def lookup(self, bound):
+        
+        """
+        Returns the rows, in told order, whose arguments agree with bound, a
+        list of (argument position, number) for the arguments the goal has a
+        constant for.
+        A goal with every argument bound is a single hash lookup. Otherwise
+        the rows come from the index of the bound position with the fewest
+        rows, and are checked against the other bound positions column by
+        column.
+        """
+        
+        if not bound:
+            return xrange(len(self.positions))
+        if len(bound) == self.arity:
+            row = self.rows.get(tuple([value for _, value in bound]))
+            return () if row is None else (row,)
+        best = best_posn = None
+        for i, value in bound:
+            bucket = self.index(i).get(value)
+            if bucket is None:
+                return ()
+            if best is None or len(bucket) < len(best):
+                best = bucket
+                best_posn = i
+        rest = [(self.columns[i], value) for i, value in bound if i != best_posn]
+        if not rest:
+            return best
+        return [row for row in best
+                if all(column[row] == value for column, value in rest)]
+
+#______________________________________________________________________________
+
+class FactStore(object):
+    
+    """
+    The ground facts of a knowledge base: a FactTable for each (predicate,
+    arity), and the numbering of the terms that turn up as their arguments.
+    Only the terms are kept as Clauses, once each; a fact is only built as a
+    Clause again (see fact()) when a goal matches it.
+    """
+    
+    def __init__(self):
+        self.tables = {}
+        # the number of each argument term, and the term of each number
+        self.ids = {}
+        self.terms = []
+    
+    def __len__(self):
+        return sum(len(table) for table in self.tables.itervalues())
+    
+    def __contains__(self, fact):
+        table = self.tables.get((fact.op, len(fact.args)))
+        if table is None:
+            return False
+        ids = []
+        for arg in fact.args:
+            value = self.ids.get(arg)
+            if value is None:
+                return False
+            ids.append(value)
+        return tuple(ids) in table.rows
+    
+    def intern(self, term):
+        
+        """
+        Returns the number of term, giving it the next one if it has none.
+        """
+        
+        value = self.ids.get(term)
+        if value is None:
+            value = self.ids[term] = len(self.terms)
+            self.terms.append(term)
+        return value
+    
+    def add(self, fact, posn):
+        
+        """
+        Adds the ground fact (a Clause with arguments and no variables), told
+        at position posn, unless it is there already. Returns whether it was
+        added.
+        """
+        
+        key = (fact.op, len(fact.args))
+        table = self.tables.get(key)
+        if table is None:
+            table = self.tables[key] = FactTable(fact.op, len(fact.args))
+        intern = self.intern
+        return table.add(tuple([intern(arg) for arg in fact.args]), posn)
+    
+    def lookup(self, predicate, args):
+        
+        """
+        Finds the facts that may match a goal with the given predicate and
+        arguments, where each argument is the (ground) Clause the goal has
+        there, or anything else (None, say) if it has a variable there.
+        Returns the table and the rows of those facts, or None if there are
+        no such facts.
+        """
+        
+        table = self.tables.get((predicate, len(args)))
+        if table is None:
+            return None
+        Clause = KBUtil.Clause
+        bound = []
+        for i, arg in enumerate(args):
+            if type(arg) is Clause:
+                value = self.ids.get(arg)
+                if value is None:
+                    # no fact has this term anywhere, let alone here
+                    return None
+                bound.append((i, value))
+        rows = table.lookup(bound)
+        if not rows:
+            return None
+        return table, rows
+    
+    def fact(self, table, row):
+        
+        """
+        Builds the fact in the given row of table as a Clause.
+        """
+        
+        terms = self.terms
+        return KBUtil.Clause(table.predicate, [terms[column[row]] for column in table.columns])
+    
+    def facts(self, table, rows = None):
+        
+        """
+        Yields (told position, fact) for the given rows of table (all of
+        them by default), with each fact as a Rule of its own, the way the
+        knowledge base hands out rules.
+        """
+        
+        Rule = KBUtil.Rule
+        if rows is None:
+            rows = xrange(len(table))
+        positions = table.positions
+        for row in rows:
+            fact = self.fact(table, row)
+            yield positions[row], Rule(fact, fact, (), 0)
+    
+    def all_facts(self):
+        
+        """
+        Yields (told position, fact) for every fact, as facts() does, in the
+        order they were told.
+        """
+        
+        return heapq.merge(*[self.facts(table) for table in self.tables.itervalues()])
+
+#______________________________________________________________________________
+
+def is_ground_fact(clause):
+    
+    """
+    Checks if the clause is a fact with arguments and no variables in them,
+    for e.g. Owns(Nono, M1): the kind of clause a FactStore keeps.
+    """
+    
+    return (clause.op not in KBUtil.OPERATORS and clause.args != ()
+            and KBUtil.compile_term(clause, {}) is clause)
+
+#______________________________________________________________________________
+
+# KBUtil makes a FactStore for every knowledge base, so it is only imported
+# once everything above is in place; that way either module can be imported
+# first
+import KBUtil
@@ -7,166 +7,962 @@ with several other utilities.
 
 """
 
+import sys
+import time
+from itertools import izip
+
+from KBUtil import *
 from Unifier import *
+# SetJoin and GoalOrder both import KBUtil, which imports this module; if
+# either of them is imported first, it is still on its way in when this
+# module is, so what this module uses of them is only looked up when called
+import SetJoin
+import GoalOrder
+from Profiler import Profile
+
+try:
+    import resource
+except ImportError:
+    # not available on every platform; memory budgets are ignored there
+    resource = None
 
-VARIABLE_COUNTER = 0
+# how many inference steps go by between checks of the clock and the
+# memory in use (checking on every step would cost more than the steps)
+CHECK_INTERVAL = 256
 
-# this is to store parents of clauses
-parent_clauses = {}
+# yielded by fol_bc_tabled() in place of a proof when the table of its
+# subgoal has to be filled first, and passed on up to fol_bc_scheduled(),
+# which fills it
+SUSPEND = object()
 
 #______________________________________________________________________________
 
-def standardize_vbls(clause, already_stdized = None):
+class BudgetExceeded(Exception):
     
     """
-    Returns the given clause after standardizing the given variables.
-    'clause' is an object of type Clause
-    'already_stdized' stands for already standardized variables. It is this dict
-    that the program will check first to ensure that a (new) binding has already been
-    given to the variable. This is needed for statements such as 'F(x) & G(x)' --
-    we need them to be standardized as 'F(v_0) & G(v_0)' and not as 'F(v_0) & G(v_1)'
+    Raised inside the search when one of its budgets runs out; status says
+    which one.
     """
     
-    global VARIABLE_COUNTER
+    def __init__(self, status):
+        Exception.__init__(self, status)
+        self.status = status
+
+#______________________________________________________________________________
+
+class Search(object):
     
-    if already_stdized is None:
-        already_stdized = {}
-        
-    if not isinstance(clause, Clause):
-        return clause
+    """
+    One call of fol_bc_ask: iterating over it runs the search and yields an
+    Answer for every proof found.
+    
+    If record_proof is set, each answer comes with its proof, as a
+    ProofNode, in answer.proof; otherwise no time is spent on proofs at all.
+    With tabled set, every subgoal is tabled (see fol_bc_tabled()), which
+    makes recursive rules terminate and stops shared subgoals from being
+    proved over and over. tables may be an AnswerTables to (re)use; answers
+    that are already complete in it are not worked out again. With tabled
+    given as 'auto', only the subgoals of recursive predicates (see
+    Dependencies.recursive()) are tabled, which is all termination needs;
+    the rest are proved the plain way, without the cost of their tables.
+    
+    The search can be given budgets:
+        max_depth  - goals deeper than this in the proof (the query is at
+                     depth 0) are not tried. Tabled proofs terminate on their
+                     own and do not take a depth limit.
+        max_steps  - the most inference steps (rules tried) to take
+        timeout    - the most seconds to spend
+        max_memory - the most memory, in bytes, the process may grow to
+    When one runs out the search ends cleanly, with no exception, and status
+    tells what happened:
+        'running'         - not finished yet
+        'stopped'         - the caller stopped asking for answers before the
+                            end
+        'exhausted'       - every proof there is has been found
+        'depth_limit'     - every proof within max_depth has been found, but
+                            some branches went deeper
+        'step_limit', 'time_limit', 'memory_limit'
+                          - that budget ran out
+        'recursion_limit' - the proof got too deep for Python's stack (which
+                            tabled proofs do not use up; see
+                            fol_bc_scheduled())
+    stats has the number of answers and steps, the deepest goal reached,
+    the number of branches cut off by the depth limit, the number of
+    deepening iterations and the seconds taken, so far.
+    With iterative_deepening set the search is run with depth limits 0, 1,
+    2, ... (up to max_depth, if given) until a run is no longer cut short by
+    the limit, so the shallowest proofs come first. Each answer is only
+    yielded once.
+    branch, if given, restricts the search to one branch of the proof (see
+    fol_bc_branch()); that is how OR-parallel proving splits up the work.
+    With joins set, the bodies of rules made up of ground fact predicates
+    alone are proved set-at-a-time (see fol_bc_join()). That is much faster
+    when they have many matches, but every match is worked out before the
+    first one is used.
+    With reorder set, the literals of the body of each rule are proved in
+    the order that looks cheapest at the time the rule is used (see
+    fol_bc_ordered()), rather than as written. The answers are the same,
+    but may come in a different order.
+    With profile set, what the search does is counted and timed in the
+    Profile in profile (see Profiler.py); profile may also be given as a
+    Profile to add the counts to. Otherwise profile is None, and nothing is
+    counted.
     
-    if is_variable(clause):
-        # check if variable has already been standardized
-        if clause in already_stdized:
-            return already_stdized[clause]
+    Besides, this holds everything the proof itself needs: the bindings
+    made so far, the answer tables, and the bookkeeping for the budgets.
+    """
+    
+    def __init__(self, kb, query, tabled = False, tables = None,
+                 record_proof = False, max_depth = None, max_steps = None,
+                 timeout = None, max_memory = None, iterative_deepening = False,
+                 branch = None, joins = False, reorder = False, profile = False):
+        if tabled and iterative_deepening:
+            raise ValueError('tabled proofs cannot be iteratively deepened')
+        if tabled and tables is None:
+            tables = AnswerTables()
+        elif not tabled:
+            tables = None
+        self.kb = kb
+        self.query = query
+        self.tables = tables
+        self.auto_tabling = tabled == 'auto'
+        self.record_proof = record_proof
+        self.max_depth = max_depth
+        self.max_steps = max_steps
+        self.timeout = timeout
+        self.max_memory = max_memory
+        self.iterative_deepening = iterative_deepening
+        self.branch = branch
+        self.joins = joins
+        self.reorder = reorder
+        if profile is True:
+            profile = Profile()
+        self.profile = profile or None
+        self.status = 'running'
+        self.bindings = None
+        self.depth_limit = sys.maxint
+        self.steps = 0
+        self.deepest = 0
+        self.depth_cutoffs = 0
+        self.answers = 0
+        self.iterations = 0
+        self.started = None
+        self.elapsed = 0.0
+        self.deadline = None
+        self.next_check = sys.maxint
+        
+    def __iter__(self):
+        self.started = time.time()
+        if self.timeout is not None:
+            self.deadline = self.started + self.timeout
+        self.schedule_check()
+        try:
+            for answer in self.find_answers():
+                self.answers += 1
+                self.elapsed = time.time() - self.started
+                yield answer
+            if self.depth_cutoffs:
+                self.status = 'depth_limit'
+            else:
+                self.status = 'exhausted'
+        except BudgetExceeded as exceeded:
+            self.status = exceeded.status
+        except GeneratorExit:
+            self.status = 'stopped'
+            raise
+        except RuntimeError as error:
+            if 'recursion' not in str(error):
+                raise
+            self.status = 'recursion_limit'
+        finally:
+            self.elapsed = time.time() - self.started
+            if self.tables is not None and self.status != 'exhausted':
+                # the tables being worked on when we stopped are not to be
+                # trusted by anyone else sharing them
+                self.tables.discard_incomplete()
+                
+    def find_answers(self):
+        
+        """
+        Yields the answers, by one run of the search or by deepening.
+        """
+        
+        if self.iterative_deepening:
+            return self.deepen()
+        return self.solve(self.max_depth)
+        
+    def deepen(self):
+        
+        """
+        Runs the search again and again with a growing depth limit, yielding
+        the answers not found before.
+        """
+        
+        seen = set()
+        depth_limit = 0
+        while True:
+            self.depth_cutoffs = 0
+            for answer in self.solve(depth_limit):
+                key = frozenset(answer.iteritems())
+                if key not in seen:
+                    seen.add(key)
+                    yield answer
+            if not self.depth_cutoffs or depth_limit == self.max_depth:
+                return
+            depth_limit += 1
+            
+    def solve(self, depth_limit):
+        
+        """
+        Runs the search once, not going deeper than depth_limit (None for no
+        limit), yielding an Answer for every proof found.
+        """
+        
+        self.iterations += 1
+        if self.profile is None:
+            self.bindings = bindings = Bindings()
         else:
-            new_vbl = Clause('v_' + str(VARIABLE_COUNTER))
-            VARIABLE_COUNTER += 1
-            # add new binding to the dict
-            already_stdized[clause] = new_vbl
-            return new_vbl
-    else:
-        # simply create a new clause mapping the same function to all the args
-        return Clause(clause.op, (standardize_vbls(arg, already_stdized) for arg in clause.args))    
+            self.bindings = bindings = CountingBindings(self.profile.counts)
+        if depth_limit is None or self.tables is not None:
+            self.depth_limit = sys.maxint
+        else:
+            self.depth_limit = depth_limit
+        slots = {}
+        goal = compile_term(self.query, slots)
+        base = bindings.new_frame(len(slots))
+        # the query's own variables keep their names when they are not bound
+        for vbl, slot in slots.iteritems():
+            bindings.names[base + slot] = vbl
+        if self.branch is None:
+            proofs = fol_bc_or(self.kb, goal, base, self, 0)
+        else:
+            proofs = fol_bc_branch(self.kb, goal, base, self, 0, self.branch)
+        if self.tables is not None:
+            proofs = fol_bc_scheduled(self.kb, proofs, self)
+        for step in proofs:
+            answer = Answer()
+            for vbl, slot in slots.iteritems():
+                if base + slot in bindings.values:
+                    answer[vbl] = bindings.resolve(slot, base)
+            if step is not None:
+                answer.proof = resolve_proof(step, bindings)
+            yield answer
+            
+    def schedule_check(self):
+        
+        """
+        Works out after how many steps check_budget() has to be called next.
+        """
+        
+        self.next_check = sys.maxint
+        if self.deadline is not None or self.max_memory is not None:
+            self.next_check = self.steps + CHECK_INTERVAL
+        if self.max_steps is not None:
+            self.next_check = min(self.next_check, self.max_steps + 1)
+            
+    def check_budget(self):
+        
+        """
+        Raises BudgetExceeded if any of the budgets has run out.
+        """
+        
+        if self.max_steps is not None and self.steps > self.max_steps:
+            raise BudgetExceeded('step_limit')
+        if self.deadline is not None and time.time() > self.deadline:
+            raise BudgetExceeded('time_limit')
+        if self.max_memory is not None and resource is not None:
+            # ru_maxrss is in kilobytes on Linux
+            if resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 > self.max_memory:
+                raise BudgetExceeded('memory_limit')
+        self.schedule_check()
+        
+    def __getstate__(self):
+        
+        """
+        A Search is pickled (for e.g. to send it back from another process)
+        without the knowledge base, bindings and tables it was working with.
+        """
+        
+        state = self.__dict__.copy()
+        state['kb'] = state['bindings'] = state['tables'] = None
+        return state
+        
+    @property
+    def stats(self):
+        return {'answers': self.answers,
+                'steps': self.steps,
+                'deepest': self.deepest,
+                'depth_cutoffs': self.depth_cutoffs,
+                'iterations': self.iterations,
+                'elapsed': self.elapsed}
+#______________________________________________________________________________
+
+class ProofStep(object):
+    
+    """
+    One use of a rule in a proof that is still going on: goal (in the frame
+    at base) was concluded by rule from premises, the proofs of the body
+    literals of the rule.
+    premises is a linked list, (first step, rest) or () at the end, so that
+    fol_bc_and can build it up without copying.
+    Steps only make sense while the bindings they were made with are in
+    place; resolve_proof() turns them into ProofNodes, which always do.
+    """
     
+    __slots__ = ('goal', 'base', 'rule', 'premises')
+    
+    def __init__(self, goal, base, rule, premises):
+        self.goal = goal
+        self.base = base
+        self.rule = rule
+        self.premises = premises
+
 #______________________________________________________________________________
 
-def substitute(theta, clause):
+class ProofNode(object):
     
     """
-    Substitutes variables in clause with their (new) bindings in theta.
-    theta is a dict while clause is as usual an object of type Clause.
+    One step of a finished proof: clause was concluded by rule (a
+    KBUtil.Rule) from premises, a tuple of ProofNodes, one for each literal
+    of the body of the rule. Facts are given, i.e. they have no premises.
+    A node may be the premise of more than one step (the answers of a table
+    share theirs, for e.g.), so a proof is a DAG rather than a tree; see
+    PrintProof.ProofGraph.
     """
     
-    assert isinstance(clause, Clause)
+    __slots__ = ('clause', 'rule', 'premises')
     
-    if is_variable(clause):
-        # check if the variable already has a binding
-        if clause in theta:
-            return theta[clause]
-        else:
-            return clause
-    else:
-        # compound clause with operators such as '&'
-        # check if any of the arguments are bound, and substitute
-        return Clause(clause.op, (substitute(theta, arg) for arg in clause.args))
+    def __init__(self, clause, rule, premises):
+        self.clause = clause
+        self.rule = rule
+        self.premises = premises
+        
+    def __repr__(self):
+        return 'ProofNode(' + str(self.clause) + ')'
+
+#______________________________________________________________________________
+
+class Answer(dict):
+    
+    """
+    An answer to a query: the substitution for its variables (a dict, as
+    always) and, if proofs were recorded, the proof in self.proof.
+    """
+    
+    proof = None
+
+#______________________________________________________________________________
+
+def resolve_proof(step, bindings):
+    
+    """
+    Turns a ProofStep into a ProofNode, with every clause in it resolved with
+    the bindings as they stand now, each step just once. This goes through
+    the steps with a stack of its own, so a deep proof is no trouble.
+    """
+    
+    if isinstance(step, ProofNode):
+        # came out of an answer table, resolved already
+        return step
+    # the ProofNode of each step resolved so far, by id
+    resolved = {}
+    stack = [step]
+    while stack:
+        current = stack[-1]
+        if id(current) in resolved:
+            stack.pop()
+            continue
+        premises = []
+        rest = current.premises
+        while rest:
+            premises.append(rest[0])
+            rest = rest[1]
+        waiting = [premise for premise in premises
+                   if not isinstance(premise, ProofNode) and id(premise) not in resolved]
+        if waiting:
+            # the premises first; current is back on top once they are done
+            stack.extend(waiting)
+            continue
+        stack.pop()
+        premises = tuple([premise if isinstance(premise, ProofNode) else resolved[id(premise)]
+                          for premise in premises])
+        resolved[id(current)] = ProofNode(bindings.resolve(current.goal, current.base),
+                                          current.rule, premises)
+    return resolved[id(step)]
+
+#______________________________________________________________________________
+
+def rules_for_goal(kb, goal, base, bindings):
+    
+    """
+    Fetches the rules that may conclude the compiled goal (in the frame at
+    base), along with the ground facts that may match it, each as a Rule of
+    its own (see KnowledgeBase.with_facts). goal must already have been
+    dereferenced.
+    What comes back may be an iterator rather than a list.
+    """
+    
+    if type(goal) is int:
+        # we've received a simple letter goal, say 'x', that is not bound yet
+        return kb.all_rules()
+    elif type(goal) is tuple:
+        if goal[0] in OPERATORS:
+            return []
+        first_arg = None
+        if len(goal) > 1:
+            first_arg, _ = bindings.deref(goal[1], base)
+            if type(first_arg) is not Clause or first_arg.args != ():
+                # only constants are indexed on
+                first_arg = None
+        rules = kb.fetch_rules(goal[0], len(goal) - 1, first_arg)
+        if (goal[0], len(goal) - 1) not in kb.facts.tables:
+            return rules
+        # the facts are looked up on every argument that is bound (compiled
+        # terms with no variables left in them are Clauses)
+        args = [bindings.deref(arg, base)[0] for arg in goal[1:]]
+        return kb.with_facts(rules, goal[0], args)
+    return kb.fetch_rules_for_goal(goal)
+
+#______________________________________________________________________________
+
+class AnswerTable(object):
+    
+    """
+    The answers found so far for one subgoal (up to renaming of its
+    variables), for tabled resolution.
+    answers holds each answer as a compiled term, the number of variables in
+    it and its proof (a ProofNode, or None when proofs are not being
+    recorded), in the order they were found; seen holds the compiled terms
+    alone, to keep out answers we already have.
+    """
+    
+    __slots__ = ('answers', 'seen', 'complete', 'evaluating', 'depth', 'low', 'members',
+                 'partial')
+    
+    def __init__(self):
+        self.answers = []
+        self.seen = set()
+        # complete means every answer there is is in the table already
+        self.complete = False
+        # evaluating means the subgoal is being worked on further up the
+        # chain of calls, i.e. we are in a recursive call to it
+        self.evaluating = False
+        # position in the stack of subgoals being evaluated, and the lowest
+        # position any of the answers found so far depends on
+        self.depth = None
+        self.low = None
+        # the tables evaluated while this one was, that could not be
+        # completed on their own because they depend on this one
+        self.members = []
+        # set when the pass over the rules for the subgoal under way read
+        # answers from a table that was not complete (this one, say); only
+        # then can another pass find anything new
+        self.partial = False
+        
+#______________________________________________________________________________
+
+class AnswerTables(object):
+    
+    """
+    All the answer tables of a tabled proof, keyed by the variant of their
+    subgoal (see variant_key()).
+    Tables that are complete stay valid for as long as the knowledge base
+    does not change, so the same AnswerTables can be handed to several
+    queries (that all record proofs, or all do not).
+    """
+    
+    def __init__(self):
+        self.tables = {}
+        # the tables being evaluated, innermost last
+        self.stack = []
+        # the total number of answers in all the tables
+        # if a pass over a subgoal leaves this unchanged, nothing new was found
+        self.answer_count = 0
+        # the subgoal whose table is to be filled next, as (compiled
+        # subgoal, number of variables in it, table); see fol_bc_scheduled()
+        self.pending = None
+        
+    def add_answer(self, table, answer, nvars, proof):
+        if answer in table.seen:
+            return
+        table.seen.add(answer)
+        table.answers.append((answer, nvars, proof))
+        self.answer_count += 1
+        
+    def discard_incomplete(self):
+        
+        """
+        Drops the tables that were left incomplete, for e.g. by a query that
+        was not run to the end.
+        """
+        
+        for key, table in self.tables.items():
+            if not table.complete:
+                del self.tables[key]
+        self.stack = []
+        self.pending = None
 
 #______________________________________________________________________________
 
-def convert_to_implication(clause):
+def variant_key(goal, base, bindings):
     
     """
-    Converts clause to a form lhs => rhs for further processing by fol_bc_or.
+    Returns the goal as it stands with its variables numbered in order of
+    appearance, so that goals that are the same up to renaming of variables
+    (variants), like Ancestor(A, v_3) and Ancestor(A, v_8), get the same key.
+    The key is a compiled term, with slots 0 to nvars - 1; nvars is returned
+    as well.
     """
     
-    if clause.op == '==>':
-        # the idea is that in lhs => rhs, lhs must be returned as a conjunction of literals.
-        # only then can fol_bc_and get each of those conjuncts to prove
-        # for this we simply break the nesting of the lhs
-        return break_nesting(clause.args[0]), clause.args[1]
+    slots = {}
+    key = compile_term(bindings.resolve(goal, base), slots)
+    return key, len(slots)
+
+#______________________________________________________________________________
+
+def fol_bc_tabled(kb, goal, base, search):
+    
+    """
+    Tabled version of fol_bc_or, in the style of SLG resolution.
+    Answers to a subgoal are worked out once, stored in a table kept for its
+    variant, and then handed out of the table to every later call of that
+    variant. A recursive call to a subgoal that is still being worked on
+    only gets the answers found so far, and the subgoal is worked on again
+    and again until no new answers turn up anywhere. So left-recursive
+    rules such as Ancestor(x, z) & Parent(z, y) ==> Ancestor(x, y) terminate
+    (as long as there are finitely many answers, which there are without
+    function symbols).
+    The table of a subgoal that has yet to be worked out is not filled from
+    here, but by fol_bc_scheduled(), further up: this yields SUSPEND, and
+    carries on once the table is filled.
+    """
+    
+    bindings = search.bindings
+    tables = search.tables
+    key, nvars = variant_key(goal, base, bindings)
+    table = tables.tables.get(key)
+    if table is None:
+        table = tables.tables[key] = AnswerTable()
+    if table.evaluating:
+        # a recursive call; whatever is being evaluated now depends on
+        # the answers of the table further up the stack
+        caller = tables.stack[-1]
+        caller.low = min(caller.low, table.depth)
+        caller.partial = True
+    elif not table.complete:
+        if search.profile is not None:
+            search.profile.counts['tables_filled'] += 1
+        tables.pending = (key, nvars, table)
+        yield SUSPEND
+    elif search.profile is not None:
+        search.profile.counts['table_hits'] += 1
+    # answers may still be added to the table while we go through them
+    # (in a recursive call), so go by position
+    i = 0
+    while i < len(table.answers):
+        answer, answer_nvars, proof = table.answers[i]
+        i += 1
+        mark = bindings.mark()
+        if bindings.unify(answer, bindings.new_frame(answer_nvars), goal, base):
+            yield proof
+            bindings.undo(mark)
+
+def fol_bc_scheduled(kb, proofs, search):
+    
+    """
+    Yields the proofs from the generator proofs (those of the query, in a
+    tabled search), filling the tables the proofs wait on along the way.
+    When fol_bc_tabled() comes to a subgoal whose table has to be filled
+    first, it yields SUSPEND, which every generator in between passes on up
+    to here. The table is then filled from here, a pass over the rules for
+    its subgoal at a time until a pass finds nothing new, and only then are
+    the proofs that were waiting on it carried on with. The passes may have
+    to wait on other tables in turn, so the ones under way are kept on a
+    stack of our own: however deep tabled subgoals call one another, they
+    take up no more of the Python stack between them than one of them does.
+    The bindings made by the proofs that wait on a table are left as they
+    are while it is filled, which is fine, as filling it undoes every
+    binding it makes before they carry on.
+    """
+    
+    bindings = search.bindings
+    tables = search.tables
+    profile = search.profile
+    # the tables being filled, innermost last, each as [table, its subgoal,
+    # the number of variables in it, the frame of those for this pass, the
+    # proofs of this pass, the number of answers there were before it]
+    filling = []
+    current = proofs
+    while True:
+        try:
+            step = next(current)
+        except StopIteration:
+            if not filling:
+                return
+            fill = filling[-1]
+            table, key, nvars, _, _, answers_before = fill
+            if table.partial and tables.answer_count != answers_before:
+                # something new turned up, and may lead to more; go over the
+                # rules again
+                table.partial = False
+                fill[3] = key_base = bindings.new_frame(nvars)
+                fill[4] = current = fol_bc_rules(kb, key, key_base, search, 0)
+                fill[5] = tables.answer_count
+                if profile is not None:
+                    fill[4] = current = profile.table_pass(key, current)
+                continue
+            filling.pop()
+            complete_table(table, tables)
+            if filling:
+                current = filling[-1][4]
+            else:
+                current = proofs
+            continue
+        if step is SUSPEND:
+            key, nvars, table = tables.pending
+            tables.pending = None
+            table.evaluating = True
+            table.partial = False
+            table.depth = table.low = len(tables.stack)
+            tables.stack.append(table)
+            key_base = bindings.new_frame(nvars)
+            current = fol_bc_rules(kb, key, key_base, search, 0)
+            if profile is not None:
+                current = profile.table_pass(key, current)
+            filling.append([table, key, nvars, key_base, current, tables.answer_count])
+            continue
+        if not filling:
+            yield step
+            continue
+        # a proof of the subgoal of the table being filled
+        table, key, _, key_base, _, _ = filling[-1]
+        slots = {}
+        answer = compile_term(bindings.resolve(key, key_base), slots)
+        if step is not None:
+            step = resolve_proof(step, bindings)
+        tables.add_answer(table, answer, len(slots), step)
+
+def complete_table(table, tables):
+    
+    """
+    Called when a pass over the rules for the subgoal of table (the
+    innermost being filled) has found nothing new: marks it complete, along
+    with the tables that were waiting on it, unless what it found depends
+    on a table further up the stack, which it is then left to.
+    """
+    
+    tables.stack.pop()
+    table.evaluating = False
+    if table.low >= table.depth:
+        # nothing found depends on a subgoal further up, so this table, and
+        # the ones that were waiting on it, have all their answers
+        table.complete = True
+        for member in table.members:
+            member.complete = True
+        table.members = []
     else:
-        return [], clause
+        # leave it incomplete; it gets worked on again the next time it is
+        # called, and is completed along with the subgoal it depends on
+        caller = tables.stack[-1]
+        caller.low = min(caller.low, table.low)
+        caller.partial = True
+        caller.members.append(table)
+        caller.members.extend(table.members)
+        table.members = []
 
 #______________________________________________________________________________
 
-def fol_bc_and(kb, goals, theta):
+def fol_bc_and(kb, goals, base, search, depth, first = 0):
     
     """
     Helper functions that support fol_bc_ask as in AIMA
-    goals is a clause that will be a conjunction of all literals to prove.
+    goals is a tuple of compiled literals (in the frame at base), all of which
+    have to be proved. Only the ones from position first onwards are left to
+    prove. Yields every time they have all been proved, with the bindings that
+    make that so in search.bindings. What is yielded is the linked list of
+    their proofs (see ProofStep) if proofs are being recorded, and None
+    otherwise.
+    depth is the depth of the goals in the proof (the query is at depth 0).
     """
+    
+    if first == len(goals):
+        # this happens when lhs ==> rhs is [] ==> rhs, or when all goals are proved
+        yield ()
+        return
+    for step in fol_bc_or(kb, goals[first], base, search, depth):
+        # each goal goes to fol_bc_or because only ONE of the rules
+        # for it need be used (and hence the goal becomes true)
+        if step is SUSPEND:
+            # waiting on a table; pass it on up (see fol_bc_scheduled())
+            yield step
+            continue
+        for rest in fol_bc_and(kb, goals, base, search, depth, first + 1):
+            if rest is SUSPEND:
+                yield rest
+            elif step is None:
+                yield None
+            else:
+                yield (step, rest)
+
+#______________________________________________________________________________
 
-    if theta is None:
-        pass
-    elif isinstance(goals, list) and len(goals) == 0:
-        # this happens when lhs ==> rhs is [] ==> rhs
-        yield theta
+def fol_bc_or(kb, goal, base, search, depth):
+    
+    """
+    Helper functions that support fol_bc_ask as in AIMA
+    goal is a compiled literal in the frame at base, at the given depth in
+    the proof.
+    Yields for every proof of goal, the proof itself (a ProofStep) if proofs
+    are being recorded and None otherwise.
+    """
+    
+    goal, base = search.bindings.deref(goal, base)
+    if search.tables is not None and \
+       (not search.auto_tabling or kb.dependencies.recursive(literal_key(goal))):
+        proofs = fol_bc_tabled(kb, goal, base, search)
+    elif depth > search.depth_limit:
+        # too deep; give up on this branch but remember that we did, so
+        # that we know the search is not complete
+        search.depth_cutoffs += 1
+        return iter(())
     else:
-        if goals.op == '&':
-            # operator can only be '&' because the clause is definite (we've broken the nesting)
-            first_arg = goals.args[0]
-            second_arg = goals.args[1]
-            if first_arg.op == '&':
-                # il problemo!
-                # fol_bc_or can only prove definite clauses, a conjunction of two literals alone is not one
-                # so we strip each second conjunct off, club it with the second arg until the first_arg is a literal
-                while not is_predicate(first_arg):
-                    second_arg = Clause('&', [first_arg.args[1], second_arg])
-                    first_arg = first_arg.args[0]
+        if depth > search.deepest:
+            search.deepest = depth
+        proofs = fol_bc_rules(kb, goal, base, search, depth)
+    if search.profile is not None:
+        return search.profile.goal(goal, proofs)
+    return proofs
+
+def fol_bc_rules(kb, goal, base, search, depth):
+    
+    """
+    Tries each of the rules for goal in turn; this is where the resolution
+    actually happens. goal must already have been dereferenced. Rules with a
+    body literal that can never hold are skipped without trying them (see
+    Dependencies.py).
+    """
+    
+    bindings = search.bindings
+    profile = search.profile
+    if profile is not None:
+        profile.counts['rule_fetches'] += 1
+    dead_rules = kb.dependencies.dead_rules
+    for rule in rules_for_goal(kb, goal, base, bindings):
+        if dead_rules and rule in dead_rules:
+            continue
+        search.steps += 1
+        if search.steps >= search.next_check:
+            search.check_budget()
+        if profile is not None:
+            record = profile.rule_tried(rule)
+        mark = bindings.mark()
+        # standardize the rule apart: a fresh frame for its variables
+        rule_base = bindings.new_frame(rule.nvars)
+        if not bindings.unify(rule.head, rule_base, goal, base):
+            if profile is not None:
+                profile.head_failed(goal, record)
+            continue
+        plan = SetJoin.join_plan(kb, rule) if search.joins and rule.body else None
+        if plan is not None:
+            proofs = fol_bc_join(kb, rule, plan, rule_base, search, depth + 1)
+        elif search.reorder and len(rule.body) > 1:
+            proofs = fol_bc_ordered(kb, rule, rule_base, search, depth + 1)
         else:
-            # clause is a simple clause of kind 'Has(X, Y)'
-            # so we need to prove just this i.e. there IS no second clause to prove
-            # hence make the second clause [] so it is picked up by fol_bc_and
-            first_arg = goals
-            second_arg = []
-        for theta1 in fol_bc_or(kb, substitute(theta, first_arg), theta):
-            # notice that it is substitute(theta, first_arg) that will get a parent and not first_arg
-            # second_arg will also get substituted by the theta (i.e. theta1) obtained on running fol_bc_or on the first arg
-            # hence it is substitute(thetaONE, second_arg) that will get a parent, not substitute(theta, second_arg) or
-            # just second arg
-            if isinstance(second_arg, Clause):
-                parent_clauses[substitute(theta, goals)] = ([substitute(theta, first_arg), substitute(theta1, second_arg)], 'Rule of conjunction', None)
-            # the first argument goes to fol_bc_or because only ONE of the literals
-            # in that clause need be proved (and hence the clause becomes true)
-            for theta2 in fol_bc_and(kb, second_arg, theta1):
-                yield theta2
+            # lhs goes to fol_bc_AND because ALL clauses in the lhs needs to be proved
+            proofs = fol_bc_and(kb, rule.body, rule_base, search, depth + 1)
+        if profile is not None and record is not None:
+            proofs = profile.timed(proofs, record, False)
+        for premises in proofs:
+            if premises is SUSPEND:
+                yield premises
+            elif search.record_proof:
+                yield ProofStep(goal, base, rule, premises)
+            else:
+                yield None
+        # backtrack: forget the bindings made for this rule
+        bindings.undo(mark)
 
-#______________________________________________________________________________
+def fol_bc_ordered(kb, rule, base, search, depth):
+    
+    """
+    fol_bc_and for the body of rule (in the frame at base), with the body
+    literals proved in the order GoalOrder.order_body picks for the bindings
+    as they are now. The premises of each proof still come in the order of
+    the body, so proofs read the same as they would have without the
+    reordering.
+    """
+    
+    order = [position for position, _ in GoalOrder.order_body(kb, rule, base, search.bindings)]
+    goals = tuple([rule.body[position] for position in order])
+    for premises in fol_bc_and(kb, goals, base, search, depth):
+        if premises is None or premises is SUSPEND:
+            yield premises
+            continue
+        steps = [None] * len(order)
+        for position in order:
+            steps[position], premises = premises
+        premises = ()
+        for step in reversed(steps):
+            premises = (step, premises)
+        yield premises
 
-def fol_bc_or(kb, goal, theta):
+def fol_bc_join(kb, rule, plan, base, search, depth):
     
     """
-    Helper functions that support fol_bc_ask as in AIMA
+    fol_bc_and for the body of rule (in the frame at base), when SetJoin.join_plan()
+    has found it can be proved set-at-a-time: every match of the body with
+    the facts is worked out at once (see SetJoin.solve_body), and then each
+    is bound and yielded in turn, in the same order fol_bc_and would have
+    yielded them. Each match counts as a step for each literal.
     """
+    
+    if search.tables is None:
+        # the body literals would have been cut off by fol_bc_or
+        if depth > search.depth_limit:
+            search.depth_cutoffs += 1
+            return
+        if depth > search.deepest:
+            search.deepest = depth
+    bindings = search.bindings
+    solved = SetJoin.solve_body(kb, plan, bindings, base)
+    if solved is None:
+        # a variable bound to a term with variables in it
+        for premises in fol_bc_and(kb, rule.body, base, search, depth):
+            yield premises
+        return
+    variables, rows = solved
+    search.steps += len(rows) * len(rule.body)
+    if search.profile is not None:
+        search.profile.counts['join_rows'] += len(rows)
+    if search.steps >= search.next_check:
+        search.check_budget()
+    for row in rows:
+        mark = bindings.mark()
+        for (term, term_base), value in izip(variables, row):
+            bindings.unify(term, term_base, value, 0)
+        if search.record_proof:
+            # every literal was proved by the fact it now is
+            premises = ()
+            for literal in reversed(rule.body):
+                fact = bindings.resolve(literal, base)
+                premises = (ProofStep(literal, base, Rule(fact, fact, (), 0), ()), premises)
+            yield premises
+        else:
+            yield None
+        bindings.undo(mark)
 
-    possible_rules = kb.fetch_rules_for_goal(goal)
-    for rule in possible_rules:
-        stdized_rule = standardize_vbls(rule)
-        lhs, rhs = convert_to_implication(stdized_rule)
-        rhs_unify_try = unify(rhs, goal, theta)
-        if rhs_unify_try is not None:
-            # some successful unification was obtained
-            if lhs != []:
-                # checking for and declaring parent for '&'
-                if lhs.op == '&':
-                    substituted_lhs_args = [substitute(rhs_unify_try, arg) for arg in lhs.args]
-                    parent_clauses[substitute(rhs_unify_try, lhs)] = (substituted_lhs_args, 'Rule of conjunction', None)
-                # actually we're supposed to substitute for the rhs
-                # but this will anyway be the goal, so we can go with goal as the child
-                # instead of substitute(rhs, rhs_unify_try)
-                parent_clauses[goal] = ([substitute(rhs_unify_try, stdized_rule)], 'Modus Ponens', None)
-                parent_clauses[substitute(rhs_unify_try, stdized_rule)] = ([substitute(rhs_unify_try, lhs)], 'Rule of universal instantiation', rule)
-        # lhs goes to fol_bc_AND because ALL clauses in the lhs needs to be proved
-        for theta1 in fol_bc_and(kb, lhs, rhs_unify_try):
-            yield theta1
+def fol_bc_branch(kb, goal, base, search, depth, branch):
+    
+    """
+    Just one branch of fol_bc_or(kb, goal, ...): of the rules for goal only
+    the one at position branch[0] is tried, and if there is more to branch,
+    the rule for the first literal of its body is picked out by the rest of
+    it in the same way. Between them, the branches of a goal cover all of
+    its proofs, so they can be searched apart (see Parallel.ask_or_parallel).
+    Yields like fol_bc_rules.
+    """
+    
+    bindings = search.bindings
+    goal, base = bindings.deref(goal, base)
+    rules = list(rules_for_goal(kb, goal, base, bindings))
+    if branch[0] >= len(rules):
+        return
+    rule = rules[branch[0]]
+    search.steps += 1
+    if search.steps >= search.next_check:
+        search.check_budget()
+    mark = bindings.mark()
+    rule_base = bindings.new_frame(rule.nvars)
+    if not bindings.unify(rule.head, rule_base, goal, base):
+        return
+    if len(branch) == 1 or not rule.body:
+        proofs = fol_bc_and(kb, rule.body, rule_base, search, depth + 1)
+    else:
+        proofs = fol_bc_branch_and(kb, rule.body, rule_base, search, depth + 1, branch[1:])
+    for premises in proofs:
+        if premises is SUSPEND:
+            yield premises
+        elif search.record_proof:
+            yield ProofStep(goal, base, rule, premises)
+        else:
+            yield None
+    bindings.undo(mark)
+
+def fol_bc_branch_and(kb, goals, base, search, depth, branch):
+    
+    """
+    fol_bc_and, with the first of the goals kept to the given branch.
+    """
+    
+    for step in fol_bc_branch(kb, goals[0], base, search, depth, branch):
+        if step is SUSPEND:
+            yield step
+            continue
+        for rest in fol_bc_and(kb, goals, base, search, depth, 1):
+            if rest is SUSPEND:
+                yield rest
+            elif step is None:
+                yield None
+            else:
+                yield (step, rest)
 
 #______________________________________________________________________________
     
-def fol_bc_ask(kb, query):
+def fol_bc_ask(kb, query, tabled = False, tables = None, record_proof = False,
+               max_depth = None, max_steps = None, timeout = None,
+               max_memory = None, iterative_deepening = False, branch = None,
+               joins = False, reorder = False, profile = False):
     """
     A function that uses backward chaining to find whether query is entailed by
     the knowledge base kb.
     Straight from Fig. in AIMA, 3rd edition.
+    Returns a Search, which yields an Answer (a dict of substitutions for the
+    variables of the query) for every proof found when iterated over, and
+    tells how the search went in its status and stats. See Search for what
+    the arguments do.
     """
-    # simple one-liner.
-    return fol_bc_or(kb, query, {})
+    
+    return Search(kb, query, tabled, tables, record_proof, max_depth,
+                  max_steps, timeout, max_memory, iterative_deepening, branch,
+                  joins, reorder, profile)
+
+def fol_bc_ask_many(kb, queries, first_only = False, **options):
+    
+    """
+    Asks each of the queries in turn and yields (query, answers, search) for
+    each, in order: the list of its Answers and the Search that found them,
+    which has its status and stats (stats['elapsed'] is how long it took).
+    With first_only set, each query stops at its first answer.
+    Unless tabled is given as False, the queries are tabled and share one
+    AnswerTables, so a subgoal worked out completely for one query is just
+    looked up by the others. That only holds while the knowledge base stays
+    the same, so nothing should be told to it until all the queries are
+    done. The other options are those of fol_bc_ask.
+    """
+    
+    options.setdefault('tabled', True)
+    if options['tabled'] and options.get('tables') is None:
+        options['tables'] = AnswerTables()
+    for query in queries:
+        search = fol_bc_ask(kb, query, **options)
+        answers = []
+        found = iter(search)
+        for answer in found:
+            answers.append(answer)
+            if first_only:
+                found.close()
+                break
+        yield query, answers, search
+
+def fol_bc_entails(kb, query, **options):
+    
+    """
+    Whether query is entailed by the knowledge base kb, found by backward
+    chaining up to the first proof only and without recording it. The
+    options are those of fol_bc_ask.
+    """
+    
+    options['record_proof'] = False
+    for _ in fol_bc_ask(kb, query, **options):
+        return True
+    return False
@@ -0,0 +1,252 @@
+"""
+The script that implements forward chaining: working out, bottom-up, every
+fact that follows from the knowledge base, so that asking about a fact
+afterwards is a simple lookup.
+
+@author: Aashish Satyajith.
+
+"""
+
+from Unifier import *
+
+#______________________________________________________________________________
+
+class Materialization(object):
+
+    """
+    Every fact that can be derived from a knowledge base, worked out with
+    semi-naive evaluation: each round only joins the rules against the facts
+    that are new since the round before, instead of against all of them
+    again.
+    Once made, the materialization keeps itself up to date as clauses are
+    told to the knowledge base; a new fact or rule only adds what follows
+    from it.
+    Facts with variables in them (for e.g. Likes(x, Chocolate)) are kept in
+    the compiled form of KBUtil.compile_term, one copy per variant.
+    """
+    
+    def __init__(self, kb):
+        self.kb = kb
+        # every fact, compiled, mapped to its position in self.facts
+        self.known = {}
+        # every fact as (compiled fact, number of variables in it), in the
+        # order they were derived
+        self.facts = []
+        # the positions in self.facts of the facts with each (predicate,
+        # arity), and the same split up further by the constant in each
+        # argument position (None for a variable there)
+        self.by_predicate = {}
+        self.by_argument = {}
+        # the rules with a body, and for each (predicate, arity) the
+        # (rule, position) of the body literals with that predicate
+        self.rules = []
+        self.rules_by_body = {}
+        # where the facts derived but not yet joined against start
+        self.delta_start = 0
+        self.rounds = 0
+        for rule in kb.all_rules():
+            self.add_rule(rule)
+        self.saturate()
+        kb.listeners.append(self.tell)
+    
+    def add_rule(self, rule):
+    
+        """
+        Adds a fact or rule without deriving anything from it yet.
+        """
+        
+        if not rule.body:
+            self.add_fact(rule.head, rule.nvars)
+            return
+        self.rules.append(rule)
+        for position, literal in enumerate(rule.body):
+            key = literal_key(literal)
+            self.rules_by_body.setdefault(key, []).append((rule, position))
+    
+    def add_fact(self, fact, nvars):
+    
+        """
+        Adds the compiled fact if it is not known already.
+        """
+        
+        if fact in self.known:
+            return
+        posn = len(self.facts)
+        self.known[fact] = posn
+        self.facts.append((fact, nvars))
+        key = literal_key(fact)
+        self.by_predicate.setdefault(key, []).append(posn)
+        arguments = self.by_argument.setdefault(key, [{} for _ in xrange(key[1])])
+        for i in xrange(key[1]):
+            arguments[i].setdefault(constant_at(fact, i), []).append(posn)
+    
+    def tell(self, rule):
+    
+        """
+        Brings the materialization up to date with a rule just told to the
+        knowledge base.
+        """
+        
+        if not rule.body:
+            self.add_fact(rule.head, rule.nvars)
+        else:
+            self.add_rule(rule)
+            # the new rule has not seen any of the old facts yet, so join it
+            # against all of them once
+            self.fire(rule, None, 0, len(self.facts))
+        self.saturate()
+    
+    def saturate(self):
+    
+        """
+        Runs rounds of semi-naive evaluation until no new facts come up.
+        """
+        
+        while self.delta_start < len(self.facts):
+            delta_start, delta_end = self.delta_start, len(self.facts)
+            self.delta_start = delta_end
+            self.rounds += 1
+            for posn in xrange(delta_start, delta_end):
+                fact, nvars = self.facts[posn]
+                for rule, position in self.rules_by_body.get(literal_key(fact), ()):
+                    # a derivation that uses this new fact for the literal at
+                    # position may use old facts for the literals before it,
+                    # and old or new ones for the literals after it; that
+                    # way each derivation is only made once per round
+                    self.fire(rule, (posn, position), delta_start, delta_end)
+    
+    def fire(self, rule, seed, old_end, new_end):
+    
+        """
+        Derives the heads of rule for every way of matching its body against
+        the facts.
+        seed is (fact position, body position) when the body literal at that
+        position has to be matched against that one fact, and None when all
+        of them are matched against the facts before new_end.
+        Literals before the seeded one only get facts before old_end.
+        """
+        
+        bindings = Bindings()
+        base = bindings.new_frame(rule.nvars)
+        if seed is not None:
+            fact, nvars = self.facts[seed[0]]
+            if not bindings.unify(rule.body[seed[1]], base, fact, bindings.new_frame(nvars)):
+                return
+        derived = []
+        for _ in self.join(rule.body, 0, seed, base, bindings, old_end, new_end):
+            slots = {}
+            derived.append((compile_term(bindings.resolve(rule.head, base), slots), len(slots)))
+        for fact, nvars in derived:
+            self.add_fact(fact, nvars)
+    
+    def join(self, body, position, seed, base, bindings, old_end, new_end):
+    
+        """
+        Matches the body literals from position onwards against the facts,
+        one after the other (a nested-loop join, with the argument indexes
+        picking out the candidates).
+        """
+        
+        if position == len(body):
+            yield
+            return
+        if seed is not None and position == seed[1]:
+            # already matched against the new fact
+            for _ in self.join(body, position + 1, seed, base, bindings, old_end, new_end):
+                yield
+            return
+        end = old_end if seed is not None and position < seed[1] else new_end
+        literal = body[position]
+        for posn in self.candidates(literal, base, bindings):
+            if posn >= end:
+                # the positions are in increasing order
+                break
+            fact, nvars = self.facts[posn]
+            mark = bindings.mark()
+            if bindings.unify(literal, base, fact, bindings.new_frame(nvars)):
+                for _ in self.join(body, position + 1, seed, base, bindings, old_end, new_end):
+                    yield
+                bindings.undo(mark)
+    
+    def candidates(self, literal, base, bindings):
+    
+        """
+        Returns the positions of the facts that may match literal, in
+        increasing order.
+        """
+        
+        key = literal_key(literal)
+        arguments = self.by_argument.get(key)
+        if arguments is None:
+            return ()
+        if type(literal) is tuple:
+            for i in xrange(key[1]):
+                value, _ = bindings.deref(literal[i + 1], base)
+                if type(value) is Clause and value.args == ():
+                    # the argument is bound; only facts with that constant
+                    # (or a variable) there can match
+                    return merge_sorted(arguments[i].get(value, ()),
+                                        arguments[i].get(None, ()))
+        elif key[1] > 0:
+            # a literal with no variables at all
+            return merge_sorted(arguments[0].get(constant_at(literal, 0), ()),
+                                arguments[0].get(None, ()))
+        return self.by_predicate[key]
+    
+    def ask(self, query):
+    
+        """
+        Yields a substitution (a dict) for every fact that matches query, like
+        FolBC.fol_bc_ask does for every proof. For a query with no variables
+        this is just a lookup.
+        """
+        
+        slots = {}
+        goal = compile_term(query, slots)
+        if not slots and goal in self.known:
+            yield {}
+            return
+        bindings = Bindings()
+        base = bindings.new_frame(len(slots))
+        for posn in self.candidates(goal, base, bindings):
+            fact, nvars = self.facts[posn]
+            mark = bindings.mark()
+            if bindings.unify(goal, base, fact, bindings.new_frame(nvars)):
+                yield dict((vbl, bindings.resolve(slot, base))
+                           for vbl, slot in slots.iteritems()
+                           if base + slot in bindings.values)
+                bindings.undo(mark)
+    
+    def __contains__(self, fact):
+    
+        """
+        Whether the fact (a clause with no variables) has been derived.
+        """
+        
+        return fact in self.known
+
+#______________________________________________________________________________
+
+def constant_at(fact, i):
+
+    """
+    Returns the constant that is argument i of the compiled fact, or None if
+    there is a variable (or a compound term) there.
+    """
+    
+    arg = fact[i + 1] if type(fact) is tuple else fact.args[i]
+    if type(arg) is Clause and arg.args == ():
+        return arg
+    return None
+
+def merge_sorted(first, second):
+
+    """
+    Merges two increasing lists of positions into one.
+    """
+    
+    if not second:
+        return first
+    if not first:
+        return second
+    return sorted(list(first) + list(second))
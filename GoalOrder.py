@@ -0,0 +1,176 @@
+"""
+The script that picks the order in which the literals of the body of a rule
+are proved, instead of always going left to right as they were written.
+
+Each time a rule is used, the literals are ordered afresh by how many
+answers each is likely to have (its fan-out), given what the unification
+with the goal has bound and what the literals put before it will bind.
+The estimates come from the statistics the knowledge base keeps on its
+facts and rules (see KnowledgeBase.statistics): the literal with the
+fewest expected answers goes next, so that the search narrows down as
+early as it can. Literals joined with && (see KBUtil.Rule) keep their order
+across it.
+
+@author: Aashish Satyajith.
+
+"""
+
+from bisect import bisect_right
+from itertools import izip
+
+# KBUtil imports this module before Unifier is done with it (when FolBC is
+# imported first), so Bindings is only looked up when explain() runs
+from KBUtil import Clause, compile_term, clause_head, body_literals
+import Unifier
+
+#______________________________________________________________________________
+
+# how many answers each rule is taken to give a goal; there is no knowing
+# short of proving it, and it is a lot more than a fact gives
+RULE_FANOUT = 10.0
+
+#______________________________________________________________________________
+
+def estimate_fanout(kb, literal, base, bindings, bound):
+    
+    """
+    Estimates how many answers literal (in the frame at base) has with the
+    bindings made so far, when the variables whose numbers are in bound
+    will have been bound as well.
+    Each fact counts for one, cut down by the share of the facts that have
+    each constant of the literal where it has it (looked up in the fact
+    table), and by the number of distinct terms in the position of each
+    variable that will have been bound. Each rule counts for RULE_FANOUT.
+    """
+    
+    literal, base = bindings.deref(literal, base)
+    if type(literal) is int:
+        # a literal that is just a variable could be anything at all
+        return float('inf')
+    elif type(literal) is tuple:
+        predicate, args = literal[0], literal[1:]
+    else:
+        predicate, args = literal.op, literal.args
+    args = [bindings.deref(arg, base) for arg in args]
+    # only the positions that are cut down by their distinct terms are
+    # counted, so that no fact table is indexed on a position just for this
+    positions = [i for i, (arg, arg_base) in enumerate(args)
+                 if type(arg) is tuple or (type(arg) is int and arg_base + arg in bound)]
+    stats = kb.statistics(predicate, len(args), positions)
+    table = kb.facts.tables.get((predicate, len(args)))
+    facts = float(stats['facts'])
+    first_arg = None
+    for i, (arg, arg_base) in enumerate(args):
+        if type(arg) is int:
+            if arg_base + arg in bound and facts:
+                facts /= max(1, stats['distinct'][i])
+            continue
+        if i == 0 and type(arg) is Clause and arg.args == ():
+            first_arg = arg
+        if not facts:
+            continue
+        if type(arg) is Clause:
+            facts *= float(table.count(i, kb.facts.ids.get(arg, -1))) / len(table)
+        else:
+            # a term with variables in it; some of it is known, at least
+            facts /= max(1, stats['distinct'][i])
+    rules = len(kb.fetch_rules(predicate, len(args), first_arg))
+    return facts + rules * RULE_FANOUT
+
+def variables_in(term, base, bindings, found):
+    
+    """
+    Adds the numbers of the unbound variables in term (in the frame at base)
+    to the set found.
+    """
+    
+    term, base = bindings.deref(term, base)
+    if type(term) is int:
+        found.add(base + term)
+    elif type(term) is tuple:
+        for arg in term[1:]:
+            variables_in(arg, base, bindings, found)
+
+#______________________________________________________________________________
+
+def order_body(kb, rule, base, bindings):
+    
+    """
+    Orders the body of rule, whose variables are in the frame at base and
+    whose head has just been unified with a goal.
+    Returns a list of (position in the body, estimated fan-out), in the
+    order the literals are to be proved: greedily, the one with the
+    smallest fan-out first, within each stretch of the body between two
+    barriers. Literals with the same estimate keep their written order.
+    """
+    
+    body = rule.body
+    bound = set()
+    chosen = []
+    starts = (0,) + rule.barriers
+    ends = rule.barriers + (len(body),)
+    for start, end in izip(starts, ends):
+        remaining = range(start, end)
+        while remaining:
+            fanout, best = min((estimate_fanout(kb, body[i], base, bindings, bound), i)
+                               for i in remaining)
+            remaining.remove(best)
+            chosen.append((best, fanout))
+            variables_in(body[best], base, bindings, bound)
+    return chosen
+
+#______________________________________________________________________________
+
+def explain(kb, query):
+    
+    """
+    Returns, as text, how the body of each rule that may conclude query
+    would be ordered: the literals in the order they would be proved, each
+    with its estimated fan-out, and where the barriers fall. Rules the prover
+    skips (see Dependencies.py) are only named.
+    """
+    
+    bindings = Unifier.Bindings()
+    slots = {}
+    goal = compile_term(query, slots)
+    base = bindings.new_frame(len(slots))
+    for vbl, slot in slots.iteritems():
+        bindings.names[base + slot] = vbl
+    lines = []
+    for rule in kb.fetch_rules_for_goal(query):
+        if not rule.body:
+            continue
+        if rule in kb.dependencies.dead_rules:
+            lines.append('%s: skipped, as some of its body can never hold' % rule)
+            continue
+        mark = bindings.mark()
+        rule_base = bindings.new_frame(rule.nvars)
+        if bindings.unify(rule.head, rule_base, goal, base):
+            # the rule's own variables go by their names as well
+            for vbl, slot in rule_variables(rule).iteritems():
+                bindings.names[rule_base + slot] = vbl
+            lines.append('%s:' % rule)
+            order = order_body(kb, rule, rule_base, bindings)
+            stretch = 0
+            for step, (position, fanout) in enumerate(order, 1):
+                if bisect_right(rule.barriers, position) != stretch:
+                    stretch = bisect_right(rule.barriers, position)
+                    lines.append('    &&')
+                lines.append('    %d. %s (estimated fan-out %.4g)'
+                             % (step, bindings.resolve(rule.body[position], rule_base), fanout))
+        bindings.undo(mark)
+    if not lines:
+        return 'No rules for %s' % query
+    return '\n'.join(lines)
+
+def rule_variables(rule):
+    
+    """
+    Maps each variable of the clause of rule to its slot in the rule.
+    """
+    
+    slots = {}
+    compile_term(clause_head(rule.clause), slots)
+    for literal in body_literals(rule.clause)[0]:
+        compile_term(literal, slots)
+    return slots
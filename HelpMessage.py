@@ -15,6 +15,7 @@ def print_help():
     print 'The following logical connectives are supported:\n'
 
     print '& - and'
+    print '&& - and, with the left side proved before the right side'
     print '==> - implies'
     print '~ (tilde) - not'
     print '| (pipe) - or\n'
@@ -9,9 +9,12 @@ Created on Wed Jun 17 23:04:42 2015
 @author: Aashish Satyajith.
 """
 
-import FolBC
+import heapq
+import weakref
 
-OPERATORS = ['&', '|', '~', '==>']
+# && is and as well, but with the literals on its left to be proved before
+# the ones on its right (see Rule)
+OPERATORS = ['&', '&&', '|', '~', '==>']
 
 #______________________________________________________________________________
 
@@ -22,80 +25,364 @@ class KnowledgeBase:
     """
     
     def __init__(self, initial_clauses = []):
-        # we will use the operator of the clauses for indexing
+        # we will use the head of the clauses for indexing
+        # self.clauses maps the (predicate, arity) of a head to the compiled
+        # rules with that head, in the order they were told
         self.clauses = {}
+        # self.first_arg_index splits those same rules up further by the
+        # constant that is the first argument of their head. Rules whose
+        # head starts with a variable (or has no arguments) go under None.
+        self.first_arg_index = {}
+        # every rule in the order it was told, and the position of each
+        # clause in that order
+        # the position is what lets us merge two buckets back into that order
+        self.rules = []
+        self.clause_posn = {}
+        # the ground facts, such as Owns(Nono, M1), are kept apart from the
+        # rules, in a table of columns per (predicate, arity); see FactStore
+        self.facts = FactStore()
+        # how many clauses (rules and ground facts alike) have been told so
+        # far; the position of each is the count when it was told
+        self.told = 0
+        # how the body of each rule is proved set-at-a-time, if it can be;
+        # worked out when first needed, and again after anything is told
+        # (see SetJoin.join_plan)
+        self.join_plans = {}
+        # functions to call with each new rule once it is in the knowledge
+        # base (for e.g. to keep a FolFC.Materialization up to date)
+        self.listeners = []
+        # the answers of the queries asked so far, if they are to be kept
+        # (see cache_answers())
+        self.answer_cache = None
+        # how the predicates depend on each other through the rules, which
+        # of them can possibly hold and which are recursive (see
+        # Dependencies.py)
+        self.dependencies = Dependencies()
         for clause in initial_clauses:
             self.tell(clause)
             
     def tell(self, clause):
         if is_definite_clause(clause):
-            self.predicate_index(clause, clause)
+            self.predicate_index(clause)
         else:
             print 'Clause not definite, ignored:', clause
             
-    def ask(self, query):
-        return FolBC.fol_bc_ask(self, query)
-        
-    def predicate_index(self, main_clause, inside_clause):
+    def tell_many(self, clauses):
         
         """
-        Indexes the clause by each predicate for efficient unification.
-        main_clause will be the clause that we're asked to add to the knowledge base.
-        inside_clause will be the clause that exists inside the main_clause
+        Tells every one of the clauses, without a message for each one that
+        is not definite. Returns how many were added, how many were already
+        in the knowledge base, and how many were left out for not being
+        definite.
         """
         
-        if is_predicate(inside_clause):
-            # simply add the main clause to the kb giving the name of the 
-            # predicate as the key
-            if inside_clause.op in self.clauses:
-                # check if the clause already exists
-                if main_clause not in self.clauses[inside_clause.op]:
-                    self.clauses[inside_clause.op].append(main_clause)
+        added = duplicates = not_definite = 0
+        for clause in clauses:
+            if not is_definite_clause(clause):
+                not_definite += 1
+            elif self.predicate_index(clause):
+                added += 1
             else:
-                # create a new entry
-                self.clauses[inside_clause.op] = [main_clause]
-        elif inside_clause.op == '~':
-            self.predicate_index(main_clause, inside_clause.args[0])
-        else:
-            # one of the other operators
-            # add both its arguments to the dictionary
-            self.predicate_index(main_clause, inside_clause.args[0])
-            self.predicate_index(main_clause, inside_clause.args[1])
+                duplicates += 1
+        return added, duplicates, not_definite
             
+    def ask(self, query, **options):
+        
+        """
+        Asks the query by backward chaining; see FolBC.Search for the
+        options. If answers are being cached (see cache_answers()), the
+        query goes through the cache.
+        """
+        
+        if self.answer_cache is not None:
+            return self.answer_cache.ask(query, options)
+        return FolBC.fol_bc_ask(self, query, **options)
+        
+    def cache_answers(self, max_entries = 1000, max_answers = 10000):
+        
+        """
+        From now on keeps the answers ask() finds, for up to max_entries
+        queries (the least recently asked are dropped first) of up to
+        max_answers answers each, so that asking a query again (or one that
+        only differs in the names of its variables) costs next to nothing.
+        Telling anything drops the answers of the queries that may depend on
+        it. See AnswerCache.py. Returns the AnswerCache, whose statistics()
+        tell how well it does; max_entries of 0 stops the caching.
+        """
+        
+        if self.answer_cache is not None:
+            self.listeners.remove(self.answer_cache.tell)
+            self.answer_cache = None
+        if max_entries:
+            # AnswerCache builds on FolBC.Search, so unlike the modules at
+            # the bottom it cannot be imported before FolBC is done
+            import AnswerCache
+            self.answer_cache = AnswerCache.AnswerCache(self, max_entries, max_answers)
+            self.listeners.append(self.answer_cache.tell)
+        return self.answer_cache
+        
+    def ask_many(self, queries, first_only = False, **options):
+        
+        """
+        Asks each of the queries, sharing what is worked out for one with the
+        rest; see FolBC.fol_bc_ask_many.
+        """
+        
+        return FolBC.fol_bc_ask_many(self, queries, first_only, **options)
+        
+    def entails(self, query, **options):
+        
+        """
+        Whether the query can be proved, without building any proof; the
+        search stops at the first proof found.
+        """
+        
+        return FolBC.fol_bc_entails(self, query, **options)
+        
+    def explain(self, query):
+        
+        """
+        Tells, as text, the order the bodies of the rules for query would be
+        proved in with the reorder option, and the fan-out estimated for each
+        literal; see GoalOrder.explain.
+        """
+        
+        return GoalOrder.explain(self, query)
+        
+    def statistics(self, predicate, arity, positions = None):
+        
+        """
+        Returns what is known about the clauses for the given predicate and
+        arity, as a dict of the number of ground facts ('facts') and rules
+        ('rules') for it, and the number of distinct terms in each argument
+        position of the facts ('distinct').
+        The counts are kept up to date as clauses are told; the distinct
+        terms in a position are counted by the fact table's index on it,
+        built the first time they are asked for. So only the positions in
+        positions (every position, if it is not given) are counted; the rest
+        are None.
+        """
+        
+        key = (predicate, arity)
+        table = self.facts.tables.get(key)
+        if positions is None:
+            positions = xrange(arity)
+        distinct = [None] * arity
+        if table is None:
+            facts = 0
+            for i in positions:
+                distinct[i] = 0
+        else:
+            facts = len(table)
+            for i in positions:
+                distinct[i] = table.distinct(i)
+        return {'facts': facts, 'rules': len(self.clauses.get(key, ())),
+                'distinct': distinct}
+        
+    def save(self, filename):
+        
+        """
+        Saves the knowledge base to filename as a binary snapshot, which
+        load() reads back much faster than the statements could be parsed
+        again; see Snapshot.py.
+        """
+        
+        Snapshot.save_snapshot(self, filename)
+        
+    def load(self, filename):
+        
+        """
+        Adds the rules in the snapshot filename (see save()) to the knowledge
+        base.
+        """
+        
+        Snapshot.load_snapshot(self, filename)
+        
+    def predicate_index(self, clause):
+        
+        """
+        Compiles the clause into a Rule and indexes it by the predicate, arity
+        and first argument of its head, so that a goal is only ever tried
+        against rules that can actually conclude it. Ground facts go into the
+        FactStore instead.
+        Returns whether the clause was added (False if it was there already).
+        """
+        
+        if self.join_plans:
+            self.join_plans.clear()
+        if is_ground_fact(clause):
+            if not self.facts.add(clause, self.told):
+                return False
+            self.told += 1
+            self.dependencies.add_fact((clause.op, len(clause.args)))
+            if self.listeners:
+                # the listeners take rules, so the fact gets one just for them
+                rule = Rule(clause, clause, (), 0)
+                for listener in self.listeners:
+                    listener(rule)
+            return True
+        if clause in self.clause_posn:
+            # clauses are interned so this is all the duplicate check we need
+            return False
+        self.clause_posn[clause] = self.told
+        self.told += 1
+        rule = compile_rule(clause)
+        self.rules.append(rule)
+        head = clause_head(clause)
+        key = (head.op, len(head.args))
+        self.clauses.setdefault(key, []).append(rule)
+        buckets = self.first_arg_index.setdefault(key, {})
+        buckets.setdefault(first_arg_key(head), []).append(rule)
+        self.dependencies.add_rule(rule)
+        for listener in self.listeners:
+            listener(rule)
+        return True
+        
+    def all_rules(self):
+        
+        """
+        Yields every rule, and every ground fact as a Rule of its own, in the
+        order they were told.
+        """
+        
+        if not self.facts.tables:
+            return iter(self.rules)
+        posn = self.clause_posn
+        rules = ((posn[rule.clause], rule) for rule in self.rules)
+        return (rule for _, rule in heapq.merge(rules, self.facts.all_facts()))
     
     def fetch_rules_for_goal(self, goal):
-        try:
-            predicate = self.retrieve_predicate(goal)
-            if predicate in self.clauses:
-                return self.clauses[predicate]
-        except IndexError:
-            # we've received a simple letter goal, say 'x'
-            # no option other than to send all the clauses
-            all_clauses = []
-            for key in self.clauses.keys():
-                all_clauses += self.clauses[key]
-            # simply returning all_clauses might result in a lot of duplicates
-            # for e.g. P ==> Q is stored both under keys P and Q
-            # set() removes all duplicates, list() converts them back into a list
-            return list(set(all_clauses))
-    
-    def retrieve_predicate(self, goal):
         
         """
-        Retrieve atleast one predicate that is in the goal so that it can be
-        looked up in the self.clauses dict
+        Returns the rules whose heads may unify with goal, and the ground
+        facts that may match it (each as a Rule of its own), in the order
+        they were told.
         """
         
         if is_predicate(goal):
-            return goal.op
-        else:
-            # works if op is '~' or any other symbol
-            # because there is always one argument if the symbol is a logical symbol
-            return self.retrieve_predicate(goal.args[0])
+            rules = self.fetch_rules(goal.op, len(goal.args), first_arg_key(goal))
+            # only the arguments without variables in them narrow the facts down
+            args = [arg if compile_term(arg, {}) is arg else None for arg in goal.args]
+            return self.with_facts(rules, goal.op, args)
+        elif is_variable(goal):
+            # we've received a simple letter goal, say 'x'
+            # no option other than to send all the rules
+            return self.all_rules()
+        # a compound goal such as P & Q can never be the head of a definite clause
+        return []
+        
+    def fetch_rules(self, predicate, arity, first_arg = None):
+        
+        """
+        Returns the rules for a goal with the given predicate and arity whose
+        first argument is the constant first_arg (None if it is a variable or
+        there are no arguments), in the order they were told.
+        """
+        
+        key = (predicate, arity)
+        if key not in self.clauses:
+            return []
+        if first_arg is None:
+            # goal starts with a variable, so every rule with this
+            # head predicate is a candidate
+            return self.clauses[key]
+        buckets = self.first_arg_index[key]
+        # rules with the same constant up front, plus the ones that
+        # start with a variable (those can match any constant)
+        return self.merge_in_order(buckets.get(first_arg, []),
+                                   buckets.get(None, []))
+        
+    def merge_in_order(self, first, second):
+        
+        """
+        Merges two buckets (each already in told order) into one list that is
+        also in told order.
+        """
+        
+        if not first:
+            return second
+        if not second:
+            return first
+        posn = self.clause_posn
+        merged = []
+        i = j = 0
+        while i < len(first) and j < len(second):
+            if posn[first[i].clause] < posn[second[j].clause]:
+                merged.append(first[i])
+                i += 1
+            else:
+                merged.append(second[j])
+                j += 1
+        merged.extend(first[i:])
+        merged.extend(second[j:])
+        return merged
+        
+    def with_facts(self, rules, predicate, args):
+        
+        """
+        Adds the ground facts that may match a goal with the given predicate
+        and arguments to its rules (see FactStore.lookup for args), in told
+        order. Returns rules themselves if there are no such facts, and an
+        iterator that builds each fact as it comes to it otherwise.
+        """
+        
+        found = self.facts.lookup(predicate, args)
+        if found is None:
+            return rules
+        facts = self.facts.facts(*found)
+        if not rules:
+            return (rule for _, rule in facts)
+        return self.merge_facts(rules, facts)
+        
+    def merge_facts(self, rules, facts):
+        
+        """
+        Merges a list of rules and the (told position, fact) of some facts,
+        each already in told order, into one iterator in told order.
+        """
+        
+        posn = self.clause_posn
+        i = 0
+        for told, fact in facts:
+            while i < len(rules) and posn[rules[i].clause] < told:
+                yield rules[i]
+                i += 1
+            yield fact
+        for rule in rules[i:]:
+            yield rule
 
 #______________________________________________________________________________
 
-class Clause:
+class InternedRef(weakref.ref):
+    
+    """
+    A weak reference to an interned clause that knows its key in the table of
+    interned clauses, so the entry can be dropped once the clause is gone.
+    This is what weakref.WeakValueDictionary does too, but it builds its
+    references in Python code, which made it the slowest part of loading a
+    big knowledge base.
+    """
+    
+    __slots__ = ('key',)
+
+# the table of all live clauses, keyed by (op, args); see Clause
+INTERNED_CLAUSES = {}
+    
+def forget_clause(ref, interned = INTERNED_CLAUSES):
+    
+    """
+    Called when an interned clause has been collected.
+    The table is bound here so that it is still around for clauses collected
+    while Python shuts down.
+    """
+    
+    # the clause may have been built again since, under the same key
+    if interned.get(ref.key) is ref:
+        del interned[ref.key]
+
+#______________________________________________________________________________
+
+class Clause(object):
     
     """
     A class that holds each clause.
@@ -104,27 +391,63 @@ class Clause:
         - [~]clause (and / or) [~]clause where [~] denotes an optional negation sign
     A clause such as Likes(Aashish, Chocolate) will be stored as:
     Op will be 'Likes'
-    Args will be ['Aashish', 'Chocolate']
-    Parents will be None
+    Args will be (Aashish, Chocolate), a tuple of clauses
+    
+    Clauses are hash-consed: Clause(op, args) hands back the one existing
+    instance for that op and those args if there is one, so structurally
+    equal clauses are always the same object. This lets identity stand in
+    for equality, and the hash is worked out just once when the clause is
+    built. Clauses are immutable -- build a new one instead of changing one.
     """
     
-    def __init__(self, op, args = [], parents = None):
+    __slots__ = ('op', 'args', '_hash', '__weakref__')
+    
+    # the table of all live clauses, keyed by (op, args)
+    # weak references to them so that clauses nobody refers to any more (for
+    # e.g. the standardized copies of rules made during a proof) can be
+    # collected
+    _interned = INTERNED_CLAUSES
+    
+    def __new__(cls, op, args = ()):
         
         """
         Op (operator) is a logical operator such as '&', '|' etc, or string, such
         as 'P' or 'Likes' (the proposition) stored as a string.
         Args are the arguments in the clause, for e.g. in Likes(X, Y) X and Y are
-        the arguments.
-        Parents are the clauses from which the current clause has been derived.
-        This is helpful for showing the proof process. It defaults to None.
+        the arguments. They may be given as clauses or as anything
+        convert_to_clause understands.
         """
         
-        self.op = op
-        self.parents = parents
-        self.args = map(convert_to_clause, args)
+        args = tuple([arg if type(arg) is Clause else convert_to_clause(arg)
+                      for arg in args])
+        key = (op, args)
+        # args are interned already so hashing the key only costs one
+        # (cached) hash per argument
+        ref = cls._interned.get(key)
+        clause = ref() if ref is not None else None
+        if clause is None:
+            clause = object.__new__(cls)
+            object.__setattr__(clause, 'op', op)
+            object.__setattr__(clause, 'args', args)
+            object.__setattr__(clause, '_hash', hash(key))
+            ref = InternedRef(clause, forget_clause)
+            ref.key = key
+            cls._interned[key] = ref
+        return clause
+        
+    def __setattr__(self, name, value):
+        raise AttributeError('Clause objects are immutable')
+        
+    def __delattr__(self, name):
+        raise AttributeError('Clause objects are immutable')
+        
+    def __reduce__(self):
+        # rebuild through the constructor so that unpickled (or copied)
+        # clauses get interned as well
+        return (Clause, (self.op, self.args))
         
     def __hash__(self):
-        return hash(self.op) ^ hash(tuple(self.args))
+        return self._hash
         
     def __repr__(self):
         if len(self.args) == 0:
@@ -158,11 +481,40 @@ class Clause:
             else:
                 str_repn += str(self.args[1])
             return str_repn
-            
-    def __eq__(self, other):
+
+#______________________________________________________________________________
+
+class Rule(object):
+    
+    """
+    A definite clause compiled once, at tell() time, into the form backward
+    chaining wants it in:
+        head  - the one positive literal
+        body  - a flat tuple of the literals that must be proved for the head
+                to hold (empty for facts)
+        nvars - the number of distinct variables in the clause
+        clause - the clause as it was told (for displaying the proof)
+        barriers - the positions in body where a && of the clause falls:
+                the literals before each one have to be proved before any
+                after it, whatever order the prover would rather go in
+                (see GoalOrder)
+    The variables in head and body are replaced by their slot number, 0 to
+    nvars - 1, so standardizing a rule apart is just a matter of picking
+    nvars fresh variables (see instantiate()). Any part of the clause that
+    has no variables in it stays as the (interned) Clause it was.
+    """
+    
+    __slots__ = ('clause', 'head', 'body', 'nvars', 'barriers')
+    
+    def __init__(self, clause, head, body, nvars, barriers = ()):
+        self.clause = clause
+        self.head = head
+        self.body = body
+        self.nvars = nvars
+        self.barriers = barriers
         
-        return isinstance(other, Clause) and self.op == other.op and \
-        self.args == other.args        
+    def __repr__(self):
+        return str(self.clause)
 
 #______________________________________________________________________________              
         
@@ -235,7 +587,7 @@ def negate(clause):
     """
     if clause.op not in OPERATORS:
         # means a clause like 'P' or 'Has'...
-        if clause.args == []:
+        if clause.args == ():
             # simple clause like 'P'
             return Clause('~', [clause.op])
         else:
@@ -246,7 +598,7 @@ def negate(clause):
             
     # otherwise we have four kinds of operations to negate - &, |, ~ and ==>
     # and
-    if clause.op == '&':
+    if clause.op in ['&', '&&']:
         # ~(P & Q) becomes ~P | ~Q
         return Clause('|', map(negate, clause.args))
     # or
@@ -298,7 +650,7 @@ def break_nesting(clause):
             # we want the ~P etc. to stay as they are so we can count
             # the number of negative and positive literals
             return clause
-    elif clause.op in ['&', '|']:
+    elif clause.op in ['&', '&&', '|']:
         # break the nesting of their arguments and return them as themselves
         broken_first_arg = break_nesting(clause.args[0])
         broken_second_arg = break_nesting(clause.args[1])
@@ -311,13 +663,17 @@ def break_nesting(clause):
 #______________________________________________________________________________
                            
 def is_definite_clause(clause):
-
+    
     """
     Checks if the given clause is a definite clause.
     A definite clause is a disjunction of literals such that exactly one term
     is positive (all the other clauses are negated)
     """
     
+    if clause.op not in OPERATORS:
+        # a single positive literal, like most clauses in a big knowledge base
+        return True
+    
     # first break the clause up into simple terms
     broken_clause = break_nesting(clause)
     
@@ -342,7 +698,7 @@ def is_definite_clause(clause):
             # there will only be one simple argument such as 'P' or 'Has(...)'
             # so we can simply return one for negative
             return (0, 1)
-        elif clause.op == '&':
+        elif clause.op in ['&', '&&']:
             # we can simply return False because now there is no way that
             # the clause is a definite clause
             return False        
@@ -370,10 +726,183 @@ def is_definite_clause(clause):
 
 #______________________________________________________________________________
 
+def compile_rule(clause):
+    
+    """
+    Compiles a definite clause into a Rule.
+    P & Q ==> R gets R as its head and (P, Q) as its body, and so does the
+    equivalent ~P | ~Q | R.
+    """
+    
+    head = clause_head(clause)
+    body, barriers = body_literals(clause)
+    slots = {}
+    compiled_head = compile_term(head, slots)
+    compiled_body = tuple(compile_term(literal, slots) for literal in body)
+    return Rule(clause, compiled_head, compiled_body, len(slots), tuple(barriers))
+    
+def body_literals(clause):
+    
+    """
+    Returns the literals of the body of a definite clause, in order, and the
+    positions among them where a && falls (see Rule.barriers).
+    """
+    
+    if clause.op != '==>':
+        # the body is made up of the negated literals of the disjunction
+        literals = flatten(break_nesting(clause), '|')
+        return [literal.args[0] for literal in literals if literal.op == '~'], []
+    body = []
+    barriers = []
+    
+    def add_conjuncts(clause):
+        if clause.op == '&':
+            add_conjuncts(clause.args[0])
+            add_conjuncts(clause.args[1])
+        elif clause.op == '&&':
+            add_conjuncts(clause.args[0])
+            if not barriers or barriers[-1] != len(body):
+                barriers.append(len(body))
+            add_conjuncts(clause.args[1])
+        else:
+            body.append(clause)
+    
+    add_conjuncts(break_nesting(clause.args[0]))
+    return body, barriers
+    
+def flatten(clause, op):
+    
+    """
+    Returns the arguments of a (possibly nested) chain of op as a flat list,
+    for e.g. flattening (P & Q) & R on '&' gives [P, Q, R].
+    """
+    
+    if clause.op != op:
+        return [clause]
+    return flatten(clause.args[0], op) + flatten(clause.args[1], op)
+    
+def compile_term(clause, slots):
+    
+    """
+    Replaces every variable in clause by its slot number.
+    slots maps the variables seen so far to their slot numbers; new
+    variables get the next free one. Returns clause itself if it has no
+    variables in it, and a tuple (op, arg1, arg2, ...) of compiled arguments
+    otherwise.
+    """
+    
+    if is_variable(clause):
+        if clause not in slots:
+            slots[clause] = len(slots)
+        return slots[clause]
+    if clause.args == ():
+        # a constant or a proposition
+        return clause
+    compiled_args = tuple([compile_term(arg, slots) for arg in clause.args])
+    if all(isinstance(arg, Clause) for arg in compiled_args):
+        # nothing to rename in here
+        return clause
+    return (clause.op,) + compiled_args
+    
+def literal_key(literal):
+    
+    """
+    Returns (predicate, arity) of a compiled literal (None for a literal that
+    is just a variable).
+    """
+    
+    if type(literal) is int:
+        return None
+    elif type(literal) is tuple:
+        return (literal[0], len(literal) - 1)
+    return (literal.op, len(literal.args))
+    
+def instantiate(term, variables):
+    
+    """
+    The reverse of compile_term: builds a clause out of a compiled term,
+    putting variables[i] wherever slot i appears.
+    """
+    
+    if isinstance(term, Clause):
+        return term
+    elif isinstance(term, int):
+        return variables[term]
+    return Clause(term[0], [instantiate(arg, variables) for arg in term[1:]])
+
+#______________________________________________________________________________
+
+def clause_head(clause):
+    
+    """
+    Returns the head of a definite clause, i.e. its one positive literal.
+    For P & Q ==> R this is R, for a fact like Owns(Nono, M1) it is the fact
+    itself.
+    """
+    
+    if clause.op == '==>':
+        return clause.args[1]
+    elif clause.op not in OPERATORS:
+        return clause
+    
+    def positive_literal(clause):
+        # clause has had its nesting broken, so it is a disjunction of literals
+        if clause.op == '~':
+            return None
+        elif clause.op == '|':
+            return positive_literal(clause.args[0]) or positive_literal(clause.args[1])
+        return clause
+        
+    return positive_literal(break_nesting(clause))
+
+#______________________________________________________________________________
+
+def first_arg_key(clause):
+    
+    """
+    Returns the first argument of clause if it is a constant, such as Nono in
+    Owns(Nono, x), and None otherwise (no arguments, or a variable first).
+    This is the key the knowledge base indexes heads by.
+    """
+    
+    if clause.args == ():
+        return None
+    first_arg = clause.args[0]
+    if first_arg.args != () or is_variable(first_arg):
+        # a variable, or a compound term we do not bother indexing
+        return None
+    return first_arg
+
+#______________________________________________________________________________
+
 def is_predicate(clause):
         
         """
         Finds if the clause is a predicate or not
         """
         
-        return clause.op not in OPERATORS and clause.op[0].isupper() 
+        return clause.op not in OPERATORS and clause.op[0].isupper()
+
+#______________________________________________________________________________
+
+def is_variable(item):
+    
+    """
+    Checks if the item is a variable.
+    """
+    
+    # an item is a variable if it is of type Clause, its operator is a string
+    # and starts with a small case letter, and has no args
+    
+    return isinstance(item, Clause) and item.op.islower() and item.args == ()
+
+#______________________________________________________________________________
+
+# these use the knowledge base and clauses defined above (FolBC through
+# Unifier's from KBUtil import *), so they are only imported once all of it
+# is in place; that way this module can be imported first, or after them
+import FolBC
+import GoalOrder
+import Snapshot
+from FactStore import FactStore, is_ground_fact
+from Dependencies import Dependencies
@@ -0,0 +1,176 @@
+"""
+The script that answers queries on several processes at once: a batch of
+queries shared out among the processes, or the branches of the search for
+one hard query (OR-parallelism).
+
+The worker processes are forked once the knowledge base is loaded, so they
+all share it with the parent (copy-on-write) instead of each reading it
+again or having it pickled over; only the position of each query goes to
+them, and only the answers come back.
+
+@author: Aashish Satyajith.
+
+"""
+
+import multiprocessing
+from itertools import izip
+
+from FolBC import *
+
+#______________________________________________________________________________
+
+# what the worker processes work with; set just before they are forked, so
+# that they get it along with the rest of the parent's memory
+worker_kb = None
+worker_queries = None
+worker_options = None
+# the answer tables of a worker, shared by all the queries it answers (the
+# knowledge base cannot change under it)
+worker_tables = None
+
+def answer_query(index):
+    
+    """
+    Answers the query at index in a worker process, and returns its answers
+    and its Search.
+    """
+    
+    global worker_tables
+    
+    first_only, options = worker_options
+    if options['tabled'] and worker_tables is None:
+        worker_tables = AnswerTables()
+    results = fol_bc_ask_many(worker_kb, [worker_queries[index]], first_only,
+                              tables = worker_tables, **options)
+    for _, answers, search in results:
+        return answers, search
+
+#______________________________________________________________________________
+
+def ask_parallel(kb, queries, processes = None, chunksize = None,
+                 first_only = False, **options):
+    
+    """
+    Asks every query on a pool of processes (one per core, unless processes
+    says otherwise), and yields (query, answers, search) for each, in the
+    order of queries, like KnowledgeBase.ask_many does. The Search comes back
+    without its knowledge base, bindings and tables; its status and stats are
+    all there is left to look at.
+    The queries are handed out chunksize at a time; by default each process
+    gets a few chunks, so that the load evens out without too many round
+    trips.
+    The options are those of fol_bc_ask_many. Nothing must be told to kb
+    until all the answers are in.
+    """
+    
+    global worker_kb, worker_queries, worker_options
+    
+    queries = list(queries)
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if chunksize is None:
+        chunksize = max(1, len(queries) // (processes * 4))
+    options.setdefault('tabled', True)
+    
+    worker_kb = kb
+    worker_queries = queries
+    worker_options = (first_only, options)
+    pool = multiprocessing.Pool(processes)
+    try:
+        results = pool.imap(answer_query, xrange(len(queries)), chunksize)
+        for query, (answers, search) in izip(queries, results):
+            yield query, answers, search
+        pool.close()
+    finally:
+        # stops the workers at once if we were not run to the end
+        pool.terminate()
+        pool.join()
+        worker_kb = worker_queries = worker_options = None
+
+#______________________________________________________________________________
+
+def split_branches(kb, query, wanted):
+    
+    """
+    Splits the search for query into branches for fol_bc_branch: one for
+    each rule that can conclude the query, or, if that makes fewer than
+    wanted, one for each rule for the first literal of the body of each of
+    those as well. Branches that fail straight away are left out.
+    """
+    
+    bindings = Bindings()
+    slots = {}
+    goal = compile_term(query, slots)
+    base = bindings.new_frame(len(slots))
+    rules = list(rules_for_goal(kb, goal, base, bindings))
+    branches = []
+    for i, rule in enumerate(rules):
+        mark = bindings.mark()
+        rule_base = bindings.new_frame(rule.nvars)
+        if bindings.unify(rule.head, rule_base, goal, base):
+            if len(rules) < wanted and rule.body:
+                first, first_base = bindings.deref(rule.body[0], rule_base)
+                count = len(list(rules_for_goal(kb, first, first_base, bindings)))
+                branches.extend((i, j) for j in xrange(count))
+            else:
+                branches.append((i,))
+        bindings.undo(mark)
+    return branches
+
+def prove_branch(branch):
+    
+    """
+    Looks for a proof of the query down one branch in a worker process, and
+    returns the first answer found (None if there is none) and the Search.
+    """
+    
+    options = worker_options
+    search = fol_bc_ask(worker_kb, worker_queries[0], branch = branch, **options)
+    found = iter(search)
+    for answer in found:
+        found.close()
+        return answer, search
+    return None, search
+
+def ask_or_parallel(kb, query, processes = None, **options):
+    
+    """
+    Looks for a proof of query on a pool of processes (one per core, unless
+    processes says otherwise), each searching different alternatives: the
+    rules for the query, or for the first literal in their bodies when there
+    are too few of those to go round.
+    The first proof found wins and the processes still searching the other
+    branches are stopped. Returns that answer (None if no branch has a
+    proof), and the list of Searches of the branches that finished, whose
+    status tells whether they ran out of a budget.
+    The options are those of fol_bc_ask, and apply to each branch on its own.
+    A branch that contains the only proofs may be searched after others, so
+    the answer is not always the first one fol_bc_ask would have given.
+    """
+    
+    global worker_kb, worker_queries, worker_options
+    
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    branches = split_branches(kb, query, processes)
+    if not branches:
+        return None, []
+    
+    worker_kb = kb
+    worker_queries = [query]
+    worker_options = options
+    pool = multiprocessing.Pool(min(processes, len(branches)))
+    try:
+        searches = []
+        # the branches are handed out one at a time, in order, and the
+        # results taken as they come
+        for answer, search in pool.imap_unordered(prove_branch, branches):
+            searches.append(search)
+            if answer is not None:
+                return answer, searches
+        return None, searches
+    finally:
+        # cancels the branches still being searched
+        pool.terminate()
+        pool.join()
+        worker_kb = worker_queries = worker_options = None
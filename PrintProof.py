@@ -1,47 +1,208 @@
-
 """
 The script that prints out proof of the queried statement (if one exists).
 
+A proof (answer.proof, when a query is asked with record_proof set) is a
+DAG of ProofNodes: the same subproof may turn up as the premise of many
+steps. ProofGraph numbers its distinct steps once, premises first, and the
+proof is written out from that, in one pass and without recursion, so that
+a large or deep proof costs no more than its size. It can be written as
+text (the way print_parent() always has), as JSON or as a Graphviz DOT
+graph, line by line to any file (see write_proof()).
+
 @author: Aashish Satyajith.
 
 """
 
+import json
+import sys
+
 from FolBC import *
 
 #______________________________________________________________________________
 
-def complete_substitute(theta, clause):
+# the formats write_proof() knows
+FORMATS = ('text', 'json', 'dot')
+
+#______________________________________________________________________________
+
+def conjoin(literals):
+    
+    """
+    Builds the conjunction of the given literals, nested to the right like
+    the parser does, for e.g. (P, Q, R) gives P & (Q & R).
+    """
+    
+    conjunction = literals[-1]
+    for literal in reversed(literals[:-1]):
+        conjunction = Clause('&', [literal, conjunction])
+    return conjunction
+
+#______________________________________________________________________________
+
+class ProofGraph(object):
+    
+    """
+    The distinct steps of a proof (a ProofNode), numbered premises first:
+    nodes[i] is the (clause, rule, premises) of step i, with premises the
+    numbers of its premises, and the conclusion of the proof is the last of
+    them, at root. Steps that are the same (the same clause, concluded by the
+    same rule from the same premises) are one node, whether or not they were
+    the same ProofNode.
+    """
+    
+    def __init__(self, proof):
+        self.nodes = []
+        # the number of each ProofNode, by id, and of each distinct step
+        numbers = {}
+        steps = {}
+        stack = [proof]
+        while stack:
+            node = stack[-1]
+            if id(node) in numbers:
+                stack.pop()
+                continue
+            waiting = [premise for premise in node.premises if id(premise) not in numbers]
+            if waiting:
+                # the premises first, in order; node is back on top once they
+                # are done
+                stack.extend(reversed(waiting))
+                continue
+            stack.pop()
+            premises = tuple([numbers[id(premise)] for premise in node.premises])
+            # facts are given, whatever they are made a Rule of
+            step = (node.clause, node.rule.clause if premises else None, premises)
+            number = steps.get(step)
+            if number is None:
+                number = steps[step] = len(self.nodes)
+                self.nodes.append((node.clause, node.rule, premises))
+            numbers[id(node)] = number
+        self.root = numbers[id(proof)]
+    
+    def __len__(self):
+        return len(self.nodes)
+
+#______________________________________________________________________________
+
+class RuleText(dict):
+    
+    """
+    The text of each rule of a proof, written out (and quoted, by quote) the
+    first time it is needed only, as the same few rules make up most steps.
+    """
+    
+    def __init__(self, quote = None):
+        dict.__init__(self)
+        self.quote = quote
+    
+    def __missing__(self, rule):
+        text = str(rule.clause)
+        if self.quote is not None:
+            text = self.quote(text)
+        self[rule] = text
+        return text
 
+def text_lines(graph):
+    
+    """
+    Yields the lines of the proof in graph as text, parents first. A step
+    that was proved above already is not proved again, just referred to.
+    """
+    
+    nodes = graph.nodes
+    rule_text = RuleText()
+    shown = set()
+    # (number, whether its premises are done)
+    stack = [(graph.root, False)]
+    while stack:
+        number, done = stack.pop()
+        clause, rule, premises = nodes[number]
+        if not premises:
+            # last statement, must have already been given in kb
+            yield 'We know %s (given)' % clause
+        elif number in shown:
+            yield 'We know %s (proved above)' % clause
+        elif not done:
+            stack.append((number, True))
+            stack.extend([(premise, False) for premise in reversed(premises)])
+        else:
+            shown.add(number)
+            literals = [nodes[premise][0] for premise in premises]
+            # the premises taken together, innermost conjunction first
+            for i in range(len(literals) - 2, -1, -1):
+                yield 'which leads to %s (Rule of conjunction)' % conjoin(literals[i:])
+            # clause was of the implication form
+            instance = Clause('==>', [conjoin(literals), clause])
+            yield 'which leads to %s (Rule of universal instantiation on %s)' % \
+                  (instance, rule_text[rule])
+            yield 'which leads to %s (Modus Ponens)' % clause
+
+def json_lines(graph):
+    
     """
-    Keeps substituting for variables in clause until there
-    are no variables to substitute for or all variables in
-    theta have been substituted.
-    This is needed for displaying the proof.
+    Yields the proof in graph as a JSON object, a node per line:
+        {"nodes": [{"id": 0, "clause": "American(West)", "rule": null,
+                    "premises": []},
+                   ...],
+         "root": 9}
+    The rule of a given fact is null; premises are node ids, and every node
+    comes after its premises.
     """
     
-    for i in range(0, len(theta.keys())):
-        clause = substitute(theta, clause)
-    return clause
+    rule_text = RuleText(json.dumps)
+    yield '{"nodes": ['
+    last = len(graph.nodes) - 1
+    for number, (clause, rule, premises) in enumerate(graph.nodes):
+        yield '{"id": %d, "clause": %s, "rule": %s, "premises": [%s]}%s' % \
+              (number, json.dumps(str(clause)), rule_text[rule] if premises else 'null',
+               ', '.join(map(str, premises)), ',' if number < last else '')
+    yield '], "root": %d}' % graph.root
+
+def dot_lines(graph):
+    
+    """
+    Yields the proof in graph as a Graphviz DOT digraph, with an edge from
+    every premise to what it leads to. Given facts are ellipses, the rest
+    are boxes, with the rule that concluded them as their tooltip.
+    """
+    
+    # a JSON string is a DOT string as well
+    rule_text = RuleText(json.dumps)
+    yield 'digraph proof {'
+    yield '    rankdir = BT;'
+    for number, (clause, rule, premises) in enumerate(graph.nodes):
+        if premises:
+            yield '    n%d [shape = box, label = %s, tooltip = %s];' % \
+                  (number, json.dumps(str(clause)), rule_text[rule])
+        else:
+            yield '    n%d [shape = ellipse, label = %s];' % (number, json.dumps(str(clause)))
+        for premise in premises:
+            yield '    n%d -> n%d;' % (premise, number)
+    yield '}'
 
 #______________________________________________________________________________
 
-def print_parent(theta, clause):
+def write_proof(proof, out = None, format = 'text'):
+    
+    """
+    Writes the proof (a ProofNode) to the file out (standard output if not
+    given) in the given format, one of FORMATS, a line at a time as it is
+    worked out.
+    """
+    
+    if format not in FORMATS:
+        raise ValueError('unknown proof format: %s' % format)
+    if out is None:
+        out = sys.stdout
+    graph = ProofGraph(proof)
+    lines = {'text': text_lines, 'json': json_lines, 'dot': dot_lines}[format](graph)
+    for line in lines:
+        out.write(line + '\n')
+
+def print_parent(proof):
     
     """
-    Prints the parents of the clause one by one
+    Prints the proof (a ProofNode, as found in answer.proof when a query is
+    asked with record_proof set), parents first.
     """
     
-    if clause not in parent_clauses:
-        # last statement, must have already been given in kb
-        print 'We know', complete_substitute(theta, clause), '(given)'
-        return
-    parents, law_used, clause_used = parent_clauses[clause]
-    for parent in parents:
-        print_parent(theta, parent)
-    print 'which leads to', complete_substitute(theta, clause),
-    if clause_used is not None:
-        # clause was of the implication form
-        print '(' + law_used, 'on', str(clause_used) + ')'
-    else:
-        print '(' + law_used + ')'
-        
+    write_proof(proof)
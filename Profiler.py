@@ -0,0 +1,305 @@
+"""
+The script that keeps count of what the prover does while it answers a
+query, to find out why a query is slow: how many subgoals it tried, how many
+rules and facts it fetched for them, how many unifications it made and how
+many of those failed, how many times it standardized a rule apart, and how
+long it spent on each predicate and each rule.
+
+Nothing is counted unless the query is asked with the profile option (see
+FolBC.Search); without it the prover only ever checks that search.profile is
+None, once per subgoal and a couple of times per rule it tries. With it,
+search.profile is a Profile, which can be exported as JSON and ranks the
+rules by the time spent on them.
+
+@author: Aashish Satyajith.
+
+"""
+
+import json
+import time
+
+#______________________________________________________________________________
+
+# the events counted, in the order they are reported
+EVENTS = ['goals',              # subgoals called
+          'rule_fetches',       # lookups of the rules and facts for a subgoal
+          'rules_tried',        # rules (with a body) those lookups handed out
+          'facts_tried',        # facts (rules with no body) they handed out
+          'head_failures',      # rules and facts whose head did not unify
+          'unifications',       # calls of Bindings.unify
+          'unify_failures',     # calls of Bindings.unify that failed
+          'frames',             # new frames of variables; one per rule standardized
+                                # apart, and one per query and table answer
+          'table_hits',         # calls of tabled subgoals already complete
+          'tables_filled',      # calls of tabled subgoals that were worked out
+          'join_rows']          # matches found by set-at-a-time joins
+
+#______________________________________________________________________________
+
+class Record(object):
+    
+    """
+    What was counted for one predicate or one rule:
+        name         - the predicate (as Name/arity) or the rule
+        calls        - the subgoals with the predicate, or the times the rule
+                       was tried
+        failures     - the times the head of the rule (or of the rules and
+                       facts for the predicate) did not unify with the goal
+        proofs       - the proofs found
+        seconds      - the time spent on it, subgoals and all (when it calls
+                       itself, the time is only counted once)
+        self_seconds - the time spent on it less that spent on other
+                       subgoals (predicates only)
+    """
+    
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.failures = 0
+        self.proofs = 0
+        self.seconds = 0.0
+        self.self_seconds = 0.0
+        # how many times it is being run right now, further up the stack
+        self.active = 0
+    
+    def merge(self, other):
+        self.calls += other.calls
+        self.failures += other.failures
+        self.proofs += other.proofs
+        self.seconds += other.seconds
+        self.self_seconds += other.self_seconds
+    
+    def as_dict(self):
+        return {'name': self.name, 'calls': self.calls, 'failures': self.failures,
+                'proofs': self.proofs, 'seconds': self.seconds,
+                'self_seconds': self.self_seconds}
+
+#______________________________________________________________________________
+
+class Profile(object):
+    
+    """
+    The counts of one search (or of several, merged):
+        counts     - the number of times each of EVENTS happened
+        predicates - a Record for each predicate subgoals were called on,
+                     keyed by (predicate, arity)
+        rules      - a Record for each rule tried, keyed by the Rule (by its
+                     text once the Profile has been pickled)
+    Facts get no Record of their own; they are counted under their
+    predicate.
+    """
+    
+    def __init__(self):
+        self.counts = dict.fromkeys(EVENTS, 0)
+        self.predicates = {}
+        self.rules = {}
+        # the time spent on the subgoals under the one being timed now
+        self.child_seconds = 0.0
+    
+    def __getstate__(self):
+        
+        """
+        Rules are not pickled along (for e.g. when a search is sent back from
+        another process); their Records go by their text instead.
+        """
+        
+        state = self.__dict__.copy()
+        state['rules'] = dict((record.name, record) for record in self.rules.itervalues())
+        return state
+    
+    #__________________________________________________________________________
+    
+    # the hooks the prover calls
+    
+    def goal(self, goal, proofs):
+        
+        """
+        Counts a call of the subgoal goal (compiled and dereferenced), and
+        returns proofs, the proofs of it, timed.
+        """
+        
+        self.counts['goals'] += 1
+        record = self.predicate(goal)
+        record.calls += 1
+        return self.timed(proofs, record, True)
+    
+    def table_pass(self, goal, proofs):
+        
+        """
+        Returns proofs, those of a pass over the rules for the tabled
+        subgoal goal to fill its table (see FolBC.fol_bc_scheduled), timed
+        under the predicate of goal. The table is filled apart from the call
+        that needed it, so that call does not take in the time; and the
+        proofs are not counted, as they are once they come out of the table.
+        """
+        
+        return self.timed(proofs, self.predicate(goal), True, False)
+    
+    def predicate(self, goal):
+        
+        """
+        The Record of the predicate of goal (compiled and dereferenced),
+        made if there is none yet.
+        """
+        
+        if type(goal) is tuple:
+            key = (goal[0], len(goal) - 1)
+        elif type(goal) is int:
+            key = ('?', 0)
+        else:
+            key = (goal.op, len(goal.args))
+        record = self.predicates.get(key)
+        if record is None:
+            record = self.predicates[key] = Record('%s/%d' % key)
+        return record
+    
+    def rule_tried(self, rule):
+        
+        """
+        Counts rule being tried on a goal, and returns its Record (None for a
+        fact).
+        """
+        
+        if not rule.body:
+            self.counts['facts_tried'] += 1
+            return None
+        self.counts['rules_tried'] += 1
+        record = self.rules.get(rule)
+        if record is None:
+            record = self.rules[rule] = Record(str(rule))
+        record.calls += 1
+        return record
+    
+    def head_failed(self, goal, record):
+        
+        """
+        Counts a rule (whose Record is record, None for a fact) that did not
+        unify with goal.
+        """
+        
+        self.counts['head_failures'] += 1
+        if record is not None:
+            record.failures += 1
+        if type(goal) is tuple:
+            predicate = self.predicates.get((goal[0], len(goal) - 1))
+        elif type(goal) is int:
+            predicate = self.predicates.get(('?', 0))
+        else:
+            predicate = self.predicates.get((goal.op, len(goal.args)))
+        if predicate is not None:
+            predicate.failures += 1
+    
+    def timed(self, proofs, record, nested, count = True):
+        
+        """
+        Yields the proofs from the generator proofs, counting them (unless
+        count is False) and the time spent getting each in record. With
+        nested set, the time also counts against the self_seconds of the
+        subgoal that called this one; rules are not nested that way, so that
+        the self_seconds of a predicate leave out only the time spent on
+        other predicates. A proof waiting on a table (FolBC.SUSPEND) is
+        passed on without being counted.
+        """
+        
+        suspend = FolBC.SUSPEND
+        clock = time.time
+        while True:
+            if nested:
+                outer = self.child_seconds
+                self.child_seconds = 0.0
+            record.active += 1
+            started = clock()
+            try:
+                proof = next(proofs)
+            except StopIteration:
+                return
+            finally:
+                elapsed = clock() - started
+                record.active -= 1
+                if not record.active:
+                    record.seconds += elapsed
+                if nested:
+                    record.self_seconds += elapsed - self.child_seconds
+                    self.child_seconds = outer + elapsed
+            if count and proof is not suspend:
+                record.proofs += 1
+            yield proof
+    
+    #__________________________________________________________________________
+    
+    def merge(self, other):
+        
+        """
+        Adds the counts of the Profile other to this one.
+        """
+        
+        for event, count in other.counts.iteritems():
+            self.counts[event] = self.counts.get(event, 0) + count
+        for records, others in ((self.predicates, other.predicates),
+                                (self.rules, other.rules)):
+            for key, record in others.iteritems():
+                if key not in records:
+                    records[key] = Record(record.name)
+                records[key].merge(record)
+    
+    def hot_rules(self, count = 10):
+        
+        """
+        Returns the Records of the count rules the most time was spent on,
+        the most first.
+        """
+        
+        return sorted(self.rules.itervalues(), key = lambda record: -record.seconds)[:count]
+    
+    def hot_predicates(self, count = 10):
+        
+        """
+        Returns the Records of the count predicates the most time was spent
+        on for themselves (not counting their subgoals), the most first.
+        """
+        
+        return sorted(self.predicates.itervalues(),
+                      key = lambda record: -record.self_seconds)[:count]
+    
+    def as_dict(self, count = 10):
+        
+        """
+        Returns everything counted as a dict that can be written as JSON,
+        with the count hottest rules ranked under 'hot_rules'.
+        """
+        
+        return {'counts': dict(self.counts),
+                'predicates': sorted([record.as_dict() for record in self.predicates.itervalues()],
+                                     key = lambda record: record['name']),
+                'rules': sorted([record.as_dict() for record in self.rules.itervalues()],
+                                key = lambda record: record['name']),
+                'hot_rules': [record.name for record in self.hot_rules(count)]}
+    
+    def to_json(self, count = 10, indent = 2):
+        return json.dumps(self.as_dict(count), indent = indent, sort_keys = True)
+    
+    def report(self, count = 10):
+        
+        """
+        Returns the counts, the hottest predicates and the hottest rules as
+        text.
+        """
+        
+        lines = ['%s: %d' % (event, self.counts.get(event, 0)) for event in EVENTS]
+        lines.append('Hot predicates (seconds for themselves, with subgoals):')
+        for record in self.hot_predicates(count):
+            lines.append('    %s: %.4f, %.4f (%d calls, %d proofs)' %
+                         (record.name, record.self_seconds, record.seconds, record.calls,
+                          record.proofs))
+        lines.append('Hot rules (seconds, with subgoals):')
+        for record in self.hot_rules(count):
+            lines.append('    %s: %.4f (tried %d times, %d failed to unify, %d proofs)' %
+                         (record.name, record.seconds, record.calls, record.failures,
+                          record.proofs))
+        return '\n'.join(lines)
+
+#______________________________________________________________________________
+
+# FolBC imports this module, so it comes last; nothing above needs it until
+# it is called
+import FolBC
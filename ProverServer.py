@@ -0,0 +1,388 @@
+"""
+The script that keeps a knowledge base loaded in memory and answers tell and
+ask requests for it over a socket, so that each query only costs the proof
+and not the reading, parsing and indexing of the knowledge base all over
+again.
+
+Usage: python ProverServer.py [options] [kb_file]
+
+The server listens on a Unix socket (--socket PATH) or on a TCP port of
+localhost (--port, 8765 by default), and serves every client on a thread of
+its own. Requests and responses are JSON objects, one per line:
+    {"op": "tell", "statements": ["Missile(M2)", "Owns(Nono, M2)"]}
+        -> {"ok": true, "added": 2, "duplicates": 0, "not_definite": 0}
+    {"op": "ask", "query": "Criminal(x)", "all": false, "options": {...}}
+        -> {"ok": true, "answers": [{"x": "West"}], "status": "stopped", ...}
+    {"op": "stats"}
+        -> {"ok": true, "rules": 5, "facts": 5, "asks": 1, ...}
+The options of an ask are those of FolBC.Search that make sense for a
+single query: tabled, joins, reorder, max_depth, max_steps, timeout,
+max_memory and iterative_deepening. A request that cannot be carried out,
+for whatever reason, gets {"ok": false, "error": "..."}.
+
+Clauses are interned (see KBUtil.Clause), which only works if they are
+built by one thread at a time, so the threads take turns at the knowledge
+base; what they can do at the same time is wait on their clients. To keep
+one slow query from holding up the rest, each query is first tried in the
+server itself with a small budget of steps (--inline-steps), and if that
+runs out it is handed to a pool of worker processes (--workers), forked
+with the knowledge base the way Parallel.py does it. A tell makes the pool
+out of date; the next query that needs it forks a new one.
+
+ProverClient below talks to a server from Python.
+
+@author: Aashish Satyajith.
+
+"""
+
+import json
+import multiprocessing
+import os
+import socket
+import SocketServer
+import sys
+import threading
+import time
+from optparse import OptionParser
+
+from Parser import *
+from FolBC import *
+from BulkLoader import read_statement
+from BatchProver import load_kb
+
+#______________________________________________________________________________
+
+# the steps a query may take in the server process before it is handed to
+# the worker processes
+INLINE_STEPS = 10000
+
+# the options of fol_bc_ask clients may give
+ASK_OPTIONS = frozenset(['tabled', 'joins', 'reorder', 'max_depth', 'max_steps',
+                         'timeout', 'max_memory', 'iterative_deepening'])
+
+# the knowledge base of the worker processes; set just before they are
+# forked, so that they get it along with the rest of the server's memory
+worker_kb = None
+
+#______________________________________________________________________________
+
+def answer_query(kb, query, first_only, options):
+    
+    """
+    Asks query (a statement) of kb, up to the first answer or to all of
+    them, and returns the response to send back: the answers, with the
+    variables and their values written out, and how the search went.
+    """
+    
+    search = kb.ask(parse_clause(query), **options)
+    answers = []
+    found = iter(search)
+    for answer in found:
+        answers.append(dict((str(vbl), str(value)) for vbl, value in answer.iteritems()))
+        if first_only:
+            found.close()
+            break
+    return {'ok': True, 'answers': answers, 'status': search.status,
+            'steps': search.stats['steps'], 'elapsed': search.stats['elapsed']}
+
+def answer_in_worker(query, first_only, options):
+    
+    """
+    answer_query, in a worker process.
+    """
+    
+    return answer_query(worker_kb, query, first_only, options)
+
+#______________________________________________________________________________
+
+class Prover(object):
+    
+    """
+    The knowledge base a server serves, and what it takes to answer
+    requests for it: the lock the threads take turns with, and the pool of
+    worker processes for slow queries.
+        workers      - the number of worker processes (0 to answer every
+                       query in the server itself)
+        inline_steps - the steps a query may take in the server before it
+                       is handed to the workers
+    """
+    
+    def __init__(self, kb, workers = None, inline_steps = INLINE_STEPS):
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        self.kb = kb
+        self.workers = workers
+        self.inline_steps = inline_steps
+        self.lock = threading.Lock()
+        self.pool = None
+        # kb.told when the pool was forked, to tell when it is out of date
+        self.pool_told = None
+        self.counts = {'tells': 0, 'asks': 0, 'offloaded': 0, 'errors': 0}
+    
+    def handle(self, request):
+        
+        """
+        Carries out a request (a dict, as read from JSON) and returns the
+        response. Whatever goes wrong is turned into an error response, so
+        the client always gets one.
+        """
+        
+        try:
+            if not isinstance(request, dict):
+                raise ValueError('a request must be a JSON object')
+            op = request.get('op')
+            if op == 'tell':
+                return self.tell(request.get('statements', []))
+            elif op == 'ask':
+                return self.ask(request.get('query'), request.get('all', False),
+                                request.get('options', {}))
+            elif op == 'stats':
+                return self.stats()
+            raise ValueError('unknown op: %s' % op)
+        except (ValueError, TypeError) as error:
+            # ParseError is a ValueError too
+            message = str(error)
+        except Exception as error:
+            # a bug, or something that went wrong in a worker process; the
+            # connection must not be left waiting for a response
+            message = '%s: %s' % (type(error).__name__, error)
+        with self.lock:
+            self.counts['errors'] += 1
+        return {'ok': False, 'error': message}
+    
+    def tell(self, statements):
+        
+        """
+        Tells the statements (a list of strings). Either all of them are
+        told, or, if one cannot be parsed, none at all.
+        """
+        
+        if isinstance(statements, basestring):
+            statements = [statements]
+        with self.lock:
+            clauses = [read_statement(statement) for statement in statements]
+            added, duplicates, not_definite = self.kb.tell_many(clauses)
+            self.counts['tells'] += 1
+        return {'ok': True, 'added': added, 'duplicates': duplicates,
+                'not_definite': not_definite}
+    
+    def ask(self, query, all_answers, options):
+        
+        """
+        Asks the query (a string), up to the first answer, or to all of them
+        if all_answers is set. It is tried in the server first, and handed to
+        the workers if it takes more than inline_steps steps there.
+        """
+        
+        if not isinstance(query, basestring):
+            raise ValueError('no query given')
+        if not isinstance(options, dict) or not ASK_OPTIONS.issuperset(options):
+            raise ValueError('the options of a query may only be ' +
+                             ', '.join(sorted(ASK_OPTIONS)))
+        options = dict((str(option), value) for option, value in options.iteritems())
+        max_steps = options.get('max_steps')
+        offload = self.workers > 0 and (max_steps is None or max_steps > self.inline_steps)
+        inline = dict(options)
+        if offload:
+            inline['max_steps'] = self.inline_steps
+        with self.lock:
+            self.counts['asks'] += 1
+            response = answer_query(self.kb, query, not all_answers, inline)
+        if not offload or response['status'] != 'step_limit':
+            response['offloaded'] = False
+            return response
+        with self.lock:
+            self.counts['offloaded'] += 1
+        response = self.worker_pool().apply_async(answer_in_worker,
+                                                  (query, not all_answers, options)).get()
+        response['offloaded'] = True
+        return response
+    
+    def worker_pool(self):
+        
+        """
+        Returns the pool of worker processes, forking a new one first if
+        there is none yet or something has been told since it was forked.
+        The old pool finishes the queries it has, on the knowledge base as it
+        was when they were asked.
+        """
+        
+        global worker_kb
+        
+        with self.lock:
+            if self.pool is None or self.pool_told != self.kb.told:
+                if self.pool is not None:
+                    retire(self.pool)
+                # nothing else is touching the knowledge base while we fork
+                worker_kb = self.kb
+                self.pool = multiprocessing.Pool(self.workers)
+                self.pool_told = self.kb.told
+            return self.pool
+    
+    def stats(self):
+        with self.lock:
+            response = {'ok': True, 'rules': len(self.kb.rules), 'facts': len(self.kb.facts),
+                        'workers': self.workers}
+            response.update(self.counts)
+            if self.kb.answer_cache is not None:
+                response['cache'] = self.kb.answer_cache.statistics()
+        return response
+    
+    def close(self):
+        
+        """
+        Stops the worker processes.
+        """
+        
+        with self.lock:
+            if self.pool is not None:
+                self.pool.terminate()
+                self.pool.join()
+                self.pool = None
+
+def retire(pool):
+    
+    """
+    Lets pool finish what it has been given, and then stops it, without
+    waiting for that.
+    """
+    
+    pool.close()
+    joiner = threading.Thread(target = pool.join)
+    joiner.daemon = True
+    joiner.start()
+
+#______________________________________________________________________________
+
+class RequestHandler(SocketServer.StreamRequestHandler):
+    
+    """
+    Serves one client: reads a request per line and writes a response per
+    line, until the client hangs up.
+    """
+    
+    def handle(self):
+        prover = self.server.prover
+        for line in iter(self.rfile.readline, ''):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as error:
+                response = {'ok': False, 'error': 'not JSON: %s' % error}
+            else:
+                response = prover.handle(request)
+            self.wfile.write(json.dumps(response) + '\n')
+            self.wfile.flush()
+
+class UnixServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    daemon_threads = True
+
+class TCPServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def make_server(prover, socket_path = None, host = 'localhost', port = 8765):
+    
+    """
+    Makes a server for prover on the Unix socket socket_path, or if that is
+    not given, on the TCP port of host. Call serve_forever() on it to start
+    serving.
+    """
+    
+    if socket_path is not None:
+        if os.path.exists(socket_path):
+            # left over from a server that is gone
+            os.remove(socket_path)
+        server = UnixServer(socket_path, RequestHandler)
+    else:
+        server = TCPServer((host, port), RequestHandler)
+    server.prover = prover
+    return server
+
+#______________________________________________________________________________
+
+class ProverClient(object):
+    
+    """
+    A connection to a prover server, on the Unix socket socket_path or on
+    the TCP port of host. Every method sends a request and returns the
+    response (see the top of this file); a response that is not ok raises
+    ValueError.
+    """
+    
+    def __init__(self, socket_path = None, host = 'localhost', port = 8765):
+        if socket_path is not None:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.connect(socket_path)
+        else:
+            self.socket = socket.create_connection((host, port))
+        self.file = self.socket.makefile('rb+')
+    
+    def request(self, request):
+        self.file.write(json.dumps(request) + '\n')
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise IOError('the server hung up')
+        response = json.loads(line)
+        if not response['ok']:
+            raise ValueError(response['error'])
+        return response
+    
+    def tell(self, statements):
+        return self.request({'op': 'tell', 'statements': list(statements)})
+    
+    def ask(self, query, all_answers = False, **options):
+        return self.request({'op': 'ask', 'query': query, 'all': all_answers,
+                             'options': options})
+    
+    def stats(self):
+        return self.request({'op': 'stats'})
+    
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+#______________________________________________________________________________
+
+def main(args):
+    option_parser = OptionParser(usage = 'python ProverServer.py [options] [kb_file]')
+    option_parser.add_option('--socket', metavar = 'PATH',
+                             help = 'listen on the Unix socket PATH instead of a TCP port')
+    option_parser.add_option('--host', default = 'localhost',
+                             help = 'the host to listen on (default localhost)')
+    option_parser.add_option('--port', type = 'int', default = 8765,
+                             help = 'the TCP port to listen on (default 8765)')
+    option_parser.add_option('--workers', type = 'int',
+                             help = 'worker processes for slow queries (default one per core, 0 for none)')
+    option_parser.add_option('--inline-steps', type = 'int', default = INLINE_STEPS,
+                             help = 'steps a query may take before it goes to the workers')
+    option_parser.add_option('--cache', type = 'int', default = 0, metavar = 'ENTRIES',
+                             help = 'keep the answers of up to ENTRIES queries (see KnowledgeBase.cache_answers)')
+    options, args = option_parser.parse_args(args)
+    if len(args) > 1:
+        option_parser.error('at most one knowledge base file')
+    
+    started = time.time()
+    kb = load_kb(args[0]) if args else KnowledgeBase()
+    print 'Loaded %d rules and %d facts in %.3f s' % (len(kb.rules), len(kb.facts),
+                                                        time.time() - started)
+    if options.cache:
+        kb.cache_answers(options.cache)
+    prover = Prover(kb, options.workers, options.inline_steps)
+    server = make_server(prover, options.socket, options.host, options.port)
+    print 'Serving on', options.socket or '%s:%d' % (options.host, options.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        prover.close()
+        if options.socket is not None and os.path.exists(options.socket):
+            os.remove(options.socket)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
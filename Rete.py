@@ -0,0 +1,354 @@
+"""
+The script that implements a Rete network: the rules of a knowledge base
+compiled into a network that, as facts stream in, works out which
+conclusions have just become derivable without going over the old facts
+again.
+
+@author: Aashish Satyajith.
+
+"""
+
+from itertools import izip
+
+from KBUtil import *
+
+#______________________________________________________________________________
+
+class AlphaMemory(object):
+    
+    """
+    The facts that match one body literal pattern on their own, for e.g. all
+    facts that match Enemy(x, America) or Likes(x, Mother(x)).
+    pattern is the literal with its variables numbered in order of
+    appearance within the literal only, so that Enemy(x, America) and
+    Enemy(z, America) share one memory.
+    Each fact that matches is kept as the values the variables of the
+    pattern take in it, in the order of their numbers; that is all the join
+    nodes need of it.
+    """
+    
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.op, self.args = split_literal(pattern)
+        self.matches = []
+        # the join nodes that take their facts from this memory
+        self.successors = []
+    
+    def match(self, fact):
+    
+        """
+        Matches the fact against the pattern, and returns the values of the
+        variables of the pattern in it (None if it does not match).
+        """
+        
+        values = []
+        if match_args(self.args, fact.args, values):
+            return tuple(values)
+        return None
+
+#______________________________________________________________________________
+
+class JoinNode(object):
+    
+    """
+    A join (beta) node, standing for a prefix of a rule body. It keeps the
+    partial matches (tokens) of the whole prefix: the tokens of its parent
+    (the prefix one literal shorter) joined with the facts in the alpha
+    memory of the last literal.
+    A token is the tuple of values of the variables of the prefix, in the
+    order the variables first appear in it (inside function terms too).
+    Rules with the same body prefix (up to renaming of variables) share
+    their nodes for it.
+    """
+    
+    def __init__(self, parent, literal, alpha):
+        self.parent = parent
+        self.alpha = alpha
+        self.tokens = []
+        self.children = []
+        # the rules whose whole body this node stands for, with the head of
+        # each, written in terms of the positions in the token
+        self.productions = []
+        width = parent.width
+        # the variables of the literal (by their position in the matches of
+        # the alpha memory) that must agree with a value in the token
+        # (variable position, token position), and the ones that are new;
+        # constants and repeated variables are the alpha memory's job
+        self.joins = []
+        self.new_vars = []
+        for i, vbl in enumerate(literal_variables(literal)):
+            if vbl < width:
+                self.joins.append((i, vbl))
+            else:
+                self.new_vars.append(i)
+        self.width = width + len(self.new_vars)
+        # the parent's tokens and the alpha memory's matches, hashed on the
+        # values that have to agree
+        self.left_index = {}
+        self.right_index = {}
+    
+    def left_key(self, token):
+        return tuple([token[posn] for _, posn in self.joins])
+    
+    def right_key(self, values):
+        return tuple([values[i] for i, _ in self.joins])
+    
+    def extend(self, token, values):
+        return token + tuple([values[i] for i in self.new_vars])
+
+#______________________________________________________________________________
+
+class RootNode(object):
+    
+    """
+    Stands for the empty body prefix; it has just the one, empty, token.
+    """
+    
+    def __init__(self):
+        self.tokens = [()]
+        self.children = []
+        self.width = 0
+
+#______________________________________________________________________________
+
+class ReteNetwork(object):
+    
+    """
+    A Rete network for the definite clauses of a knowledge base.
+    Every fact told to the knowledge base (a clause with no body and no
+    variables) is sent through the network, and so is every fact the
+    network derives from them. Each newly derived fact is passed to
+    callback, if there is one, and kept in self.derived.
+    Rules are taken up as they are told as well. Only facts without
+    variables go through the network, so rules whose head has a variable
+    that is not in the body (and so would not conclude such a fact) are
+    left out, as are rules with a body literal that is just a variable.
+    Body literals may have function terms in them, like Likes(x, Mother(x)).
+    """
+    
+    def __init__(self, kb, callback = None):
+        self.callback = callback
+        self.root = RootNode()
+        # join nodes by the body prefix they stand for
+        self.nodes = {}
+        # alpha memories by their pattern, and by (predicate, arity)
+        self.alpha_memories = {}
+        self.alpha_by_predicate = {}
+        # every fact seen so far (on the agenda or through the network), and
+        # the facts of each (predicate, arity) that have gone through it
+        self.known = set()
+        self.facts = {}
+        # the derived facts, in the order they were derived
+        self.derived = []
+        self.agenda = []
+        for rule in kb.all_rules():
+            self.tell(rule)
+        kb.listeners.append(self.tell)
+    
+    def tell(self, rule):
+    
+        """
+        Adds a rule or a fact to the network, and returns the list of facts
+        newly derived because of it.
+        """
+        
+        first_derived = len(self.derived)
+        if rule.body:
+            self.add_rule(rule)
+        elif rule.nvars == 0 and rule.head not in self.known:
+            self.known.add(rule.head)
+            self.agenda.append(rule.head)
+        self.run()
+        return self.derived[first_derived:]
+    
+    def run(self):
+    
+        """
+        Sends the facts waiting on the agenda through the network, one after
+        the other, until there are none left.
+        """
+        
+        while self.agenda:
+            self.add_fact(self.agenda.pop())
+    
+    def add_fact(self, fact):
+        key = (fact.op, len(fact.args))
+        self.facts.setdefault(key, []).append(fact)
+        for alpha in self.alpha_by_predicate.get(key, ()):
+            values = alpha.match(fact)
+            if values is not None:
+                alpha.matches.append(values)
+                for node in alpha.successors:
+                    self.right_activate(node, values)
+    
+    def right_activate(self, node, values):
+    
+        """
+        A new match (the values of its variables) in the node's alpha
+        memory: join it with the tokens of the parent that agree with it.
+        """
+        
+        key = node.right_key(values)
+        node.right_index.setdefault(key, []).append(values)
+        for token in node.left_index.get(key, ()):
+            self.add_token(node, node.extend(token, values))
+    
+    def left_activate(self, node, token):
+    
+        """
+        A new token in the node's parent: join it with the matches of the
+        alpha memory that agree with it.
+        """
+        
+        key = node.left_key(token)
+        node.left_index.setdefault(key, []).append(token)
+        for values in node.right_index.get(key, ()):
+            self.add_token(node, node.extend(token, values))
+    
+    def add_token(self, node, token):
+        node.tokens.append(token)
+        for child in node.children:
+            self.left_activate(child, token)
+        for head in node.productions:
+            self.derive(instantiate(head, token))
+    
+    def derive(self, fact):
+        # a fact is known as soon as it is derived, not only once it is off
+        # the agenda, so that deriving it again before then does not count
+        if fact in self.known:
+            return
+        self.known.add(fact)
+        self.derived.append(fact)
+        if self.callback is not None:
+            self.callback(fact)
+        # the fact goes through the network in its turn
+        self.agenda.append(fact)
+    
+    def add_rule(self, rule):
+    
+        """
+        Compiles the rule into the network, reusing the nodes of any rule
+        with the same body prefix, and derives whatever follows from the
+        facts already seen.
+        """
+        
+        # number the variables in order of appearance in the body, which is
+        # the order they come in the tokens
+        renumbering = {}
+        body = [renumber(literal, renumbering) for literal in rule.body]
+        if any(type(literal) is int for literal in body):
+            # a body literal that is just a variable
+            return
+        head = renumber(rule.head, renumbering)
+        if len(renumbering) < rule.nvars:
+            # the head has a variable the body never binds
+            return
+        node = self.root
+        for length in xrange(1, len(body) + 1):
+            prefix = tuple(body[:length])
+            if prefix not in self.nodes:
+                self.nodes[prefix] = self.add_node(node, body[length - 1])
+            node = self.nodes[prefix]
+        node.productions.append(head)
+        for token in node.tokens:
+            self.derive(instantiate(head, token))
+    
+    def add_node(self, parent, literal):
+    
+        """
+        Builds the join node for parent's prefix followed by literal, and
+        fills it with the tokens that follow from what is known already.
+        """
+        
+        alpha = self.alpha_memory(literal)
+        node = JoinNode(parent, literal, alpha)
+        alpha.successors.append(node)
+        parent.children.append(node)
+        for values in alpha.matches:
+            node.right_index.setdefault(node.right_key(values), []).append(values)
+        for token in parent.tokens:
+            self.left_activate(node, token)
+        return node
+    
+    def alpha_memory(self, literal):
+        pattern = renumber(literal, {})
+        if pattern not in self.alpha_memories:
+            alpha = AlphaMemory(pattern)
+            self.alpha_memories[pattern] = alpha
+            key = (alpha.op, len(alpha.args))
+            self.alpha_by_predicate.setdefault(key, []).append(alpha)
+            matches = [alpha.match(fact) for fact in self.facts.get(key, ())]
+            alpha.matches = [values for values in matches if values is not None]
+        return self.alpha_memories[pattern]
+
+#______________________________________________________________________________
+
+def split_literal(literal):
+    
+    """
+    Returns the predicate and the arguments of a compiled literal.
+    """
+    
+    if type(literal) is tuple:
+        return literal[0], literal[1:]
+    return literal.op, literal.args
+
+def match_args(patterns, args, values):
+    
+    """
+    Matches the arguments args of a fact against the compiled patterns,
+    adding the value of each variable of the patterns to values the first
+    time it comes up. The variables must be numbered in order of
+    appearance, from len(values) on. Returns whether they match: the
+    constants and the functions of function terms are the same, and a
+    variable that comes up again has the same value.
+    """
+    
+    if len(patterns) != len(args):
+        return False
+    for pattern, arg in izip(patterns, args):
+        if type(pattern) is int:
+            if pattern == len(values):
+                values.append(arg)
+            elif values[pattern] is not arg:
+                return False
+        elif type(pattern) is tuple:
+            # a function term with variables in it
+            if arg.op != pattern[0] or not match_args(pattern[1:], arg.args, values):
+                return False
+        elif pattern is not arg:
+            return False
+    return True
+
+def literal_variables(literal):
+    
+    """
+    The variable slots of a compiled literal, each once, in order of
+    appearance.
+    """
+    
+    variables = []
+    stack = [literal]
+    while stack:
+        term = stack.pop()
+        if type(term) is int:
+            if term not in variables:
+                variables.append(term)
+        elif type(term) is tuple:
+            stack.extend(reversed(term[1:]))
+    return variables
+
+def renumber(term, renumbering):
+    
+    """
+    Renumbers the variable slots of a compiled term in order of appearance,
+    going on from the numbers already given out in renumbering.
+    """
+    
+    if type(term) is int:
+        if term not in renumbering:
+            renumbering[term] = len(renumbering)
+        return renumbering[term]
+    elif type(term) is tuple:
+        return (term[0],) + tuple([renumber(arg, renumbering) for arg in term[1:]])
+    return term
@@ -0,0 +1,325 @@
+"""
+The script that proves the body of a rule set-at-a-time when every literal
+in it is a predicate made up of ground facts alone (see FactStore): instead
+of trying the facts for each literal one binding at a time, the way
+fol_bc_and does, the facts that match the whole body are worked out in one
+go, a literal at a time, with hash joins on the term numbers of the fact
+tables. The literals are joined in whatever order keeps the relations
+small, going from each to one that shares a variable with it rather than
+building cross products.
+
+If NumPy is installed, the joins of big relations are done on NumPy arrays
+(sort-merge); otherwise, and for small relations, they are done in pure
+Python. Either way the bindings come out in the order fol_bc_and would
+have found them: each match remembers the row of the fact it took for each
+literal, and the matches are sorted on those in the end.
+
+@author: Aashish Satyajith.
+
+"""
+
+from itertools import izip
+
+from KBUtil import *
+
+try:
+    import numpy
+except ImportError:
+    # the joins are all done in pure Python then
+    numpy = None
+
+# joins with fewer rows than this on both sides are done in pure Python even
+# with NumPy around; turning them into arrays would cost more than it saves
+NUMPY_THRESHOLD = 1000
+
+#______________________________________________________________________________
+
+def join_plan(kb, rule):
+    
+    """
+    Returns the body of rule as a list of (fact table, arguments), one for
+    each literal, if it can be proved set-at-a-time: every literal is a
+    predicate that has ground facts and no rules, and each of its arguments
+    is a variable slot or a term with no variables in it. Returns None
+    otherwise.
+    Plans are kept in kb.join_plans until something new is told.
+    """
+    
+    plans = kb.join_plans
+    if rule in plans:
+        return plans[rule]
+    plan = []
+    for literal in rule.body:
+        if type(literal) is tuple:
+            predicate, args = literal[0], literal[1:]
+        elif type(literal) is Clause:
+            predicate, args = literal.op, literal.args
+        else:
+            # a literal that is just a variable
+            plan = None
+            break
+        key = (predicate, len(args))
+        table = kb.facts.tables.get(key)
+        if table is None or key in kb.clauses or \
+           any(type(arg) is tuple for arg in args):
+            plan = None
+            break
+        plan.append((table, args))
+    plans[rule] = plan
+    return plan
+
+#______________________________________________________________________________
+
+def solve_body(kb, plan, bindings, base):
+    
+    """
+    Works out every way the body of a rule (planned by join_plan(), with its
+    variables in the frame at base) matches the facts.
+    Returns (variables, rows): variables is the list of the (term, base) of
+    the unbound variables the body binds, and rows the list of tuples of the
+    terms they are bound to, one tuple for each match, in the order
+    fol_bc_and would have found them.
+    Returns None if a variable of the body is bound to a term that still has
+    variables in it, which only fol_bc_and can deal with.
+    """
+    
+    ids = kb.facts.ids
+    # the term number each slot is bound to, or the number of the unbound
+    # variable it stands for (different slots may stand for one variable)
+    constants = {}
+    free = {}
+    variables = []
+    for _, args in plan:
+        for arg in args:
+            if type(arg) is not int or arg in constants or arg in free:
+                continue
+            term, term_base = bindings.deref(arg, base)
+            if type(term) is int:
+                number = term_base + term
+                if number not in free.values():
+                    variables.append((term, term_base))
+                free[arg] = number
+            elif type(term) is Clause:
+                value = ids.get(term)
+                if value is None:
+                    # no fact has it, so the body cannot be proved
+                    return [], []
+                constants[arg] = value
+            else:
+                return None
+    
+    # the term number of each constant of the body, and the facts of each
+    # literal that agree with them
+    literals = []
+    for table, args in plan:
+        bound = [(i, ids.get(arg, -1) if type(arg) is not int else constants[arg])
+                 for i, arg in enumerate(args)
+                 if type(arg) is not int or arg in constants]
+        candidates = table.lookup(bound)
+        if not len(candidates):
+            return variables, []
+        literals.append((table, args, bound, candidates))
+    
+    # the relation of the matches so far: the number of each variable in it
+    # and a column of term numbers for each, the column of the rows of the
+    # facts each literal joined so far matched, and how many rows it has
+    names = []
+    columns = []
+    fact_rows = {}
+    size = 1
+    remaining = range(len(literals))
+    while remaining:
+        number = next_literal(literals, remaining, free, names)
+        remaining.remove(number)
+        table, args, bound, candidates = literals[number]
+        keys = []
+        new = []
+        repeats = []
+        for i, arg in enumerate(args):
+            if type(arg) is not int or arg in constants:
+                continue
+            elif free[arg] in names:
+                keys.append((i, names.index(free[arg])))
+            elif free[arg] in [name for _, name in new]:
+                # the same new variable twice in the one literal
+                repeats.append((i, [j for j, name in new if name == free[arg]][0]))
+            else:
+                new.append((i, free[arg]))
+        if repeats:
+            candidates = agreeing(table, candidates, repeats)
+        if numpy is not None and keys and \
+           min(size, len(candidates)) >= NUMPY_THRESHOLD:
+            left, right = match_numpy(table, candidates, columns, keys)
+        else:
+            left, right = match_python(table, bound, candidates, columns, size,
+                                       keys, repeats)
+        columns = [gather(column, left) for column in columns] + \
+                  [gather(table.columns[i], right) for i, _ in new]
+        for joined, rows in fact_rows.items():
+            fact_rows[joined] = gather(rows, left)
+        fact_rows[number] = right
+        names.extend(name for _, name in new)
+        size = len(left)
+        if not size:
+            return variables, []
+    
+    # fol_bc_and goes through the facts of each literal in told order, one
+    # literal after the other, so its matches are in the order of the rows
+    # of the facts of the first literal, then of the second, and so on
+    order = sort_rows([fact_rows[number] for number in xrange(len(literals))], size)
+    terms = kb.facts.terms
+    chosen = [columns[names.index(term_base + term)] for term, term_base in variables]
+    return variables, [tuple([terms[column[i]] for column in chosen]) for i in order]
+
+def next_literal(literals, remaining, free, names):
+    
+    """
+    Picks which of the remaining literals to join next: one with a variable
+    already in the relation if there is one, so as not to build a cross
+    product, and of those the one with the fewest facts to join.
+    """
+    
+    def cost(number):
+        table, args, bound, candidates = literals[number]
+        connected = not names or any(type(arg) is int and free.get(arg) in names
+                                     for arg in args)
+        return (not connected, len(candidates))
+    
+    return min(remaining, key = cost)
+
+def sort_rows(keys, size):
+    
+    """
+    Returns the positions 0 to size - 1 ordered by the columns in keys, the
+    first column first.
+    """
+    
+    if numpy is not None and size >= NUMPY_THRESHOLD:
+        # lexsort takes the last key as the first
+        return numpy.lexsort([as_numbers(column) for column in reversed(keys)])
+    return sorted(xrange(size), key = lambda i: tuple([column[i] for column in keys]))
+
+def agreeing(table, rows, repeats):
+    
+    """
+    Keeps the rows of table that have the same term at each pair of
+    argument positions in repeats.
+    """
+    
+    return [row for row in rows
+            if all(table.columns[i][row] == table.columns[j][row] for i, j in repeats)]
+
+def gather(column, positions):
+    
+    """
+    Picks the values at positions out of column.
+    """
+    
+    if numpy is not None and isinstance(positions, numpy.ndarray):
+        if not isinstance(column, numpy.ndarray):
+            column = as_numbers(column)
+        return column[positions]
+    return [column[i] for i in positions]
+
+#______________________________________________________________________________
+
+def match_python(table, bound, candidates, columns, size, keys, repeats):
+    
+    """
+    Joins the rows of the relation so far (columns, size rows) with the
+    candidate rows of table, on the argument positions in keys (each with
+    the column of the relation it has to agree with). The candidates are
+    the rows that agree with bound and repeats (see solve_body()).
+    Returns the list of the rows of the relation and the list of the rows
+    of the table that agree, pair by pair, ordered by the row of the
+    relation first and the row of the table second.
+    """
+    
+    left = []
+    right = []
+    if not keys:
+        # nothing in common: every row goes with every candidate
+        for i in xrange(size):
+            left.extend([i] * len(candidates))
+            right.extend(candidates)
+        return left, right
+    if size < len(candidates):
+        # few rows: look each one up in the indexes of the table
+        for i in xrange(size):
+            rows = table.lookup(sorted(bound + [(posn, columns[column][i])
+                                                for posn, column in keys]))
+            if repeats:
+                rows = agreeing(table, rows, repeats)
+            left.extend([i] * len(rows))
+            right.extend(rows)
+        return left, right
+    # hash the candidates on the keys, then run the relation by them
+    hashed = {}
+    key_columns = [table.columns[posn] for posn, _ in keys]
+    for row in candidates:
+        key = tuple([column[row] for column in key_columns])
+        bucket = hashed.get(key)
+        if bucket is None:
+            hashed[key] = [row]
+        else:
+            bucket.append(row)
+    relation_keys = izip(*[columns[column] for _, column in keys])
+    for i, key in enumerate(relation_keys):
+        rows = hashed.get(tuple(key))
+        if rows is not None:
+            left.extend([i] * len(rows))
+            right.extend(rows)
+    return left, right
+
+def as_numbers(column):
+    
+    """
+    Turns a column of term numbers (an array, list or xrange) into a NumPy
+    array.
+    """
+    
+    if isinstance(column, xrange):
+        return numpy.arange(len(column))
+    return numpy.asarray(column, dtype = numpy.int64)
+
+def match_numpy(table, candidates, columns, keys):
+    
+    """
+    match_python, with NumPy: the candidates are sorted on their keys
+    (stably, so each key keeps its rows in told order) and each row of the
+    relation finds its range of them by binary search.
+    """
+    
+    candidates = as_numbers(candidates)
+    left_keys = [as_numbers(columns[column]) for _, column in keys]
+    right_keys = [as_numbers(table.columns[posn])[candidates] for posn, _ in keys]
+    left_key, right_key = combine_keys(left_keys, right_keys)
+    order = numpy.argsort(right_key, kind = 'mergesort')
+    sorted_key = right_key[order]
+    starts = numpy.searchsorted(sorted_key, left_key, 'left')
+    counts = numpy.searchsorted(sorted_key, left_key, 'right') - starts
+    left = numpy.repeat(numpy.arange(len(left_key)), counts)
+    # the position of each match within the sorted candidates: the start of
+    # its range plus how far into the range it is
+    offsets = numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+    right = candidates[order[numpy.repeat(starts, counts) + offsets]]
+    return left, right
+
+def combine_keys(left_keys, right_keys):
+    
+    """
+    Turns keys of several columns into keys of one, numbered the same way on
+    both sides.
+    """
+    
+    left_key, right_key = left_keys[0], right_keys[0]
+    for left, right in izip(left_keys[1:], right_keys[1:]):
+        # renumber the pairs so far from 0 up, so that they fit in 64 bits
+        # with the next column
+        _, inverse = numpy.unique(numpy.concatenate([left_key, right_key]),
+                                  return_inverse = True)
+        width = max(left.max(), right.max()) + 1
+        inverse = inverse.astype(numpy.int64) * width
+        left_key = inverse[:len(left_key)] + left
+        right_key = inverse[len(left_key):] + right
+    return left_key, right_key
@@ -0,0 +1,318 @@
+"""
+The script that saves a knowledge base to a binary snapshot file and loads
+it back, so that a large knowledge base does not have to be parsed, checked
+and indexed all over again every time a program starts.
+
+A snapshot holds:
+    - a symbol table: every predicate, constant, variable and operator name,
+      once each
+    - a term table: every distinct term of the rules, once each, in flat
+      form (the symbol, the arity and the positions of the arguments in the
+      table), arguments before the terms they are in. Both the clauses as
+      told and their compiled forms (see KBUtil.compile_term) are in it.
+    - the rules, in the order they were told: the told position, the told
+      clause, the compiled head and body, the number of variables and the
+      barriers (see KBUtil.Rule) of each
+    - the predicate index of the knowledge base: the rules for each
+      (predicate, arity), split up by the first argument as well
+    - the ground facts, column by column as the FactStore keeps them: for
+      each (predicate, arity) the told positions of its facts and then the
+      terms of each argument position
+All the numbers are 32 bit little-endian integers. The file is memory
+mapped when loaded, and each section is read straight out of the mapping.
+
+@author: Aashish Satyajith.
+
+"""
+
+import mmap
+import struct
+import sys
+from array import array
+from itertools import izip
+
+import KBUtil
+import FactStore
+
+#______________________________________________________________________________
+
+MAGIC = 'FOLKBSNP'
+# bump this whenever the layout changes; older snapshots then refuse to load
+# instead of loading wrong
+VERSION = 3
+
+# magic, version, and the (offset, length) in bytes of the symbol, term,
+# rule, index and fact sections
+HEADER = struct.Struct('<8sI10I')
+
+#______________________________________________________________________________
+
+class SnapshotWriter(object):
+    
+    """
+    Builds the tables of a snapshot, giving each symbol and each distinct
+    term a number the first time it comes up.
+    """
+    
+    def __init__(self):
+        self.symbols = {}
+        self.symbol_list = []
+        self.terms = {}
+        self.term_codes = array('i')
+    
+    def symbol(self, name):
+        number = self.symbols.get(name)
+        if number is None:
+            number = len(self.symbol_list)
+            self.symbols[name] = number
+            self.symbol_list.append(name)
+        return number
+    
+    def term(self, term):
+        
+        """
+        Returns the number of a term (a Clause, or a compiled term) in the
+        term table, adding it if it is not there yet. A variable slot i of a
+        compiled term is numbered -1 - i instead.
+        Clauses go in as (symbol, arity, arguments...), compiled terms with
+        variables in them as (symbol, -1 - arity, arguments...).
+        """
+        
+        if type(term) is int:
+            return -1 - term
+        number = self.terms.get(term)
+        if number is None:
+            if type(term) is tuple:
+                op, args = term[0], term[1:]
+                arity = -1 - len(args)
+            else:
+                op, args = term.op, term.args
+                arity = len(args)
+            codes = [self.symbol(op), arity] + [self.term(arg) for arg in args]
+            # the arguments have their numbers now, so this one comes after
+            number = len(self.terms)
+            self.terms[term] = number
+            self.term_codes.extend(codes)
+        return number
+
+#______________________________________________________________________________
+
+def save_snapshot(kb, filename):
+    
+    """
+    Writes the knowledge base kb to filename as a snapshot.
+    """
+    
+    writer = SnapshotWriter()
+    rule_codes = array('i')
+    for rule in kb.rules:
+        rule_codes.extend([kb.clause_posn[rule.clause], writer.term(rule.clause),
+                           writer.term(rule.head), rule.nvars, len(rule.body),
+                           len(rule.barriers)])
+        rule_codes.extend([writer.term(literal) for literal in rule.body])
+        rule_codes.extend(rule.barriers)
+    
+    # the index refers to the rules by their place in kb.rules
+    number = dict((rule.clause, i) for i, rule in enumerate(kb.rules))
+    index_codes = array('i', [len(kb.clauses)])
+    for (predicate, arity), rules in kb.clauses.iteritems():
+        index_codes.extend([writer.symbol(predicate), arity, len(rules)])
+        index_codes.extend([number[rule.clause] for rule in rules])
+        buckets = kb.first_arg_index[(predicate, arity)]
+        index_codes.append(len(buckets))
+        for first_arg, bucket in buckets.iteritems():
+            # rules whose head does not start with a constant go under -1
+            key = -1 if first_arg is None else writer.term(first_arg)
+            index_codes.extend([key, len(bucket)])
+            index_codes.extend([number[rule.clause] for rule in bucket])
+    
+    store = kb.facts
+    term_numbers = [writer.term(term) for term in store.terms]
+    fact_codes = array('i', [len(store.tables)])
+    for table in store.tables.itervalues():
+        fact_codes.extend([writer.symbol(table.predicate), table.arity, len(table)])
+        fact_codes.extend(table.positions)
+        for column in table.columns:
+            fact_codes.extend([term_numbers[value] for value in column])
+    
+    sections = ['\0'.join(writer.symbol_list)]
+    for codes in (writer.term_codes, rule_codes, index_codes, fact_codes):
+        if sys.byteorder != 'little':
+            codes.byteswap()
+        sections.append(codes.tostring())
+    layout = []
+    offset = HEADER.size
+    for section in sections:
+        layout.extend([offset, len(section)])
+        offset += len(section)
+    with open(filename, 'wb') as snapshot:
+        snapshot.write(HEADER.pack(MAGIC, VERSION, *layout))
+        for section in sections:
+            snapshot.write(section)
+
+def is_snapshot(filename):
+    
+    """
+    Whether the file is a snapshot (of any version).
+    """
+    
+    with open(filename, 'rb') as snapshot:
+        return snapshot.read(len(MAGIC)) == MAGIC
+
+#______________________________________________________________________________
+
+def read_ints(mapped, offset, length):
+    
+    """
+    Reads an array of integers out of the mapped file.
+    """
+    
+    codes = array('i')
+    # buffer() is a view of the mapping, so the bytes are only copied once,
+    # into the array
+    codes.fromstring(buffer(mapped, offset, length))
+    if sys.byteorder != 'little':
+        codes.byteswap()
+    return codes
+
+def read_terms(symbols, codes):
+    
+    """
+    Rebuilds the term table: every term is built once, from the terms that
+    are its arguments, which come before it.
+    """
+    
+    Clause = KBUtil.Clause
+    terms = []
+    i = 0
+    end = len(codes)
+    while i < end:
+        op = symbols[codes[i]]
+        arity = codes[i + 1]
+        i += 2
+        if arity >= 0:
+            terms.append(Clause(op, [terms[number] for number in codes[i:i + arity]]))
+        else:
+            arity = -1 - arity
+            terms.append((op,) + tuple([terms[number] if number >= 0 else -1 - number
+                                        for number in codes[i:i + arity]]))
+        i += arity
+    return terms
+
+def load_snapshot(kb, filename):
+    
+    """
+    Adds the rules and facts in the snapshot file to the knowledge base kb.
+    If kb is empty it takes the rules, the index and the fact tables from
+    the snapshot as they are; otherwise they are indexed one by one as if
+    they had been told.
+    Raises ValueError if the file is not a snapshot this version can read.
+    """
+    
+    with open(filename, 'rb') as snapshot:
+        mapped = mmap.mmap(snapshot.fileno(), 0, access = mmap.ACCESS_READ)
+    try:
+        if mapped.size() < HEADER.size:
+            raise ValueError(filename + ' is not a knowledge base snapshot')
+        header = HEADER.unpack_from(mapped, 0)
+        if header[0] != MAGIC:
+            raise ValueError(filename + ' is not a knowledge base snapshot')
+        if header[1] != VERSION:
+            raise ValueError('%s is a version %d snapshot; only version %d can be loaded'
+                             % (filename, header[1], VERSION))
+        layout = header[2:]
+        symbols = mapped[layout[0]:layout[0] + layout[1]].split('\0')
+        terms = read_terms(symbols, read_ints(mapped, layout[2], layout[3]))
+        rule_codes = read_ints(mapped, layout[4], layout[5])
+        index_codes = read_ints(mapped, layout[6], layout[7])
+        fact_codes = read_ints(mapped, layout[8], layout[9])
+    finally:
+        mapped.close()
+    
+    Rule = KBUtil.Rule
+    rules = []
+    positions = []
+    i = 0
+    end = len(rule_codes)
+    while i < end:
+        posn, clause, head, nvars, length, nbarriers = rule_codes[i:i + 6]
+        i += 6
+        body = tuple([terms[number] if number >= 0 else -1 - number
+                      for number in rule_codes[i:i + length]])
+        i += length
+        barriers = tuple(rule_codes[i:i + nbarriers])
+        i += nbarriers
+        rules.append(Rule(terms[clause], terms[head] if head >= 0 else -1 - head,
+                          body, nvars, barriers))
+        positions.append(posn)
+    facts = read_facts(symbols, terms, fact_codes)
+    
+    if kb.told:
+        told = [(posn, rule.clause) for posn, rule in izip(positions, rules)]
+        for predicate, columns, fact_positions in facts:
+            told.extend((posn, KBUtil.Clause(predicate, [terms[number] for number in args]))
+                        for posn, args in izip(fact_positions, izip(*columns)))
+        told.sort()
+        for _, clause in told:
+            kb.predicate_index(clause)
+        return
+    
+    kb.rules = rules
+    kb.clause_posn = dict((rule.clause, posn) for posn, rule in izip(positions, rules))
+    kb.told = len(rules)
+    store = kb.facts
+    for predicate, columns, fact_positions in facts:
+        table = store.tables[(predicate, len(columns))] = \
+            FactStore.FactTable(predicate, len(columns))
+        table.positions = fact_positions
+        ids = dict((number, store.intern(terms[number]))
+                   for number in set().union(*columns))
+        table.columns = [array('i', [ids[number] for number in column]) for column in columns]
+        table.rows = dict(izip(izip(*table.columns), xrange(len(fact_positions))))
+        kb.told += len(fact_positions)
+    i = 1
+    for _ in xrange(index_codes[0]):
+        predicate, arity, length = index_codes[i:i + 3]
+        i += 3
+        key = (symbols[predicate], arity)
+        kb.clauses[key] = [rules[number] for number in index_codes[i:i + length]]
+        i += length
+        buckets = kb.first_arg_index[key] = {}
+        nbuckets = index_codes[i]
+        i += 1
+        for _ in xrange(nbuckets):
+            first_arg, length = index_codes[i:i + 2]
+            i += 2
+            buckets[terms[first_arg] if first_arg >= 0 else None] = \
+                [rules[number] for number in index_codes[i:i + length]]
+            i += length
+    # the facts go in first, so that fewer rules have to wait on them
+    for key in store.tables:
+        kb.dependencies.add_fact(key)
+    for rule in rules:
+        kb.dependencies.add_rule(rule)
+    if kb.listeners:
+        for rule in kb.all_rules():
+            for listener in kb.listeners:
+                listener(rule)
+
+def read_facts(symbols, terms, codes):
+    
+    """
+    Reads the fact section back as a list of (predicate, the columns of
+    term numbers, the array of told positions), one for each table.
+    """
+    
+    facts = []
+    i = 1
+    for _ in xrange(codes[0]):
+        predicate, arity, length = codes[i:i + 3]
+        i += 3
+        positions = codes[i:i + length]
+        i += length
+        columns = []
+        for _ in xrange(arity):
+            columns.append(codes[i:i + length])
+            i += length
+        facts.append((symbols[predicate], columns, positions))
+    return facts
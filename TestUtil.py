@@ -0,0 +1,41 @@
+"""
+The script that holds what the tests (the test_*.py scripts) share: building
+a knowledge base out of statements, and asking it a query with the answers
+written out so that they can be compared.
+
+@author: Aashish Satyajith.
+
+"""
+
+from FolBC import *
+from Parser import parse_clause
+
+#______________________________________________________________________________
+
+def make_kb(statements):
+    return KnowledgeBase([parse_clause(statement) for statement in statements])
+
+def ask(kb, query, first = None, **options):
+    
+    """
+    Asks query (a statement) of kb with the given options, up to the first
+    few answers if first is given. Returns the answers, each as a sorted
+    tuple of the variables and their values written out, in the order they
+    were found, and the Search that found them.
+    """
+    
+    search = kb.ask(parse_clause(query), **options)
+    found = []
+    for answer in search:
+        found.append(tuple(sorted((str(vbl), str(value)) for vbl, value in answer.iteritems())))
+        if first is not None and len(found) == first:
+            break
+    return found, search
+
+def answers(kb, query, **options):
+    
+    """
+    The answers ask() finds for query, all of them.
+    """
+    
+    return ask(kb, query, **options)[0]
@@ -1,24 +1,180 @@
-
 """
 Python script that implements the unification algorithm.
 
 @author: Aashish Satyajith.
 """
 
-from KBUtil import *
-
 #______________________________________________________________________________
 
-def is_variable(item):
+class Bindings(object):
     
     """
-    Checks if the item is a variable.
+    The variable bindings made during one proof, kept in a single mutable
+    store with an undo trail (the way Prolog machines do it), instead of a new
+    copy of a substitution dict for every binding.
+    
+    Terms here are the compiled terms of KBUtil.compile_term: an int is a
+    variable slot, a Clause is a term with no variables in it, and a tuple
+    (op, arg1, arg2, ...) is anything else. A compiled term only means
+    something together with the base of the frame its slots live in; slot i
+    of a term in the frame starting at base is variable number base + i.
+    So standardizing a rule apart is just new_frame(rule.nvars) -- no
+    copying at all (this is structure sharing).
+    
+    To backtrack, take a mark() before trying something and undo() to it
+    afterwards; every binding made since the mark is forgotten.
     """
     
-    # an item is a variable if it is of type Clause, its operator is a string
-    # and starts with a small case letter, and has no args
+    __slots__ = ('values', 'trail', 'top', 'names')
+    
+    def __init__(self):
+        # values[n] is the (term, base) variable n is bound to
+        self.values = {}
+        # the variables bound so far, in the order they were bound
+        self.trail = []
+        # the next free variable number
+        self.top = 0
+        # what to call variables that are still unbound when a term is
+        # resolved (see resolve()); the rest get called v_<number>
+        self.names = {}
+    
+    def new_frame(self, size):
+    
+        """
+        Sets aside size new variables and returns the number of the first one.
+        """
+        
+        base = self.top
+        self.top += size
+        return base
+    
+    def mark(self):
+        return len(self.trail)
+    
+    def undo(self, mark):
+    
+        """
+        Forgets every binding made since mark was taken.
+        """
+        
+        values = self.values
+        trail = self.trail
+        while len(trail) > mark:
+            del values[trail.pop()]
+    
+    def deref(self, term, base):
+    
+        """
+        Follows the chain of bindings from term until it ends in either an
+        unbound variable or something that is not a variable at all, and
+        returns that as (term, base).
+        """
+        
+        values = self.values
+        while type(term) is int:
+            binding = values.get(base + term)
+            if binding is None:
+                break
+            term, base = binding
+        return term, base
+    
+    def unify(self, x, x_base, y, y_base):
+    
+        """
+        Unifies the term x (in the frame at x_base) with the term y (in the
+        frame at y_base), adding the bindings needed to the store.
+        Returns True if that worked. If it did not, the store is left exactly
+        as it was and False is returned.
+        """
+        
+        # AIMA 3rd edition Fig. 9.1, Pg. 328, but walking the arguments by
+        # index with an explicit stack instead of recursing on slices
+        
+        mark = len(self.trail)
+        stack = [(x, x_base, y, y_base)]
+        while stack:
+            x, x_base, y, y_base = stack.pop()
+            x, x_base = self.deref(x, x_base)
+            y, y_base = self.deref(y, y_base)
+            # the following two cases are the only cases that can cause a binding
+            if type(x) is int:
+                if type(y) is not int or x_base + x != y_base + y:
+                    # occur check is eliminated
+                    self.values[x_base + x] = (y, y_base)
+                    self.trail.append(x_base + x)
+                continue
+            elif type(y) is int:
+                self.values[y_base + y] = (x, x_base)
+                self.trail.append(y_base + y)
+                continue
+            elif x is y and (x_base == y_base or type(x) is not tuple):
+                # clauses are interned, so two of them are only ever equal
+                # if they are the same object
+                continue
+            if type(x) is tuple:
+                x_op, x_args, x_first = x[0], x, 1
+            else:
+                x_op, x_args, x_first = x.op, x.args, 0
+            if type(y) is tuple:
+                y_op, y_args, y_first = y[0], y, 1
+            else:
+                y_op, y_args, y_first = y.op, y.args, 0
+            arity = len(x_args) - x_first
+            if x_op != y_op or arity != len(y_args) - y_first or \
+               (x_first == 0 and y_first == 0):
+                # different operators or arities, or two different clauses
+                # (which have no variables in them to bind)
+                self.undo(mark)
+                return False
+            for i in xrange(arity):
+                stack.append((x_args[x_first + i], x_base,
+                              y_args[y_first + i], y_base))
+        return True
+    
+    def resolve(self, term, base):
     
-    return isinstance(item, Clause) and item.op.islower() and item.args == []
+        """
+        Builds the clause that term (in the frame at base) stands for with the
+        bindings made so far. Variables that are still unbound come out as
+        named in self.names, or as v_<number> otherwise.
+        """
+        
+        term, base = self.deref(term, base)
+        if type(term) is int:
+            number = base + term
+            if number in self.names:
+                return self.names[number]
+            return Clause('v_' + str(number))
+        elif type(term) is tuple:
+            return Clause(term[0], [self.resolve(term[i], base)
+                                    for i in xrange(1, len(term))])
+        return term
+
+class CountingBindings(Bindings):
+    
+    """
+    Bindings that count their unifications (and the ones that failed) and
+    their new frames in counts, a dict such as Profiler.Profile.counts.
+    Only profiled searches use these, so that the plain Bindings pay nothing
+    for the counting.
+    """
+    
+    __slots__ = ('counts',)
+    
+    def __init__(self, counts):
+        Bindings.__init__(self)
+        self.counts = counts
+    
+    def new_frame(self, size):
+        self.counts['frames'] += 1
+        return Bindings.new_frame(self, size)
+    
+    def unify(self, x, x_base, y, y_base):
+        self.counts['unifications'] += 1
+        if Bindings.unify(self, x, x_base, y, y_base):
+            return True
+        self.counts['unify_failures'] += 1
+        return False
 
 #______________________________________________________________________________
 
@@ -28,50 +184,46 @@ def unify(x, y, subst = {}):
     The function that tries to unify two statements x and y. If such a unification
     exists then the function returns the substitutions that make the unification
     successful.
-    x and y can be clauses, lists (because we pass the arguments of a clause
-    to the function, or strings (we pass the operators too)
-    subst[x] (if x is in subst) stores the clause after 
+    x and y are clauses (with variables in them as clauses too), and subst
+    is the dict of substitutions to start from; it is not changed. Failure is
+    denoted by None.
+    This works on plain clauses and dicts, for use outside of the prover; the
+    prover itself uses the Bindings store above.
     """
     
-    # AIMA 3rd edition Fig. 9.1, Pg. 328
-    
     if subst is None:
-        # failure is denoted by None (default is {})
-        return None
-    elif x == y:
-        # happens if both x and y are operators like '&'
-        # or same-name variables (we're trying to return the most general unifier)
-        return subst
-    # the following two cases are the only cases that can cause a binding
-    elif is_variable(x):
-        return unify_vars(x, y, subst)
-    elif is_variable(y):
-        return unify_vars(y, x, subst)
-    elif isinstance(x, Clause) and isinstance(y, Clause):
-        # if we're to merge two clauses we need to ensure that the operands are the same
-        # if they are then unify their arguments
-        return unify(x.args, y.args, unify(x.op, y.op, subst))
-    elif isinstance(x, list) and isinstance(y, list) and len(x) == len(y):
-        # this is the case when we're unifying the arguments of a clause
-        # see preceding line
-        return unify(x[1:], y[1:], unify(x[0], y[0], subst))
-    else:
-        # does not match any case, so no substitution
         return None
+    # copy once up front, then bind in place
+    subst = subst.copy()
+    stack = [(x, y)]
+    while stack:
+        x, y = stack.pop()
+        while is_variable(x) and x in subst:
+            x = subst[x]
+        while is_variable(y) and y in subst:
+            y = subst[y]
+        if x is y:
+            # clauses are interned so this is just an identity check for them
+            continue
+        # the following two cases are the only cases that can cause a binding
+        elif is_variable(x):
+            # occur check is eliminated
+            subst[x] = y
+        elif is_variable(y):
+            subst[y] = x
+        elif x.op == y.op and len(x.args) == len(y.args):
+            # if we're to merge two clauses we need to ensure that the operands are the same
+            # if they are then unify their arguments
+            for i in xrange(len(x.args)):
+                stack.append((x.args[i], y.args[i]))
+        else:
+            # does not match any case, so no substitution
+            return None
+    return subst
 
 #______________________________________________________________________________
 
-def unify_vars(var, x, subst):
-    
-    """
-    Helper function that supports the above unify function. Only gets called
-    when unify is dealing with variables.
-    """
-    
-    if var in subst:
-        # if binding is already in the dict simply return it
-        return unify(subst[var], x, subst)
-    # occur check is eliminated
-    subst_copy = subst.copy()
-    subst_copy[var] = x
-    return subst_copy
+# nothing above needs KBUtil until it is called, and KBUtil imports FolBC,
+# which needs what is above; so KBUtil comes last (see FactStore.py), and
+# this module can be imported first too
+from KBUtil import *
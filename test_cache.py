@@ -0,0 +1,100 @@
+"""
+The script that tests the answer cache (AnswerCache.py) against the plain
+backward chainer: a knowledge base that caches its answers must give the
+same answers, in the same order, as one that does not, whatever was asked
+and told before.
+
+Run the tests with python -m unittest discover.
+
+@author: Aashish Satyajith.
+
+"""
+
+import unittest
+
+from TestUtil import *
+
+#______________________________________________________________________________
+
+STATEMENTS = ['Rabbit(Pete)', 'Mother(MrsRabbit, Pete)', 'Farmer(Mac)',
+              'Mother(MrsMac, Mac)', 'Knows(Mac, Pete)',
+              'Mother(m, r) & Rabbit(r) ==> Rabbit(m)',
+              'Rabbit(r) & Farmer(f) ==> Hates(f, r)',
+              'Farmer(f) ==> Human(f)',
+              'Mother(m, h) & Human(h) ==> Human(m)',
+              'Knows(a, b) ==> Pal(a, b)',
+              'Likes(x, x)']
+
+class CacheTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.cached = make_kb(STATEMENTS)
+        self.cache = self.cached.cache_answers()
+        self.plain = make_kb(STATEMENTS)
+    
+    def same(self, query, first = None, **options):
+        
+        """
+        Asks query of both knowledge bases and checks that the answers are
+        the same. Returns the Search of the one with the cache.
+        """
+        
+        found, search = ask(self.cached, query, first, **options)
+        self.assertEqual(found, ask(self.plain, query, first, **options)[0])
+        return search
+    
+    def tell(self, statement):
+        for kb in (self.cached, self.plain):
+            kb.tell(parse_clause(statement))
+    
+    def test_hit_with_renamed_variables(self):
+        self.same('Hates(x, y)')
+        search = self.same('Hates(f, r)')
+        self.assertEqual(search.stats['cached'], 2)
+        self.assertEqual(search.stats['steps'], 0)
+        # answers with variables in them
+        self.same('Likes(a, b)')
+        self.same('Likes(c, d)')
+    
+    def test_stopped_search_is_continued(self):
+        self.same('Human(x)', first = 1)
+        search = self.same('Human(y)')
+        self.assertEqual(search.stats['cached'], 1)
+        self.assertEqual(self.same('Human(z)').stats['cached'], 2)
+    
+    def test_options_are_part_of_the_key(self):
+        self.same('Rabbit(x)')
+        self.assertEqual(self.same('Rabbit(x)', tabled = True).stats['cached'], 0)
+        self.assertEqual(self.same('Rabbit(x)', tabled = 'auto').stats['cached'], 0)
+        self.assertEqual(self.same('Rabbit(x)', tabled = True).stats['cached'], 2)
+    
+    def test_tell_invalidates_dependents(self):
+        for query in ('Hates(x, y)', 'Rabbit(x)', 'Pal(x, y)', 'Human(x)'):
+            self.same(query)
+        # Rabbit depends on Mother, and Hates on Rabbit; Human depends on
+        # Mother too, but Pal does not
+        self.tell('Mother(NewMom, MrsRabbit)')
+        self.assertEqual(self.same('Rabbit(x)').stats['cached'], 0)
+        self.assertEqual(self.same('Hates(x, y)').stats['cached'], 0)
+        self.assertEqual(self.same('Human(x)').stats['cached'], 0)
+        self.assertEqual(self.same('Pal(x, y)').stats['cached'], 1)
+        self.tell('Knows(Pete, Mac)')
+        self.assertEqual(self.same('Pal(x, y)').stats['cached'], 0)
+        self.assertEqual(self.same('Pal(x, y)').stats['cached'], 2)
+    
+    def test_tell_new_rule(self):
+        self.same('Human(x)')
+        self.tell('Rabbit(r) ==> Human(r)')
+        self.assertEqual(self.same('Human(x)').stats['cached'], 0)
+        self.tell('Human(x) & Likes(x, x) ==> Vain(x)')
+        self.same('Vain(x)')
+        self.tell('Farmer(NewFarmer)')
+        self.assertEqual(self.same('Vain(x)').stats['cached'], 0)
+    
+    def test_variable_query_is_invalidated_by_anything(self):
+        self.same('x')
+        self.tell('Farmer(Other)')
+        self.assertEqual(self.same('x').stats['cached'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
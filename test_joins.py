@@ -0,0 +1,93 @@
+"""
+The script that tests the set-at-a-time joins (SetJoin.py) against the
+plain backward chainer: the same answers, in the same order.
+
+Run the tests with python -m unittest discover.
+
+@author: Aashish Satyajith.
+
+"""
+
+import random
+import unittest
+
+from TestUtil import *
+import SetJoin
+
+#______________________________________________________________________________
+
+def random_facts(seed):
+    
+    """
+    Edge, Color and Owns facts over a few names, picked at random (but the
+    same every time for the seed), with repeats and self loops among them.
+    """
+    
+    rng = random.Random(seed)
+    names = ['N%d' % i for i in xrange(8)]
+    facts = set()
+    for _ in xrange(40):
+        facts.add('Edge(%s, %s)' % (rng.choice(names), rng.choice(names)))
+    for name in names:
+        facts.add('Color(%s, %s)' % (name, rng.choice(['Red', 'Blue'])))
+    for _ in xrange(10):
+        facts.add('Owns(%s, %s, %s)' % (rng.choice(names), rng.choice(names), rng.choice(names)))
+    return sorted(facts)
+
+RULES = ['Edge(x, y) & Edge(y, z) ==> Path2(x, z)',
+         'Edge(x, x) ==> Loop(x)',
+         'Edge(x, y) & Edge(y, x) & Color(x, c) & Color(y, c) ==> Twin(x, y)',
+         'Color(x, Red) & Edge(x, y) & Color(y, Blue) ==> RedBlue(x, y)',
+         'Owns(x, y, x) & Edge(y, z) ==> Back(x, z)',
+         'Color(x, Red) & Color(y, Blue) ==> Pair(x, y)',
+         'Edge(x, y) & Owns(y, z, z) & Edge(z, x) ==> Triangle(x, y, z)']
+
+QUERIES = ['Path2(x, z)', 'Path2(N1, z)', 'Path2(x, N2)', 'Loop(x)', 'Twin(x, y)',
+           'Twin(x, x)', 'RedBlue(x, y)', 'Back(x, z)', 'Pair(x, y)', 'Pair(N0, y)',
+           'Triangle(x, y, z)', 'Triangle(x, x, x)']
+
+#______________________________________________________________________________
+
+class JoinTest(unittest.TestCase):
+    
+    def check(self, kb):
+        for rule in kb.rules:
+            self.assertTrue(SetJoin.join_plan(kb, rule) is not None)
+        for query in QUERIES:
+            # the same answers in the same order, and the same proofs
+            self.assertEqual(answers(kb, query, joins = True), answers(kb, query))
+            self.assertEqual(answers(kb, query, joins = True, tabled = True),
+                             answers(kb, query, tabled = True))
+            proofs = [str(answer.proof.premises) for answer in
+                      kb.ask(parse_clause(query), joins = True, record_proof = True)]
+            self.assertEqual(proofs, [str(answer.proof.premises) for answer in
+                                      kb.ask(parse_clause(query), record_proof = True)])
+    
+    def test_same_answers_in_same_order(self):
+        for seed in xrange(5):
+            self.check(make_kb(random_facts(seed) + RULES))
+    
+    def test_repeated_variable(self):
+        kb = make_kb(['Edge(A, A)', 'Edge(A, B)', 'Edge(B, A)', 'Edge(C, C)',
+                      'Owns(A, B, A)', 'Owns(A, A, B)'] + RULES)
+        self.assertEqual(answers(kb, 'Loop(x)', joins = True), [(('x', 'A'),), (('x', 'C'),)])
+        self.assertEqual(answers(kb, 'Back(x, z)', joins = True), answers(kb, 'Back(x, z)'))
+    
+    def test_no_matches(self):
+        kb = make_kb(['Edge(A, B)', 'Color(A, Blue)'] + RULES)
+        for query in ['Path2(x, z)', 'Loop(x)', 'RedBlue(x, y)', 'Pair(x, y)']:
+            self.assertEqual(answers(kb, query, joins = True), [])
+    
+    def test_numpy_joins(self):
+        if SetJoin.numpy is None:
+            self.skipTest('NumPy is not installed')
+        threshold = SetJoin.NUMPY_THRESHOLD
+        SetJoin.NUMPY_THRESHOLD = 1
+        try:
+            for seed in xrange(5):
+                self.check(make_kb(random_facts(seed) + RULES))
+        finally:
+            SetJoin.NUMPY_THRESHOLD = threshold
+
+if __name__ == '__main__':
+    unittest.main()
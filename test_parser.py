@@ -0,0 +1,92 @@
+"""
+The script that tests the single-pass parser (Parser.parse_clause) against
+the parser it stands in for, convert_to_clause(parse(...)), and checks
+what only it reads: nested function terms, the && operator, and the
+errors it raises.
+
+Run the tests with python -m unittest discover.
+
+@author: Aashish Satyajith.
+
+"""
+
+import unittest
+
+from TestUtil import *
+from Parser import parse, parse_many, ParseError
+
+#______________________________________________________________________________
+
+# statements in the operators both parsers know, ==>, |, & and ~
+STATEMENTS = ['P', 'P(x)', '~P(x)', '~~P', '((P))', 'Likes(x y)',
+              'P & Q & R', 'P | Q | R', 'P | Q & R', 'P & Q | R ==> S',
+              'A ==> B ==> C', '(P ==> Q) ==> R', '~(P & Q)', '~P | ~Q ==> ~R',
+              'P(A, B, C) & ~Q(A) ==> R(B)',
+              'Missile(x)&Owns(Nono,x)==>Sells(West,x,Nono)',
+              '(American(x) & Weapon(y) & Hostile(z) & Sells(x, y, z)) ==> Criminal(x)']
+
+def conjoin(op, lhs, rhs):
+    return Clause(op, (lhs, rhs))
+
+P, Q, R, S = Clause('P'), Clause('Q'), Clause('R'), Clause('S')
+
+#______________________________________________________________________________
+
+class ParserTest(unittest.TestCase):
+    
+    def test_same_as_old_parser(self):
+        for statement in STATEMENTS:
+            self.assertTrue(parse_clause(statement) is convert_to_clause(parse(statement)),
+                            statement)
+    
+    def test_nested_function_terms(self):
+        # the old parser flattens these
+        x, y = Clause('x'), Clause('y')
+        self.assertTrue(parse_clause('Likes(x, Mother(Father(x)))') is
+                        Clause('Likes', (x, Clause('Mother', (Clause('Father', (x,)),)))))
+        self.assertTrue(parse_clause('Knows(F(x, G(y)), y)') is
+                        Clause('Knows', (Clause('F', (x, Clause('G', (y,)))), y)))
+    
+    def test_ordered_and_precedence(self):
+        # && binds less tightly than &, and more tightly than |
+        cases = [('P & Q && R', conjoin('&&', conjoin('&', P, Q), R)),
+                 ('P && Q & R', conjoin('&&', P, conjoin('&', Q, R))),
+                 ('P | Q && R', conjoin('|', P, conjoin('&&', Q, R))),
+                 ('P && Q | R', conjoin('|', conjoin('&&', P, Q), R)),
+                 ('P && Q && R', conjoin('&&', P, conjoin('&&', Q, R))),
+                 ('P & Q && R ==> S', conjoin('==>', conjoin('&&', conjoin('&', P, Q), R), S)),
+                 ('P & (Q && R)', conjoin('&', P, conjoin('&&', Q, R)))]
+        for statement, expected in cases:
+            self.assertTrue(parse_clause(statement) is expected, statement)
+    
+    def test_errors(self):
+        cases = [('Likes(x, y', 10, 'expected a name but found the end'),
+                 ('P = Q', 2, "unexpected '='"),
+                 ('P & ', 3, 'expected a name but found the end'),
+                 ('(P & Q', 6, "expected ')' but found the end"),
+                 ('P Q', 2, "unexpected 'Q'"),
+                 ('P(x))', 4, "unexpected ')'"),
+                 ('& P', 0, "expected a name but found '&'"),
+                 ('P ==> ==> Q', 6, "expected a name but found '==>'"),
+                 ('~', 1, 'expected a name but found the end')]
+        for statement, position, message in cases:
+            with self.assertRaises(ParseError) as raised:
+                parse_clause(statement)
+            self.assertEqual((raised.exception.position, raised.exception.message),
+                             (position, message), statement)
+            self.assertTrue(raised.exception.line is None)
+            self.assertTrue(isinstance(raised.exception, ValueError))
+    
+    def test_error_lines(self):
+        lines = ['# the crime example', '', 'American(West)', '  Enemy(Nono, America) & ']
+        with self.assertRaises(ParseError) as raised:
+            parse_many(lines)
+        error = raised.exception
+        # lines count from 1, and positions from the start of the stripped line
+        self.assertEqual((error.line, error.position), (4, 22))
+        self.assertEqual(str(error), 'expected a name but found the end on line 4, '
+                                     'at position 22:\nEnemy(Nono, America) &\n' + ' ' * 22 + '^')
+        self.assertEqual(parse_many(lines[:3]), [parse_clause('American(West)')])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+"""
+The script that tests the Rete network (Rete.py) against the backward
+chainer: what the network derives as facts stream in is what can be proved
+from them, each fact derived just once.
+
+Run the tests with python -m unittest discover.
+
+@author: Aashish Satyajith.
+
+"""
+
+import unittest
+
+from TestUtil import *
+from Rete import ReteNetwork
+
+#______________________________________________________________________________
+
+class ReteTest(unittest.TestCase):
+    
+    def test_fact_derived_twice_in_one_cascade(self):
+        # R(K) follows from A(K) directly and through S(K), both before it
+        # has gone through the network
+        kb = make_kb(['A(x) ==> R(x)', 'A(x) ==> S(x)', 'S(x) ==> R(x)'])
+        seen = []
+        network = ReteNetwork(kb, seen.append)
+        kb.tell(parse_clause('A(K)'))
+        self.assertEqual(sorted(map(str, network.derived)), ['R(K)', 'S(K)'])
+        self.assertEqual(sorted(map(str, seen)), ['R(K)', 'S(K)'])
+    
+    def test_derived_facts_are_provable(self):
+        kb = make_kb(['Parent(x, y) ==> Ancestor(x, y)',
+                      'Parent(x, y) & Ancestor(y, z) ==> Ancestor(x, z)'])
+        network = ReteNetwork(kb)
+        for i in xrange(5):
+            kb.tell(parse_clause('Parent(P%d, P%d)' % (i, i + 1)))
+        derived = set(map(str, network.derived))
+        self.assertEqual(len(derived), len(network.derived))
+        proved = set(str(answer[Clause('x')]) for answer in
+                     kb.ask(parse_clause('Ancestor(P0, x)'), tabled = True))
+        self.assertEqual(set(fact for fact in derived if fact.startswith('Ancestor(P0,')),
+                         set('Ancestor(P0, %s)' % name for name in proved))
+        # every pair of the chain, and nothing else
+        self.assertEqual(len(derived), 15)
+    
+    def test_function_terms(self):
+        kb = make_kb(['Likes(x, Mother(x)) ==> Happy(x)',
+                      'Knows(F(x, G(y)), y) & Happy(y) ==> Glad(x)'])
+        network = ReteNetwork(kb)
+        for fact in ['Likes(John, Mother(John))', 'Likes(Ann, Mother(John))',
+                     'Likes(Bob, Father(Bob))', 'Knows(F(A, G(John)), John)',
+                     'Knows(F(B, G(Ann)), John)', 'Knows(F(C, H(John)), John)']:
+            kb.tell(parse_clause(fact))
+        self.assertEqual(map(str, network.derived), ['Happy(John)', 'Glad(A)'])
+        proved = [str(answer[Clause('x')]) for query in ('Happy(x)', 'Glad(x)')
+                  for answer in kb.ask(parse_clause(query))]
+        self.assertEqual(proved, ['John', 'A'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+"""
+The script that tests saving a knowledge base as a snapshot and loading it
+back (Snapshot.py): the loaded knowledge base answers every query just as
+the saved one does, and a snapshot of another version is refused.
+
+Run the tests with python -m unittest discover.
+
+@author: Aashish Satyajith.
+
+"""
+
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+from TestUtil import *
+import Snapshot
+
+#______________________________________________________________________________
+
+# rules with && barriers and function terms in them, and facts with and
+# without function terms
+STATEMENTS = ['Parent(x, y) ==> Ancestor(x, y)',
+              'Parent(x, y) && Ancestor(y, z) ==> Ancestor(x, z)',
+              'Likes(x, Mother(x)) ==> Happy(x)',
+              'Knows(F(x, G(y)), y) & Happy(y) && Ancestor(x, y) ==> Glad(x)',
+              'Happy(x) ==> Likes(Father(x), x)',
+              'Parent(A, B)', 'Parent(B, C)', 'Parent(C, D)',
+              'Likes(B, Mother(B))', 'Likes(C, Father(C))', 'Likes(D, Mother(D))',
+              'Knows(F(A, G(B)), B)', 'Knows(F(A, G(C)), C)', 'Knows(F(B, G(D)), D)',
+              'Happy(E)']
+
+QUERIES = ['Ancestor(x, y)', 'Ancestor(A, x)', 'Happy(x)', 'Glad(x)',
+           'Likes(x, y)', 'Likes(Father(x), B)', 'Knows(F(x, y), z)', 'Parent(x, x)']
+
+#______________________________________________________________________________
+
+class SnapshotTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'kb.snapshot')
+        self.kb = make_kb(STATEMENTS)
+        self.kb.save(self.filename)
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    
+    def assertSameAnswers(self, loaded, kb):
+        for query in QUERIES:
+            self.assertEqual(answers(loaded, query), answers(kb, query), query)
+            self.assertEqual(answers(loaded, query, tabled = True),
+                             answers(kb, query, tabled = True), query)
+    
+    def test_round_trip(self):
+        loaded = KnowledgeBase()
+        loaded.load(self.filename)
+        self.assertSameAnswers(loaded, self.kb)
+        self.assertEqual([(rule.clause, rule.head, rule.body, rule.nvars, rule.barriers)
+                          for rule in loaded.rules],
+                         [(rule.clause, rule.head, rule.body, rule.nvars, rule.barriers)
+                          for rule in self.kb.rules])
+        # the barriers of the && rules made it through
+        self.assertTrue(all(rule.barriers for rule in loaded.rules if '&&' in str(rule.clause)))
+        self.assertEqual(loaded.told, self.kb.told)
+    
+    def test_load_into_told_kb(self):
+        # a knowledge base that has been told something already indexes the
+        # snapshot one statement at a time instead, after what it was told
+        loaded = make_kb(['Parent(D, E)'])
+        loaded.load(self.filename)
+        self.assertSameAnswers(loaded, make_kb(['Parent(D, E)'] + STATEMENTS))
+    
+    def test_wrong_version(self):
+        with open(self.filename, 'r+b') as snapshot:
+            snapshot.seek(len(Snapshot.MAGIC))
+            snapshot.write(struct.pack('<I', Snapshot.VERSION + 1))
+        self.assertTrue(Snapshot.is_snapshot(self.filename))
+        with self.assertRaises(ValueError) as raised:
+            KnowledgeBase().load(self.filename)
+        self.assertTrue('version %d snapshot' % (Snapshot.VERSION + 1) in str(raised.exception))
+    
+    def test_not_a_snapshot(self):
+        with open(self.filename, 'wb') as snapshot:
+            snapshot.write('Parent(A, B)\n')
+        self.assertFalse(Snapshot.is_snapshot(self.filename))
+        self.assertRaises(ValueError, KnowledgeBase().load, self.filename)
+
+if __name__ == '__main__':
+    unittest.main()
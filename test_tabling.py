@@ -0,0 +1,98 @@
+"""
+The script that tests tabled resolution (FolBC.fol_bc_tabled) against the
+plain backward chainer: the same answers, on knowledge bases the plain
+chainer can prove, and the answers it would give on the ones where only
+tabling terminates.
+
+Run the tests with python -m unittest discover.
+
+@author: Aashish Satyajith.
+
+"""
+
+import unittest
+
+from TestUtil import *
+
+#______________________________________________________________________________
+
+def chain(length):
+    return ['Parent(P%d, P%d)' % (i, i + 1) for i in xrange(length)]
+
+# ancestry, with the recursive rule written both ways round
+LEFT_RECURSIVE = ['Parent(x, y) ==> Ancestor(x, y)',
+                  'Ancestor(x, z) & Parent(z, y) ==> Ancestor(x, y)']
+RIGHT_RECURSIVE = ['Parent(x, y) ==> Ancestor(x, y)',
+                   'Parent(x, z) & Ancestor(z, y) ==> Ancestor(x, y)']
+
+#______________________________________________________________________________
+
+class TablingTest(unittest.TestCase):
+    
+    def test_left_recursive_ancestor(self):
+        # the plain chainer loops on the left-recursive rule, so it is
+        # checked against the plain chainer on the right-recursive one
+        facts = chain(6) + ['Parent(P2, Q0)', 'Parent(Q0, Q1)']
+        plain = make_kb(facts + RIGHT_RECURSIVE)
+        tabled = make_kb(facts + LEFT_RECURSIVE)
+        for query in ['Ancestor(P0, x)', 'Ancestor(x, P5)', 'Ancestor(x, y)',
+                      'Ancestor(P1, Q1)', 'Ancestor(P5, P0)']:
+            expected = sorted(answers(plain, query))
+            self.assertEqual(sorted(answers(tabled, query, tabled = True)), expected)
+            self.assertEqual(sorted(answers(tabled, query, tabled = 'auto')), expected)
+    
+    def test_cycle(self):
+        # every node of a cycle reaches every other one, itself included
+        facts = ['Parent(A, B)', 'Parent(B, C)', 'Parent(C, A)']
+        for rules in (LEFT_RECURSIVE, RIGHT_RECURSIVE):
+            kb = make_kb(facts + rules)
+            found = answers(kb, 'Ancestor(x, y)', tabled = True)
+            self.assertEqual(len(found), len(set(found)))
+            self.assertEqual(len(found), 9)
+    
+    def test_mutual_recursion_completes(self):
+        # Even and Odd depend on each other, so their tables are completed
+        # together; answers looked up in tables left by an earlier query
+        # must be the same as the plain chainer finds with the rules written
+        # so that it terminates
+        facts = ['Next(N%d, N%d)' % (i, i + 1) for i in xrange(6)] + ['Zero(N0)']
+        tabled = make_kb(facts + ['Zero(x) ==> Even(x)', 'Odd(x) & Next(x, y) ==> Even(y)',
+                                  'Even(x) & Next(x, y) ==> Odd(y)'])
+        plain = make_kb(facts + ['Zero(x) ==> Even(x)', 'Next(x, y) & Odd(x) ==> Even(y)',
+                                 'Next(x, y) & Even(x) ==> Odd(y)'])
+        queries = ['Odd(N3)', 'Even(x)', 'Odd(x)', 'Even(N5)', 'Even(N3)']
+        shared = fol_bc_ask_many(tabled, [parse_clause(query) for query in queries])
+        for query, (_, found, search) in zip(queries, shared):
+            self.assertEqual(search.status, 'exhausted')
+            self.assertEqual(sorted(map(str, found)),
+                             sorted(map(str, plain.ask(parse_clause(query)))))
+    
+    def test_long_chain(self):
+        # far longer than Python's stack would take, one tabled subgoal per link
+        kb = make_kb(chain(400) + RIGHT_RECURSIVE)
+        search = kb.ask(parse_clause('Ancestor(P0, x)'), tabled = True)
+        found = set(str(answer[Clause('x')]) for answer in search)
+        self.assertEqual(search.status, 'exhausted')
+        self.assertEqual(found, set('P%d' % i for i in xrange(1, 401)))
+        kb = make_kb(chain(400) + LEFT_RECURSIVE)
+        self.assertEqual(len(answers(kb, 'Ancestor(P0, x)', tabled = 'auto')), 400)
+    
+    def test_repeated_variable(self):
+        facts = ['Likes(A, A)', 'Likes(A, B)', 'Likes(B, B)', 'Likes(C, A)']
+        rules = ['Likes(x, x) ==> Vain(x)', 'Likes(x, y) & Likes(y, x) ==> Mutual(x, y)']
+        kb = make_kb(facts + rules)
+        for query in ['Vain(x)', 'Mutual(x, y)', 'Mutual(x, x)', 'Likes(x, x)']:
+            self.assertEqual(sorted(answers(kb, query, tabled = True)),
+                             sorted(answers(kb, query)))
+    
+    def test_stopped_query_leaves_no_incomplete_tables(self):
+        kb = make_kb(chain(6) + LEFT_RECURSIVE)
+        tables = AnswerTables()
+        search = iter(kb.ask(parse_clause('Ancestor(P0, x)'), tabled = True, tables = tables))
+        next(search)
+        search.close()
+        self.assertTrue(all(table.complete for table in tables.tables.itervalues()))
+        self.assertEqual(len(answers(kb, 'Ancestor(P0, x)', tabled = True, tables = tables)), 6)
+
+if __name__ == '__main__':
+    unittest.main()